@@ -0,0 +1,332 @@
+"""Streaming full and incremental backups of points state, and point-in-time restore.
+
+Each table is copied with COPY ... TO STDOUT straight into a gzip-compressed CSV
+file: rows are never materialized in Python, and compression and file writes
+happen on a worker thread in chunks of BACKUP_CHUNK_BYTES, so memory stays flat
+and the event loop only moves bytes between the connection and the thread.
+Files are written under a temporary name and renamed once complete.
+
+A backup set is one file per table sharing a timestamp, exported from a single
+repeatable-read snapshot. A full set holds every row; a delta set holds the rows
+whose updated_at is after the previous set (less BACKUP_OVERLAP_SECONDS, for
+transactions that committed late) plus the backup_deletions tombstones, so its
+size follows churn. A full set is taken every BACKUP_FULL_INTERVAL_HOURS, and
+rotation keeps the last BACKUP_KEEP_FULL full sets with the deltas after them.
+
+restore_points(as_of) rebuilds user_points and tiktok_accounts.points from the
+newest full set at or before `as_of` plus the deltas after it. A delta taken
+after `as_of` still contributes the rows it holds that last changed by then, so
+the restored state is exact except for rows changed both shortly before and
+after `as_of`, which come back as of the previous backup.
+"""
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+from database import db, BACKGROUND_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_FULL_INTERVAL_HOURS = float(os.getenv('BACKUP_FULL_INTERVAL_HOURS', '24'))
+BACKUP_KEEP_FULL = int(os.getenv('BACKUP_KEEP_FULL', '2'))
+BACKUP_OVERLAP_SECONDS = float(os.getenv('BACKUP_OVERLAP_SECONDS', '60'))
+BACKUP_CHUNK_BYTES = int(os.getenv('BACKUP_CHUNK_BYTES', str(1024 * 1024)))
+
+# Backed-up table -> primary key column
+BACKUP_TABLES = {'user_points': 'user_id', 'tiktok_accounts': 'handle_id'}
+DELETIONS_TABLE = 'backup_deletions'
+
+BACKUP_NAME = re.compile(r'^(?P<table>[a-z_]+?)_(?P<stamp>\d{8}_\d{6})\.(?P<kind>delta\.csv\.gz|csv\.gz|json)$')
+STAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+# Backups and restores of the same directory never overlap
+_backup_lock = asyncio.Lock()
+
+
+class BackupFile(NamedTuple):
+    table: str
+    path: str
+    rows: int
+
+
+class BackupSet(NamedTuple):
+    stamp: str
+    full: bool
+    # table -> file name
+    files: Dict[str, str]
+
+    @property
+    def taken_at(self) -> datetime:
+        return datetime.strptime(self.stamp, STAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+class RestorePlan(NamedTuple):
+    base: BackupSet
+    deltas: List[BackupSet]
+
+
+class RestoreResult(NamedTuple):
+    plan: RestorePlan
+    user_points: int
+    tiktok_accounts: int
+
+
+class _GzipSink:
+    """COPY output sink that buffers chunks and compresses/writes them off the loop."""
+
+    def __init__(self, path: str, chunk_bytes: int):
+        self.file = gzip.open(path, 'wb')
+        self.chunk_bytes = chunk_bytes
+        self.buffer = bytearray()
+
+    async def __call__(self, data: bytes):
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_bytes:
+            await self.drain()
+
+    async def drain(self):
+        chunk, self.buffer = bytes(self.buffer), bytearray()
+        if chunk:
+            await asyncio.to_thread(self.file.write, chunk)
+
+    async def close(self):
+        try:
+            await self.drain()
+        finally:
+            await asyncio.to_thread(self.file.close)
+
+
+async def _export(conn, query: str, path: str, args, chunk_bytes: int) -> int:
+    partial = path + '.partial'
+    sink = await asyncio.to_thread(_GzipSink, partial, chunk_bytes)
+    try:
+        try:
+            status = await conn.copy_from_query(query, *args, output=sink, format='csv', header=True)
+        finally:
+            await sink.close()
+    except BaseException:
+        await asyncio.to_thread(_remove, partial)
+        raise
+    await asyncio.to_thread(os.replace, partial, path)
+    # The command tag is 'COPY <rows>'
+    return int(status.split()[-1])
+
+
+async def export_query(query: str, path: str, *args, chunk_bytes: int = BACKUP_CHUNK_BYTES, conn=None) -> int:
+    """Stream a query's rows into a gzip CSV (with header) at `path`; returns the row count."""
+    if conn is not None:
+        return await _export(conn, query, path, args, chunk_bytes)
+    async with db.acquire(timeout=BACKGROUND_TIMEOUT) as conn:
+        return await _export(conn, query, path, args, chunk_bytes)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def backup_sets(directory: str = BACKUP_DIR) -> List[BackupSet]:
+    """The CSV backup sets in `directory`, oldest first."""
+    sets: Dict[str, BackupSet] = {}
+    if not os.path.isdir(directory):
+        return []
+    for name in os.listdir(directory):
+        match = BACKUP_NAME.match(name)
+        if not match or match.group('kind') == 'json':
+            continue
+        stamp = match.group('stamp')
+        if stamp not in sets:
+            sets[stamp] = BackupSet(stamp, match.group('kind') == 'csv.gz', {})
+        sets[stamp].files[match.group('table')] = name
+    return [sets[stamp] for stamp in sorted(sets)]
+
+
+def rotate(directory: str = BACKUP_DIR, keep_full: int = BACKUP_KEEP_FULL) -> List[str]:
+    """Delete every backup older than the oldest of the newest `keep_full` full sets; returns the removed names."""
+    full = [backup.stamp for backup in backup_sets(directory) if backup.full]
+    if keep_full <= 0 or not full:
+        return []
+    cutoff = full[-keep_full:][0]
+
+    removed = []
+    for name in os.listdir(directory):
+        match = BACKUP_NAME.match(name)
+        # Includes the JSON backups written before the CSV format
+        if match and match.group('stamp') < cutoff:
+            os.remove(os.path.join(directory, name))
+            removed.append(name)
+    return removed
+
+
+async def run_backup(directory: str = BACKUP_DIR, full: Optional[bool] = None,
+                     keep_full: int = BACKUP_KEEP_FULL, now: Optional[datetime] = None) -> List[BackupFile]:
+    """Write a backup set into `directory`, then rotate old sets.
+
+    The set is full when `full` is true or, by default, when there is no full set
+    from the last BACKUP_FULL_INTERVAL_HOURS; otherwise it is a delta.
+    """
+    async with _backup_lock:
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+        existing = await asyncio.to_thread(backup_sets, directory)
+
+        async with db.acquire(timeout=BACKGROUND_TIMEOUT) as conn:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                # The first statement fixes the snapshot every table is exported from
+                taken_at = now or await conn.fetchval('SELECT clock_timestamp()')
+                stamp = taken_at.astimezone(timezone.utc).strftime(STAMP_FORMAT)
+                if not existing:
+                    full = True
+                elif full is None:
+                    last_full = next((backup for backup in reversed(existing) if backup.full), None)
+                    full = last_full is None or (
+                        taken_at - last_full.taken_at > timedelta(hours=BACKUP_FULL_INTERVAL_HOURS)
+                    )
+                since = None if full else existing[-1].taken_at - timedelta(seconds=BACKUP_OVERLAP_SECONDS)
+
+                written = []
+                suffix = 'csv.gz' if full else 'delta.csv.gz'
+                for table in BACKUP_TABLES:
+                    path = os.path.join(directory, f'{table}_{stamp}.{suffix}')
+                    if full:
+                        rows = await export_query(f'SELECT * FROM {table}', path, conn=conn)
+                    else:
+                        rows = await export_query(f'SELECT * FROM {table} WHERE updated_at > $1', path, since, conn=conn)
+                    written.append(BackupFile(table, path, rows))
+                if not full:
+                    path = os.path.join(directory, f'{DELETIONS_TABLE}_{stamp}.{suffix}')
+                    rows = await export_query(
+                        f'SELECT * FROM {DELETIONS_TABLE} WHERE deleted_at > $1', path, since, conn=conn
+                    )
+                    written.append(BackupFile(DELETIONS_TABLE, path, rows))
+
+        removed = await asyncio.to_thread(rotate, directory, keep_full)
+        remaining = await asyncio.to_thread(backup_sets, directory)
+        if remaining and remaining[0].full:
+            # Tombstones older than every retained set can never be replayed
+            await db.execute(
+                f'DELETE FROM {DELETIONS_TABLE} WHERE deleted_at < $1',
+                remaining[0].taken_at - timedelta(seconds=BACKUP_OVERLAP_SECONDS), timeout=BACKGROUND_TIMEOUT
+            )
+
+    summary = ', '.join(f'{backup.table}={backup.rows}' for backup in written)
+    logger.info(f"{'Full' if full else 'Delta'} backup {stamp} written ({summary}); removed {len(removed)} old files")
+    return written
+
+
+def plan_restore(as_of: datetime, directory: str = BACKUP_DIR) -> RestorePlan:
+    """The full set and deltas needed to rebuild state as of `as_of`."""
+    sets = backup_sets(directory)
+    base = None
+    for index, backup in enumerate(sets):
+        if backup.full and backup.taken_at <= as_of:
+            base, later = backup, sets[index + 1:]
+    if base is None:
+        raise ValueError(f"No full backup at or before {as_of.isoformat()} in {directory}")
+
+    deltas = []
+    for backup in later:
+        # Stop after the first set past as_of: later ones cannot hold older changes
+        if not backup.full:
+            deltas.append(backup)
+        if backup.taken_at > as_of:
+            break
+    return RestorePlan(base, deltas)
+
+
+def _read_header(path: str) -> List[str]:
+    with gzip.open(path, 'rt', newline='') as f:
+        return next(csv.reader(f))
+
+
+async def _load(conn, table: str, path: str):
+    columns = await asyncio.to_thread(_read_header, path)
+    source = await asyncio.to_thread(gzip.open, path, 'rb')
+    try:
+        # asyncpg reads file-like sources in an executor, so decompression stays off the loop
+        await conn.copy_to_table(table, source=source, columns=columns, format='csv', header=True)
+    finally:
+        await asyncio.to_thread(source.close)
+
+
+async def restore_points(as_of: datetime, directory: str = BACKUP_DIR) -> RestoreResult:
+    """Rebuild user_points and tiktok_accounts.points as of `as_of` from the backups in `directory`.
+
+    Accounts created after `as_of` are kept with zero points; accounts deleted since are recreated.
+    """
+    async with _backup_lock:
+        plan = await asyncio.to_thread(plan_restore, as_of, directory)
+        async with db.acquire(timeout=BACKGROUND_TIMEOUT) as conn:
+            async with conn.transaction():
+                for table in BACKUP_TABLES:
+                    await conn.execute(f'CREATE TEMP TABLE restore_{table} (LIKE {table}) ON COMMIT DROP')
+                    await conn.execute(f'CREATE TEMP TABLE stage_{table} (LIKE {table}) ON COMMIT DROP')
+                    await _load(conn, f'restore_{table}', os.path.join(directory, plan.base.files[table]))
+                await conn.execute(f'CREATE TEMP TABLE stage_deletions (LIKE {DELETIONS_TABLE}) ON COMMIT DROP')
+
+                for delta in plan.deltas:
+                    for table, key in BACKUP_TABLES.items():
+                        await conn.execute(f'TRUNCATE stage_{table}')
+                        await _load(conn, f'stage_{table}', os.path.join(directory, delta.files[table]))
+                        await conn.execute(f'''
+                            DELETE FROM restore_{table} r USING stage_{table} s
+                            WHERE r.{key} = s.{key} AND s.updated_at <= $1
+                        ''', as_of)
+                        await conn.execute(f'''
+                            INSERT INTO restore_{table} SELECT * FROM stage_{table} WHERE updated_at <= $1
+                        ''', as_of)
+
+                    await conn.execute('TRUNCATE stage_deletions')
+                    await _load(conn, 'stage_deletions', os.path.join(directory, delta.files[DELETIONS_TABLE]))
+                    for table, key in BACKUP_TABLES.items():
+                        # A row written after its tombstone was re-inserted and stays
+                        await conn.execute(f'''
+                            DELETE FROM restore_{table} r USING stage_deletions d
+                            WHERE d.table_name = '{table}' AND d.row_key = r.{key}::text
+                              AND d.deleted_at <= $1 AND d.deleted_at >= COALESCE(r.updated_at, '-infinity')
+                        ''', as_of)
+
+                removed = await conn.execute('''
+                    DELETE FROM user_points p
+                    WHERE NOT EXISTS (SELECT 1 FROM restore_user_points r WHERE r.user_id = p.user_id)
+                ''')
+                upserted = await conn.execute('''
+                    INSERT INTO user_points (user_id, points)
+                    SELECT user_id, points FROM restore_user_points
+                    ON CONFLICT (user_id) DO UPDATE SET points = EXCLUDED.points
+                    WHERE user_points.points IS DISTINCT FROM EXCLUDED.points
+                ''')
+                zeroed = await conn.execute('''
+                    UPDATE tiktok_accounts a SET points = 0
+                    WHERE a.points <> 0
+                      AND NOT EXISTS (SELECT 1 FROM restore_tiktok_accounts r WHERE r.handle_id = a.handle_id)
+                ''')
+                updated = await conn.execute('''
+                    UPDATE tiktok_accounts a SET points = r.points
+                    FROM restore_tiktok_accounts r
+                    WHERE r.handle_id = a.handle_id AND a.points IS DISTINCT FROM r.points
+                ''')
+                recreated = await conn.execute('''
+                    INSERT INTO tiktok_accounts
+                    SELECT r.* FROM restore_tiktok_accounts r
+                    WHERE NOT EXISTS (SELECT 1 FROM tiktok_accounts a WHERE a.handle_id = r.handle_id)
+                    ON CONFLICT DO NOTHING
+                ''')
+
+    def count(status: str) -> int:
+        return int(status.split()[-1])
+
+    result = RestoreResult(
+        plan, count(removed) + count(upserted), count(zeroed) + count(updated) + count(recreated)
+    )
+    logger.info(
+        f"Restored points as of {as_of.isoformat()} from backup {plan.base.stamp} + {len(plan.deltas)} deltas: "
+        f"{result.user_points} user_points rows, {result.tiktok_accounts} tiktok_accounts rows changed"
+    )
+    return result
@@ -0,0 +1,141 @@
+"""Drive the cogs end to end against FakeDiscord and count the API traffic.
+
+    BENCHMARK_DATABASE_URL=postgresql://localhost/luxbot_bench python -m benchmarks.e2e
+    python -m benchmarks.e2e --latency 0.08 --submissions 50 --output e2e.json
+
+Each scenario reports wall time, API calls per route and the 429s Discord
+would have answered with, so a change's effect on rate limits shows up before
+it reaches production.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+import discord
+from discord.ext import commands
+
+from database import db
+from benchmarks.fake_discord import FakeDiscord
+from benchmarks.seed import seed
+
+logger = logging.getLogger(__name__)
+
+COGS = ['cogs.submissions', 'cogs.queue', 'cogs.persistent_embeds', 'cogs.admin', 'cogs.tiktok_linking']
+LINKS = [
+    'https://soundcloud.com/artist/track-{}',
+    'https://open.spotify.com/track/{}',
+    'https://www.youtube.com/watch?v={}',
+]
+
+
+class Scenario:
+    def __init__(self, fake: FakeDiscord, name: str):
+        self.fake = fake
+        self.name = name
+        self.result = None
+
+    def __enter__(self):
+        self.fake.reset_stats()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.result = {'elapsed': time.perf_counter() - self._start, **self.fake.stats()}
+
+
+async def run(latency: float, submissions: int, cycles: int, commands_per_kind: int) -> dict:
+    database_url = os.getenv('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        raise SystemExit("Set BENCHMARK_DATABASE_URL to a throwaway database (seeding truncates tables)")
+    os.environ['DATABASE_URL'] = database_url
+
+    await db.connect()
+    fake = FakeDiscord(latency=latency)
+    await fake.start()
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.default())
+    results = {}
+    try:
+        await seed(1000)
+        await db.execute('TRUNCATE persistent_embeds')
+        await fake.login(bot)
+        for extension in COGS:
+            await bot.load_extension(extension)
+        # Task loops wait for a gateway READY that never comes; scenarios call them directly
+        bot.get_cog('PersistentEmbeds').cog_unload()
+
+        submission_channel = fake.add_text_channel(bot, 'submissions')
+        queue_channel = fake.add_text_channel(bot, 'live-queue')
+        reviewer_channel = fake.add_text_channel(bot, 'reviewers')
+        await db.execute('''
+            INSERT INTO bot_config (key, channel_id) VALUES ('submission_channel', $1)
+            ON CONFLICT (key) DO UPDATE SET channel_id = $1
+        ''', submission_channel.id)
+        await fake.invoke(bot, 'setup-live-queue', {'channel': queue_channel})
+        await fake.invoke(bot, 'setup-reviewer-channel', {'channel': reviewer_channel})
+
+        submissions_cog = bot.get_cog('Submissions')
+        with Scenario(fake, 'on_message') as scenario:
+            # A burst of link posts, dispatched concurrently as the gateway would
+            messages = [
+                fake.message(bot, submission_channel, author=fake.user(f'fan{i}'),
+                             content=LINKS[i % len(LINKS)].format(i))
+                for i in range(submissions)
+            ]
+            await asyncio.gather(*(submissions_cog.on_message(message) for message in messages))
+        results[scenario.name] = scenario.result
+
+        embeds_cog = bot.get_cog('PersistentEmbeds')
+        with Scenario(fake, 'refresh_embeds') as scenario:
+            for cycle in range(cycles):
+                # One new song between refreshes, the way a live stream trickles in
+                if cycle % 2 == 0:
+                    await submissions_cog.create_submission(1, 'fan', 'Artist', f'Song {cycle}', LINKS[0].format(cycle))
+                await embeds_cog.refresh_embeds()
+        results[scenario.name] = scenario.result
+
+        for command, options in (('queue', {'page': 1}), ('next', {}), ('my-links', {})):
+            with Scenario(fake, f'/{command}') as scenario:
+                for _ in range(commands_per_kind):
+                    await fake.invoke(bot, command, options)
+            results[scenario.name] = scenario.result
+    finally:
+        await bot.close()
+        await fake.stop()
+        await db.disconnect()
+
+    return {'latency': latency, 'scenarios': results}
+
+
+def format_report(report: dict) -> str:
+    lines = [f"Fake Discord latency {report['latency'] * 1000:.0f} ms"]
+    for name, result in report['scenarios'].items():
+        lines.append(
+            f"\n{name}: {result['calls']} API calls, {result['rate_limited']} x 429, {result['elapsed']:.2f}s"
+        )
+        for route, stats in result['routes'].items():
+            lines.append(f"  {route:<66} {stats['calls']:>5}  {stats['rate_limited']:>4} x 429")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count Discord API calls and 429s per feature")
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated API latency in seconds")
+    parser.add_argument('--submissions', type=int, default=20, help="link messages in the on_message burst")
+    parser.add_argument('--cycles', type=int, default=6, help="refresh_embeds cycles (one per 10s in production)")
+    parser.add_argument('--commands', type=int, default=10, help="invocations per slash command")
+    parser.add_argument('--output', help="also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = asyncio.run(run(args.latency, args.submissions, args.cycles, args.commands))
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""A local stand-in for Discord's REST API, for driving cogs end to end.
+
+FakeDiscord is a small aiohttp server implementing the message, DM, interaction
+callback and webhook follow-up endpoints the cogs use. A real discord.py client
+is pointed at it, so every send, edit, fetch and interaction response goes
+through discord.py's own HTTP client and rate limiter, exactly as it would in
+production. The server adds configurable latency, answers with Discord's
+rate-limit headers per bucket, and records every call and every 429.
+
+    fake = FakeDiscord(latency=0.05)
+    await fake.start()
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.default())
+    await fake.login(bot)
+    channel = fake.add_text_channel(bot, 'submissions')
+    await bot.get_cog('Submissions').on_message(fake.message(bot, channel, content='https://youtu.be/x'))
+    await fake.invoke(bot, 'queue', {'page': 1})
+    print(fake.format_stats())
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import discord
+from aiohttp import web
+
+API_VERSION = 10
+
+# (method, route) -> (requests allowed, per seconds). Per-channel limits mirror the
+# ones Discord reports for bots; routes not listed share only the global limit.
+DEFAULT_RATE_LIMITS: Dict[Tuple[str, str], Tuple[int, float]] = {
+    ('POST', '/channels/{channel_id}/messages'): (5, 5.0),
+    ('PATCH', '/channels/{channel_id}/messages/{message_id}'): (5, 5.0),
+    ('DELETE', '/channels/{channel_id}/messages/{message_id}'): (5, 1.0),
+    ('GET', '/channels/{channel_id}/messages/{message_id}'): (5, 1.0),
+    ('POST', '/users/@me/channels'): (2, 1.0),
+    ('POST', '/webhooks/{webhook_id}/{webhook_token}'): (5, 2.0),
+    ('PATCH', '/webhooks/{webhook_id}/{webhook_token}/messages/{message_id}'): (5, 2.0),
+}
+GLOBAL_RATE_LIMIT = (50, 1.0)
+
+# Path parameters that scope a bucket, as Discord's "major parameters" do
+MAJOR_PARAMETERS = ('channel_id', 'guild_id', 'webhook_id', 'webhook_token')
+
+ALL_PERMISSIONS = str(discord.Permissions.all().value)
+
+
+def _json_response(data, status: int = 200, headers: Optional[dict] = None) -> web.Response:
+    # discord.py only decodes bodies whose content type is exactly application/json,
+    # so aiohttp's json_response (which appends a charset) can't be used
+    return web.Response(
+        body=json.dumps(data).encode(), status=status,
+        headers={**(headers or {}), 'Content-Type': 'application/json'}
+    )
+
+
+class _Bucket:
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def take(self) -> Optional[float]:
+        """Consume one request; return seconds to wait if the bucket is exhausted."""
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining <= 0:
+            return self.reset_at - now
+        self.remaining -= 1
+        return None
+
+    def headers(self, name: str) -> dict:
+        reset_after = max(self.reset_at - time.monotonic(), 0.0)
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': f'{time.time() + reset_after:.3f}',
+            'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+            'X-RateLimit-Bucket': name,
+        }
+
+
+class FakeDiscord:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 rate_limits: Optional[Dict[Tuple[str, str], Tuple[int, float]]] = None,
+                 global_limit: Optional[Tuple[int, float]] = GLOBAL_RATE_LIMIT):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.global_limit = global_limit
+
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.rate_limited: Dict[str, int] = defaultdict(int)
+
+        self._ids = itertools.count(1)
+        self.bot_user = self._user('LuxBot', bot=True)
+        self.application_id = self._snowflake()
+        self.guild_id: Optional[int] = None
+        # channel id -> {message id -> message payload}
+        self.messages: Dict[int, Dict[int, dict]] = defaultdict(dict)
+        self.channels: Dict[int, dict] = {}
+        self.attachments: Dict[str, bytes] = {}
+
+        self._buckets: Dict[Tuple[str, str, str], _Bucket] = {}
+        self._global_bucket: Optional[_Bucket] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._previous_base: Optional[str] = None
+        self.base_url: Optional[str] = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        app = web.Application(middlewares=[self._middleware])
+        prefix = f'/api/v{API_VERSION}'
+        app.router.add_get(prefix + '/users/@me', self._get_me)
+        app.router.add_get(prefix + '/oauth2/applications/@me', self._get_application)
+        app.router.add_post(prefix + '/users/@me/channels', self._create_dm)
+        app.router.add_post(prefix + '/channels/{channel_id}/messages', self._create_message)
+        app.router.add_get(prefix + '/channels/{channel_id}/messages/{message_id}', self._get_message)
+        app.router.add_patch(prefix + '/channels/{channel_id}/messages/{message_id}', self._edit_message)
+        app.router.add_delete(prefix + '/channels/{channel_id}/messages/{message_id}', self._delete_message)
+        app.router.add_post(prefix + '/interactions/{webhook_id}/{webhook_token}/callback', self._interaction_callback)
+        app.router.add_post(prefix + '/webhooks/{webhook_id}/{webhook_token}', self._followup)
+        app.router.add_patch(prefix + '/webhooks/{webhook_id}/{webhook_token}/messages/{message_id}', self._edit_followup)
+        app.router.add_get('/attachments/{key}/{filename}', self._get_attachment)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{port}'
+
+    async def stop(self):
+        if self._previous_base is not None:
+            discord.http.Route.BASE = self._previous_base
+            self._previous_base = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def login(self, bot: discord.Client):
+        """Point discord.py at this server and log the bot in (no gateway connection)."""
+        self._previous_base = discord.http.Route.BASE
+        discord.http.Route.BASE = f'{self.base_url}/api/v{API_VERSION}'
+        await bot.login('fake-token')
+        self.add_guild(bot)
+
+    # -- stats -------------------------------------------------------------
+
+    def reset_stats(self):
+        self.calls.clear()
+        self.rate_limited.clear()
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    @property
+    def total_rate_limited(self) -> int:
+        return sum(self.rate_limited.values())
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.total_calls,
+            'rate_limited': self.total_rate_limited,
+            'routes': {
+                route: {'calls': count, 'rate_limited': self.rate_limited.get(route, 0)}
+                for route, count in sorted(self.calls.items())
+            },
+        }
+
+    def format_stats(self) -> str:
+        lines = [f"{self.total_calls} API calls, {self.total_rate_limited} rate limited (429)"]
+        for route, count in sorted(self.calls.items()):
+            lines.append(f"  {route:<70} {count:>6} calls  {self.rate_limited.get(route, 0):>4} x 429")
+        return '\n'.join(lines)
+
+    # -- payload builders --------------------------------------------------
+
+    def _snowflake(self) -> int:
+        return discord.utils.time_snowflake(datetime.now(timezone.utc)) + next(self._ids)
+
+    def _user(self, name: str, bot: bool = False, user_id: Optional[int] = None) -> dict:
+        return {
+            'id': str(user_id or self._snowflake()),
+            'username': name,
+            'discriminator': '0',
+            'global_name': None,
+            'avatar': None,
+            'bot': bot,
+        }
+
+    def user(self, name: str) -> dict:
+        return self._user(name)
+
+    def _message(self, channel_id: int, author: dict, data: dict, attachments=()) -> dict:
+        return {
+            'id': str(self._snowflake()),
+            'channel_id': str(channel_id),
+            'author': author,
+            'content': data.get('content') or '',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': list(attachments),
+            'embeds': data.get('embeds') or [],
+            'components': data.get('components') or [],
+            'pinned': False,
+            'type': 0,
+            'flags': data.get('flags') or 0,
+        }
+
+    def attachment(self, filename: str, content: bytes) -> dict:
+        key = str(self._snowflake())
+        self.attachments[key] = content
+        url = f'{self.base_url}/attachments/{key}/{filename}'
+        return {'id': key, 'filename': filename, 'size': len(content), 'url': url, 'proxy_url': url}
+
+    def add_guild(self, bot: discord.Client):
+        self.guild_id = self._snowflake()
+        data = {
+            'id': str(self.guild_id),
+            'name': 'Fake Guild',
+            'owner_id': self.bot_user['id'],
+            'roles': [{'id': str(self.guild_id), 'name': '@everyone', 'permissions': ALL_PERMISSIONS,
+                       'position': 0, 'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+            'channels': [],
+            'members': [],
+            'member_count': 1,
+            'features': [],
+            'emojis': [],
+            'stickers': [],
+        }
+        guild = discord.Guild(data=data, state=bot._connection)
+        bot._connection._add_guild(guild)
+        return guild
+
+    def add_text_channel(self, bot: discord.Client, name: str) -> discord.TextChannel:
+        channel_id = self._snowflake()
+        data = {
+            'id': str(channel_id), 'type': 0, 'name': name, 'position': len(self.channels),
+            'guild_id': str(self.guild_id), 'permission_overwrites': [], 'nsfw': False,
+        }
+        self.channels[channel_id] = data
+        guild = bot.get_guild(self.guild_id)
+        channel = discord.TextChannel(guild=guild, state=bot._connection, data=data)
+        guild._add_channel(channel)
+        return channel
+
+    def message(self, bot: discord.Client, channel: discord.TextChannel, author: Optional[dict] = None,
+                content: str = '', attachments=()) -> discord.Message:
+        """Build an incoming user message, as the gateway would deliver it."""
+        data = self._message(channel.id, author or self.user('listener'), {'content': content}, attachments)
+        self.messages[channel.id][int(data['id'])] = data
+        return discord.Message(state=bot._connection, channel=channel, data=data)
+
+    async def invoke(self, bot: discord.Client, command: str, options: Optional[dict] = None,
+                     channel: Optional[discord.TextChannel] = None, user: Optional[dict] = None,
+                     permissions: str = ALL_PERMISSIONS):
+        """Run a slash command through the app command tree, as if a user invoked it.
+
+        `options` maps option names to values; channel options take the channel object.
+        `permissions` is the invoking member's permission bitfield as a string.
+        """
+        app_command = bot.tree.get_command(command)
+        if app_command is None:
+            raise ValueError(f"Unknown command /{command}")
+
+        resolved = {'channels': {}}
+        option_payloads = []
+        for name, value in (options or {}).items():
+            option_type = app_command._params[name].type
+            if option_type is discord.AppCommandOptionType.channel:
+                resolved['channels'][str(value.id)] = {**self.channels[value.id], 'permissions': ALL_PERMISSIONS}
+                value = str(value.id)
+            option_payloads.append({'name': name, 'type': option_type.value, 'value': value})
+
+        channel_id = channel.id if channel else next(iter(self.channels), self._snowflake())
+        interaction_id = self._snowflake()
+        data = {
+            'id': str(interaction_id),
+            'application_id': str(self.application_id),
+            'type': 2,
+            'token': f'token-{interaction_id}',
+            'version': 1,
+            'guild_id': str(self.guild_id),
+            'channel_id': str(channel_id),
+            'channel': self.channels.get(channel_id, {'id': str(channel_id), 'type': 0}),
+            'member': {
+                'user': user or self.user('invoker'),
+                'roles': [],
+                'joined_at': datetime.now(timezone.utc).isoformat(),
+                'deaf': False,
+                'mute': False,
+                'flags': 0,
+                'permissions': permissions,
+            },
+            'app_permissions': ALL_PERMISSIONS,
+            'locale': 'en-US',
+            'guild_locale': 'en-US',
+            'entitlements': [],
+            'attachment_size_limit': 25 * 1024 * 1024,
+            'authorizing_integration_owners': {'0': str(self.guild_id)},
+            'context': 0,
+            'data': {
+                'id': str(self._snowflake()),
+                'name': command,
+                'type': 1,
+                'options': option_payloads,
+                'resolved': resolved,
+            },
+        }
+        interaction = discord.Interaction(data=data, state=bot._connection)
+        await bot.tree._call(interaction)
+        return interaction
+
+    # -- server ------------------------------------------------------------
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        template = resource.canonical if resource else request.path
+        route = template.replace(f'/api/v{API_VERSION}', '', 1)
+        key = f'{request.method} {route}'
+        self.calls[key] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if self.global_limit:
+            if self._global_bucket is None:
+                self._global_bucket = _Bucket(*self.global_limit)
+            retry_after = self._global_bucket.take()
+            if retry_after is not None:
+                self.rate_limited[key] += 1
+                return _json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': True},
+                    status=429, headers={'X-RateLimit-Global': 'true', 'X-RateLimit-Scope': 'global',
+                                         'Retry-After': f'{retry_after:.3f}'}
+                )
+
+        limit = self.rate_limits.get((request.method, route))
+        bucket = None
+        if limit:
+            major = '/'.join(request.match_info[p] for p in MAJOR_PARAMETERS if p in request.match_info)
+            bucket_key = (request.method, route, major)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = _Bucket(*limit)
+            retry_after = bucket.take()
+            if retry_after is not None:
+                self.rate_limited[key] += 1
+                return _json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': False},
+                    status=429, headers={**bucket.headers(f'{request.method}:{route}'),
+                                         'X-RateLimit-Scope': 'user', 'Retry-After': f'{retry_after:.3f}'}
+                )
+
+        response = await handler(request)
+        if bucket:
+            response.headers.update(bucket.headers(f'{request.method}:{route}'))
+        return response
+
+    async def _payload(self, request: web.Request):
+        """Return (json payload, uploaded files) for a JSON or multipart request."""
+        if not request.content_type.startswith('multipart/'):
+            return (await request.json() if request.can_read_body else {}), []
+
+        payload, files = {}, []
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == 'payload_json':
+                payload = json.loads(await part.text())
+            else:
+                files.append(self.attachment(part.filename, await part.read()))
+        return payload, files
+
+    async def _get_me(self, request):
+        return _json_response(self.bot_user)
+
+    async def _get_application(self, request):
+        return _json_response({
+            'id': str(self.application_id), 'name': 'LuxBot', 'icon': None, 'description': '',
+            'bot_public': False, 'bot_require_code_grant': False, 'owner': self.bot_user,
+            'verify_key': '0' * 64, 'flags': 0, 'summary': '',
+        })
+
+    async def _create_dm(self, request):
+        data = await request.json()
+        channel_id = self._snowflake()
+        self.channels[channel_id] = {'id': str(channel_id), 'type': 1}
+        return _json_response({
+            'id': str(channel_id), 'type': 1, 'last_message_id': None,
+            'recipients': [self._user('recipient', user_id=int(data['recipient_id']))],
+        })
+
+    async def _create_message(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        data, files = await self._payload(request)
+        message = self._message(channel_id, self.bot_user, data, files)
+        self.messages[channel_id][int(message['id'])] = message
+        return _json_response(message)
+
+    def _find(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        return self.messages[channel_id].get(int(request.match_info['message_id']))
+
+    def _not_found(self):
+        return _json_response({'message': 'Unknown Message', 'code': 10008}, status=404)
+
+    async def _get_message(self, request):
+        message = self._find(request)
+        return _json_response(message) if message else self._not_found()
+
+    async def _edit_message(self, request):
+        message = self._find(request)
+        if not message:
+            return self._not_found()
+        data, files = await self._payload(request)
+        message.update({key: value for key, value in data.items() if key in ('content', 'embeds', 'components')})
+        message['edited_timestamp'] = datetime.now(timezone.utc).isoformat()
+        return _json_response(message)
+
+    async def _delete_message(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        if self.messages[channel_id].pop(int(request.match_info['message_id']), None) is None:
+            return self._not_found()
+        return web.Response(status=204)
+
+    async def _interaction_callback(self, request):
+        data, files = await self._payload(request)
+        callback = {'interaction': {'id': request.match_info['webhook_id'], 'type': 2}}
+        message_data = data.get('data') or {}
+        if data.get('type') == 4:
+            message = self._message(0, self.bot_user, message_data, files)
+            callback['resource'] = {'type': 4, 'message': message}
+        else:
+            callback['interaction']['response_message_loading'] = data.get('type') == 5
+            callback['resource'] = {'type': data.get('type')}
+        return _json_response(callback)
+
+    async def _followup(self, request):
+        data, files = await self._payload(request)
+        return _json_response(self._message(0, self.bot_user, data, files))
+
+    async def _edit_followup(self, request):
+        data, files = await self._payload(request)
+        return _json_response(self._message(0, self.bot_user, data, files))
+
+    async def _get_attachment(self, request):
+        content = self.attachments.get(request.match_info['key'])
+        if content is None:
+            return web.Response(status=404)
+        return web.Response(body=content)
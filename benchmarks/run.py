@@ -0,0 +1,213 @@
+"""Time the queue hot paths against seeded data.
+
+    BENCHMARK_DATABASE_URL=postgresql://localhost/luxbot_bench python -m benchmarks.run
+    python -m benchmarks.run --sizes 10000 100000 --output benchmarks/results/before.json
+    python -m benchmarks.run --compare benchmarks/results/before.json benchmarks/results/after.json
+
+Seeding truncates the queue tables, so the suite only runs against the database
+named by BENCHMARK_DATABASE_URL, never the bot's DATABASE_URL.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+import discord
+from discord.ext import commands
+
+from database import db
+from metrics import registry
+from benchmarks.seed import seed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (10_000, 100_000)
+DEFAULT_REPEAT = 30
+# sync_scores issues several queries per Free submission, so it gets fewer runs
+SLOW_REPEAT = 3
+
+
+class _Responder:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class _Interaction:
+    """Just enough of discord.Interaction for commands that defer and send a followup."""
+
+    def __init__(self):
+        self.response = _Responder()
+        self.followup = _Responder()
+
+
+def _db_round_trips() -> int:
+    return sum(histogram.count for _, histogram in registry.collect('db_query_seconds'))
+
+
+async def _time(func: Callable[[], Awaitable], repeat: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        await func()
+
+    durations: List[float] = []
+    round_trips = _db_round_trips()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        durations.append(time.perf_counter() - start)
+    round_trips = _db_round_trips() - round_trips
+
+    durations.sort()
+    return {
+        'runs': repeat,
+        'min': durations[0],
+        'p50': statistics.median(durations),
+        'p95': durations[min(int(repeat * 0.95), repeat - 1)],
+        'max': durations[-1],
+        'mean': statistics.fmean(durations),
+        'db_round_trips': round_trips / repeat,
+    }
+
+
+async def run_size(submissions: int, repeat: int) -> Dict[str, dict]:
+    from cogs.queue import Queue
+    from cogs.persistent_embeds import PersistentEmbeds
+    from cogs.points_sync import PointsSync
+    from cogs.tiktok_linking import TikTokLinking
+
+    started = time.perf_counter()
+    await seed(submissions)
+    logger.info(f"Seeded {submissions} submissions in {time.perf_counter() - started:.1f}s")
+
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.default())
+    queue = Queue(bot)
+    embeds = PersistentEmbeds(bot)
+    points = PointsSync(bot)
+    linking = TikTokLinking(bot)
+    # The cogs start their task loops on construction; only the bodies are timed here
+    embeds.cog_unload()
+    points.cog_unload()
+
+    interaction = _Interaction()
+    queued = await db.fetchval('''
+        SELECT COUNT(*) FROM submissions
+        WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played', 'Pending Skips')
+    ''')
+    deep_page = max(queued // 20, 1)
+
+    benchmarks = {
+        'queue.view_queue': (lambda: Queue.view_queue.callback(queue, interaction, 1), repeat),
+        'queue.view_queue_deep_page': (lambda: Queue.view_queue.callback(queue, interaction, deep_page), repeat),
+        'embeds.live_queue': (lambda: embeds.generate_live_queue_embed(0), repeat),
+        'embeds.reviewer_main': (lambda: embeds.generate_reviewer_main_embed(0), repeat),
+        'embeds.reviewer_pending': (lambda: embeds.generate_reviewer_pending_embed(0), repeat),
+        'linking.handle_autocomplete': (lambda: linking.handle_autocomplete(interaction, 'handle_00'), repeat),
+        'points_sync.sync_scores': (lambda: points.sync_scores(), SLOW_REPEAT),
+        # Runs last: every call plays (and so removes) one song from the queue
+        'queue.get_next_submission': (queue.get_next_submission, repeat),
+    }
+
+    results = {}
+    for name, (func, runs) in benchmarks.items():
+        results[name] = await _time(func, runs)
+        logger.info(f"  {name}: p50 {results[name]['p50'] * 1000:.2f} ms")
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+async def run(sizes, repeat: int) -> dict:
+    database_url = os.getenv('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        raise SystemExit("Set BENCHMARK_DATABASE_URL to a throwaway database (seeding truncates tables)")
+    os.environ['DATABASE_URL'] = database_url
+
+    await db.connect()
+    try:
+        report = {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'postgres': await db.fetchval('SHOW server_version'),
+            'sizes': {},
+        }
+        for size in sizes:
+            report['sizes'][str(size)] = await run_size(size, repeat)
+    finally:
+        await db.disconnect()
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [f"Benchmarks at {report['commit']} (PostgreSQL {report['postgres']})"]
+    for size, results in report['sizes'].items():
+        lines.append(f"\n{int(size):,} submissions")
+        for name, stats in results.items():
+            lines.append(
+                f"  {name:<30} p50 {stats['p50'] * 1000:9.2f} ms  p95 {stats['p95'] * 1000:9.2f} ms  "
+                f"{stats['db_round_trips']:8.1f} queries/call"
+            )
+    return '\n'.join(lines)
+
+
+def compare(before: dict, after: dict) -> str:
+    lines = [f"{before['commit']} -> {after['commit']} (p50)"]
+    for size, results in after['sizes'].items():
+        baseline = before['sizes'].get(size, {})
+        lines.append(f"\n{int(size):,} submissions")
+        for name, stats in results.items():
+            if name not in baseline:
+                lines.append(f"  {name:<30} {stats['p50'] * 1000:9.2f} ms  (new)")
+                continue
+            old = baseline[name]['p50']
+            change = (stats['p50'] - old) / old * 100 if old else 0.0
+            lines.append(f"  {name:<30} {old * 1000:9.2f} -> {stats['p50'] * 1000:9.2f} ms  ({change:+.1f}%)")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark queue, embed, sync and autocomplete hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="submission counts to seed and benchmark")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark")
+    parser.add_argument('--output', help="results file (default benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two results files")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logging.getLogger('discord').setLevel(logging.WARNING)
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            before = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            after = json.load(f)
+        print(compare(before, after))
+        return
+
+    report = asyncio.run(run(args.sizes, args.repeat))
+    output = args.output or os.path.join('benchmarks', 'results', f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(format_report(report))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import random
+from datetime import datetime, timedelta, timezone
+from database import db
+
+# Share of submissions per queue line, roughly what a busy stream looks like:
+# most songs wait in Free, a few are boosted into skip tiers, and a long tail
+# has already been played.
+QUEUE_LINE_WEIGHTS = {
+    'Free': 50,
+    '5 Skip': 7,
+    '10 Skip': 4,
+    '15 Skip': 2,
+    '20 Skip': 1,
+    '25+ Skip': 1,
+    'Pending Skips': 5,
+    'Songs Played': 28,
+    'Removed': 2,
+}
+
+SEEDED_TABLES = ('submissions', 'user_points', 'tiktok_accounts', 'luxury_coins')
+
+
+async def seed(submissions: int, seed: int = 1):
+    """Replace the queue tables with `submissions` synthetic rows plus related users.
+
+    Destructive: only run this against a throwaway database.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    users = max(submissions // 5, 1)
+    handles = max(submissions // 3, 1)
+    lines = list(QUEUE_LINE_WEIGHTS)
+    weights = list(QUEUE_LINE_WEIGHTS.values())
+
+    account_rows = []
+    for i in range(handles):
+        linked = 100_000 + rng.randrange(users) if rng.random() < 0.5 else None
+        last_seen = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        account_rows.append((f'handle_{i:07d}', last_seen, last_seen, linked, rng.randint(0, 5000), rng.randint(0, 50)))
+
+    submission_rows = []
+    for i in range(submissions):
+        user_id = 100_000 + rng.randrange(users)
+        queue_line = rng.choices(lines, weights)[0]
+        submitted = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+        played = submitted + timedelta(minutes=rng.randint(1, 600)) if queue_line in ('Songs Played', 'Removed') else None
+        tiktok_username = f'handle_{rng.randrange(handles):07d}' if rng.random() < 0.4 else None
+        submission_rows.append((
+            f'b{i:07x}', user_id, f'user{user_id}', f'Artist {rng.randrange(2000)}', f'Song {i}',
+            f'https://example.com/track/{i}', queue_line, submitted, played, None, tiktok_username,
+            float(rng.randint(0, 3000)) if queue_line == 'Free' else 0.0,
+        ))
+
+    points_rows = [(100_000 + i, rng.randint(0, 2000)) for i in range(users)]
+    coins_rows = [(100_000 + i, rng.randint(0, 500)) for i in range(0, users, 2)]
+
+    async with db.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(f"TRUNCATE {', '.join(SEEDED_TABLES)} RESTART IDENTITY CASCADE")
+            await conn.copy_records_to_table(
+                'tiktok_accounts', records=account_rows,
+                columns=['handle_name', 'first_seen', 'last_seen', 'linked_discord_id', 'points', 'last_known_level']
+            )
+            await conn.copy_records_to_table(
+                'submissions', records=submission_rows,
+                columns=['public_id', 'user_id', 'username', 'artist_name', 'song_name', 'link_or_file',
+                         'queue_line', 'submission_time', 'played_time', 'note', 'tiktok_username', 'total_score']
+            )
+            await conn.copy_records_to_table('user_points', records=points_rows, columns=['user_id', 'points'])
+            await conn.copy_records_to_table('luxury_coins', records=coins_rows, columns=['user_id', 'balance'])
+        for table in SEEDED_TABLES:
+            await conn.execute(f'ANALYZE {table}')
@@ -2,7 +2,14 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import logging
+import io
+from datetime import datetime, timezone
+from backup import plan_restore, restore_points, run_backup
 from database import db
+from ingest.viewers import sparkline
+from metrics import registry
+from monitoring import loop_blocked, loop_lag
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -131,9 +138,15 @@ class Admin(commands.Cog):
         
         logger.info(f"Admin {interaction.user} set archive channel to {channel.id}")
 
+    async def stream_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        tiktok_cog = self.bot.get_cog('TikTokIntegration')
+        return await tiktok_cog.stream_autocomplete(interaction, current) if tiktok_cog else []
+
     @app_commands.command(name="post-live-metrics", description="Post metrics for the last live session")
     @app_commands.checks.has_permissions(administrator=True)
-    async def post_live_metrics(self, interaction: discord.Interaction):
+    @app_commands.describe(username="TikTok stream to end (needed when several are connected)")
+    @app_commands.autocomplete(username=stream_autocomplete)
+    async def post_live_metrics(self, interaction: discord.Interaction, username: Optional[str] = None):
         """Post metrics from the most recent completed live session"""
 
         if not interaction.response.is_done():
@@ -144,8 +157,12 @@ class Admin(commands.Cog):
             await interaction.followup.send("❌ TikTok integration not loaded")
             return
 
-        # end_active_session now returns the session data directly
-        session = await tiktok_cog.end_active_session()
+        if not username and len(tiktok_cog.streams) > 1:
+            await interaction.followup.send("❌ Several streams are connected; pick one with `username`.")
+            return
+
+        # end_active_session returns the ended live_sessions row
+        session = await tiktok_cog.end_active_session(username)
 
         if not session:
             await interaction.followup.send("❌ No active session to end")
@@ -161,59 +178,36 @@ class Admin(commands.Cog):
             )
             return
 
-        # The session data is now directly available from end_active_session,
-        # so we don't need to re-query for it.
-        # The original query was:
-        # last_session = await db.fetchrow('''
-        #     SELECT * FROM live_sessions
-        #     WHERE status = 'completed'
-        #     ORDER BY ended_at DESC
-        #     LIMIT 1
-        # ''')
-        # if not last_session:
-        #     await interaction.followup.send("❌ No completed live sessions found.")
-        #     return
-        
-        # We use the session data returned by end_active_session directly.
-        # This assumes end_active_session returns a dictionary-like object 
-        # with keys like 'id', 'tiktok_username', 'start_time', 'end_time'.
-        # If the structure is different, this part might need adjustment.
-        last_session = session 
-
-        total_interactions = await db.fetchval(
-            'SELECT COUNT(*) FROM tiktok_interactions WHERE session_id = $1',
-            last_session['id']
-        )
-
-        total_gifts = await db.fetchval(
-            'SELECT COUNT(*) FROM tiktok_interactions WHERE session_id = $1 AND interaction_type = $2',
-            last_session['id'], 'gift'
-        )
-
-        total_coins = await db.fetchval(
-            'SELECT COALESCE(SUM(coin_value), 0) FROM tiktok_interactions WHERE session_id = $1 AND interaction_type = $2',
-            last_session['id'], 'gift'
-        )
-
-        unique_viewers = await db.fetchval(
-            'SELECT COUNT(DISTINCT tiktok_account_id) FROM tiktok_interactions WHERE session_id = $1',
-            last_session['id']
-        )
-
-        avg_viewers = await db.fetchval(
-            'SELECT AVG(viewer_count) FROM viewer_count_snapshots WHERE session_id = $1',
-            last_session['id']
-        )
-
-        peak_viewers = await db.fetchval(
-            'SELECT MAX(viewer_count) FROM viewer_count_snapshots WHERE session_id = $1',
-            last_session['id']
-        )
-
-        songs_played = await db.fetchval(
-            'SELECT COUNT(*) FROM submissions WHERE played_time >= $1 AND played_time <= $2',
-            last_session['started_at'], last_session['ended_at']
-        )
+        last_session = session
+
+        # end_active_session checkpointed the session's rollup, so the interaction totals are
+        # one primary-key lookup; viewer and song aggregates ride along in the same round trip
+        metrics = await db.fetchrow('''
+            SELECT
+                COALESCE(stats.events, 0) AS total_interactions,
+                COALESCE(stats.gifts, 0) AS total_gifts,
+                COALESCE(stats.coins, 0) AS total_coins,
+                COALESCE(stats.likes, 0) AS total_likes,
+                COALESCE(stats.unique_handles, 0) AS unique_viewers,
+                viewers.avg_viewers,
+                viewers.peak_viewers,
+                viewers.viewer_series,
+                songs.songs_played
+            FROM (
+                SELECT
+                    SUM(avg_viewers * samples) / NULLIF(SUM(samples), 0) AS avg_viewers,
+                    MAX(max_viewers) AS peak_viewers,
+                    array_agg(avg_viewers ORDER BY bucket_start) AS viewer_series
+                FROM viewer_count_buckets
+                WHERE session_id = $1
+            ) AS viewers
+            CROSS JOIN (
+                SELECT COUNT(*) AS songs_played
+                FROM submissions
+                WHERE played_time >= $2 AND played_time <= $3
+            ) AS songs
+            LEFT JOIN session_stats stats ON stats.session_id = $1
+        ''', last_session['id'], last_session['started_at'], last_session['ended_at'])
 
         embed = discord.Embed(
             title=f"📊 Live Session Metrics - @{last_session['tiktok_username']}",
@@ -225,16 +219,21 @@ class Admin(commands.Cog):
         minutes = int((duration.total_seconds() % 3600) // 60)
 
         embed.add_field(name="Duration", value=f"{hours}h {minutes}m", inline=True)
-        embed.add_field(name="Songs Played", value=str(songs_played), inline=True)
-        embed.add_field(name="Total Interactions", value=str(total_interactions), inline=True)
-        embed.add_field(name="Total Gifts", value=str(total_gifts), inline=True)
-        embed.add_field(name="Total Coins", value=f"{total_coins:,}", inline=True)
-        embed.add_field(name="Unique Viewers", value=str(unique_viewers), inline=True)
-
-        if avg_viewers:
-            embed.add_field(name="Avg Viewers", value=f"{int(avg_viewers)}", inline=True)
-        if peak_viewers:
-            embed.add_field(name="Peak Viewers", value=str(peak_viewers), inline=True)
+        embed.add_field(name="Songs Played", value=str(metrics['songs_played']), inline=True)
+        embed.add_field(name="Total Interactions", value=str(metrics['total_interactions']), inline=True)
+        embed.add_field(name="Total Gifts", value=str(metrics['total_gifts']), inline=True)
+        embed.add_field(name="Total Coins", value=f"{metrics['total_coins']:,}", inline=True)
+        embed.add_field(name="Total Likes", value=f"{metrics['total_likes']:,}", inline=True)
+        embed.add_field(name="Unique Viewers", value=str(metrics['unique_viewers']), inline=True)
+
+        if metrics['avg_viewers']:
+            embed.add_field(name="Avg Viewers", value=f"{int(metrics['avg_viewers'])}", inline=True)
+        if metrics['peak_viewers']:
+            embed.add_field(name="Peak Viewers", value=str(metrics['peak_viewers']), inline=True)
+        if metrics['viewer_series'] and len(metrics['viewer_series']) > 1:
+            embed.add_field(
+                name="Viewers Over Time", value=f"`{sparkline(metrics['viewer_series'])}`", inline=False
+            )
 
         embed.set_footer(text=f"Session: {last_session['started_at'].strftime('%Y-%m-%d %H:%M')} - {last_session['ended_at'].strftime('%H:%M')}")
 
@@ -245,6 +244,137 @@ class Admin(commands.Cog):
         else:
             await interaction.followup.send("❌ Metrics channel not found.")
 
+    @app_commands.command(name="db-stats", description="Show database query and pool statistics")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def db_stats(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        embed = discord.Embed(
+            title="🗄️ Database Statistics",
+            color=discord.Color.dark_teal()
+        )
+
+        wait = db.acquire_wait
+        embed.add_field(
+            name="Pool",
+            value=(
+                f"Size: {db.pool.get_size()} (idle {db.pool.get_idle_size()}, "
+                f"max {db.pool.get_max_size()})\n"
+                f"Acquire wait p50/p99: {wait.percentile(50) * 1000:.1f}/{wait.percentile(99) * 1000:.1f} ms\n"
+                f"Waiting now/peak: {db.acquire_waiting.value}/{db.acquire_waiting.max}"
+            ),
+            inline=False
+        )
+
+        stats = db.query_stats()
+        for stat in stats[:10]:
+            embed.add_field(
+                name=stat['query'][:100],
+                value=(
+                    f"{stat['calls']} calls | {stat['total']:.2f}s total | "
+                    f"p50 {stat['p50'] * 1000:.1f} ms | p99 {stat['p99'] * 1000:.1f} ms | "
+                    f"~{stat['rows']:.1f} rows"
+                ),
+                inline=False
+            )
+
+        if not stats:
+            embed.description = "No queries recorded yet."
+
+        metrics_file = discord.File(
+            io.BytesIO(registry.render().encode()),
+            filename="metrics.txt"
+        )
+        await interaction.followup.send(embed=embed, file=metrics_file, ephemeral=True)
+
+    @app_commands.command(name="loop-stats", description="Show event loop lag and handler latency")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def loop_stats(self, interaction: discord.Interaction):
+        embed = discord.Embed(
+            title="⏱️ Event Loop Statistics",
+            color=discord.Color.dark_teal()
+        )
+        embed.add_field(
+            name="Loop lag",
+            value=(
+                f"p50/p99/max: {loop_lag.percentile(50) * 1000:.1f}/"
+                f"{loop_lag.percentile(99) * 1000:.1f}/{loop_lag.max * 1000:.1f} ms\n"
+                f"Stalls over threshold: {loop_blocked.value}"
+            ),
+            inline=False
+        )
+
+        handlers = sorted(
+            ((labels['handler'], h) for labels, h in registry.collect('event_handler_seconds') if h.count),
+            key=lambda item: item[1].percentile(99),
+            reverse=True
+        )
+        for name, histogram in handlers[:10]:
+            embed.add_field(
+                name=name,
+                value=(
+                    f"{histogram.count} calls | p50 {histogram.percentile(50) * 1000:.1f} ms | "
+                    f"p99 {histogram.percentile(99) * 1000:.1f} ms | max {histogram.max * 1000:.1f} ms"
+                ),
+                inline=False
+            )
+
+        delay = registry.histogram('interaction_dispatch_delay_seconds')
+        if delay.count:
+            embed.add_field(
+                name="Interaction dispatch delay",
+                value=f"p50 {delay.percentile(50) * 1000:.1f} ms | p99 {delay.percentile(99) * 1000:.1f} ms",
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="restore-points", description="Restore points to how they were at a point in time")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        timestamp="ISO 8601 time to restore to, e.g. 2025-10-10T04:30 (UTC unless an offset is given)",
+        confirm="Apply the restore; without it only the backups that would be used are shown"
+    )
+    async def restore_points_command(self, interaction: discord.Interaction, timestamp: str, confirm: bool = False):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            as_of = datetime.fromisoformat(timestamp)
+        except ValueError:
+            await interaction.followup.send(f"❌ `{timestamp}` is not an ISO 8601 timestamp", ephemeral=True)
+            return
+        if as_of.tzinfo is None:
+            as_of = as_of.replace(tzinfo=timezone.utc)
+
+        try:
+            plan = plan_restore(as_of)
+        except ValueError as e:
+            await interaction.followup.send(f"❌ {e}", ephemeral=True)
+            return
+
+        if not confirm:
+            await interaction.followup.send(
+                f"Restoring to {discord.utils.format_dt(as_of)} would use the full backup from "
+                f"{discord.utils.format_dt(plan.base.taken_at)} and {len(plan.deltas)} incremental backups. "
+                f"Run again with `confirm: True` to apply it; current points are backed up first.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            # A full backup of the current state makes the restore itself reversible
+            await run_backup(full=True)
+            result = await restore_points(as_of)
+        except Exception as e:
+            logger.error(f"Points restore to {as_of.isoformat()} failed: {e}", exc_info=True)
+            await interaction.followup.send(f"❌ Restore failed: {e}", ephemeral=True)
+            return
+
+        await interaction.followup.send(
+            f"✅ Points restored to {discord.utils.format_dt(as_of)}: {result.user_points} Discord users and "
+            f"{result.tiktok_accounts} TikTok handles changed.",
+            ephemeral=True
+        )
+
 
 async def setup(bot):
     await bot.add_cog(Admin(bot))
\ No newline at end of file
@@ -1,8 +1,9 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
+import asyncio
 import logging
-from database import db
+from database import db, INTERACTIVE_TIMEOUT, BACKGROUND_TIMEOUT
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -20,10 +21,10 @@ class LuxuryCoins(commands.Cog):
     async def watch_time_tracker(self):
         current_session = await db.fetchrow('''
             SELECT id FROM live_sessions
-            WHERE end_time IS NULL
-            ORDER BY start_time DESC
+            WHERE ended_at IS NULL AND status = 'active'
+            ORDER BY started_at DESC
             LIMIT 1
-        ''')
+        ''', timeout=BACKGROUND_TIMEOUT)
         
         if not current_session:
             return
@@ -35,14 +36,14 @@ class LuxuryCoins(commands.Cog):
             SET watch_seconds = watch_seconds + 60,
                 last_updated = NOW()
             WHERE session_id = $1
-        ''', session_id)
+        ''', session_id, timeout=BACKGROUND_TIMEOUT)
         
         watch_records = await db.fetch('''
             SELECT tw.*, ta.linked_discord_id
             FROM tiktok_watch_time tw
             JOIN tiktok_accounts ta ON tw.tiktok_account_id = ta.handle_id
             WHERE tw.session_id = $1 AND ta.linked_discord_id IS NOT NULL
-        ''', session_id)
+        ''', session_id, timeout=BACKGROUND_TIMEOUT)
         
         for record in watch_records:
             if record['watch_seconds'] >= 1800:
@@ -53,13 +54,13 @@ class LuxuryCoins(commands.Cog):
                     VALUES ($1, $2)
                     ON CONFLICT (user_id) DO UPDATE
                     SET balance = luxury_coins.balance + $2
-                ''', record['linked_discord_id'], coins_earned)
+                ''', record['linked_discord_id'], coins_earned, timeout=BACKGROUND_TIMEOUT)
                 
                 await db.execute('''
                     UPDATE tiktok_watch_time
                     SET watch_seconds = watch_seconds % 1800
                     WHERE id = $1
-                ''', record['id'])
+                ''', record['id'], timeout=BACKGROUND_TIMEOUT)
 
     @watch_time_tracker.before_loop
     async def before_watch_time_tracker(self):
@@ -86,10 +87,15 @@ class LuxuryCoins(commands.Cog):
     async def check_coins(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         
-        balance = await db.fetchval(
-            'SELECT balance FROM luxury_coins WHERE user_id = $1',
-            interaction.user.id
-        )
+        try:
+            balance = await db.fetchval(
+                'SELECT balance FROM luxury_coins WHERE user_id = $1',
+                interaction.user.id, timeout=INTERACTIVE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Coin balance lookup timed out for {interaction.user.id}")
+            await interaction.followup.send("❌ The database is busy right now, please try again in a moment.", ephemeral=True)
+            return
         
         if balance is None:
             balance = 0
@@ -143,7 +149,7 @@ class LuxuryCoins(commands.Cog):
             )
             return
         
-        async with db.pool.acquire() as conn:
+        async with db.acquire() as conn:
             async with conn.transaction():
                 await conn.execute(
                     'UPDATE luxury_coins SET balance = balance - 1000 WHERE user_id = $1',
@@ -191,11 +197,16 @@ class LuxuryCoins(commands.Cog):
     async def leaderboard_coins(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         
-        top_users = await db.fetch('''
-            SELECT user_id, balance FROM luxury_coins
-            ORDER BY balance DESC
-            LIMIT 10
-        ''')
+        try:
+            top_users = await db.fetch('''
+                SELECT user_id, balance FROM luxury_coins
+                ORDER BY balance DESC
+                LIMIT 10
+            ''', timeout=INTERACTIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Coin leaderboard query timed out")
+            await interaction.followup.send("❌ The database is busy right now, please try again in a moment.", ephemeral=True)
+            return
         
         if not top_users:
             await interaction.followup.send(
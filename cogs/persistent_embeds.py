@@ -2,9 +2,11 @@ import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 import logging
-from database import db
+from database import db, BACKGROUND_TIMEOUT, QUEUE_COUNT, QUEUE_PAGE
+from monitoring import timed_handler
 import hashlib
 import asyncio
+import json
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +20,11 @@ class PersistentEmbeds(commands.Cog):
         self.refresh_embeds.cancel()
 
     @tasks.loop(seconds=10)
+    @timed_handler('task.refresh_embeds')
     async def refresh_embeds(self):
         embeds = await db.fetch(
-            'SELECT * FROM persistent_embeds WHERE is_active = TRUE'
+            'SELECT * FROM persistent_embeds WHERE is_active = TRUE',
+            timeout=BACKGROUND_TIMEOUT
         )
         
         for i, embed_config in enumerate(embeds):
@@ -50,13 +54,15 @@ class PersistentEmbeds(commands.Cog):
         else:
             return
         
-        content_hash = hashlib.md5(str(content).encode()).hexdigest()
+        # str(Embed) is the object repr, which differs on every call; hash the payload instead
+        content_hash = hashlib.md5(json.dumps(content.to_dict(), sort_keys=True).encode()).hexdigest()
         
         if content_hash == embed_config['last_content_hash']:
             return
         
         try:
-            message = await channel.fetch_message(embed_config['message_id'])
+            # Editing a partial message skips the GET; a deleted message still raises NotFound
+            message = channel.get_partial_message(embed_config['message_id'])
             
             if embed_config['embed_type'] in ['reviewer_main', 'reviewer_pending']:
                 view = ReviewerView(self.bot, embed_config['embed_type'])
@@ -95,29 +101,8 @@ class PersistentEmbeds(commands.Cog):
     async def generate_live_queue_embed(self, page: int = 0):
         offset = page * 10
         
-        submissions = await db.fetch('''
-            SELECT * FROM submissions
-            WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played')
-            ORDER BY 
-                CASE queue_line
-                    WHEN '25+ Skip' THEN 1
-                    WHEN '20 Skip' THEN 2
-                    WHEN '15 Skip' THEN 3
-                    WHEN '10 Skip' THEN 4
-                    WHEN '5 Skip' THEN 5
-                    WHEN 'Free' THEN 6
-                    WHEN 'Pending Skips' THEN 7
-                    ELSE 999
-                END,
-                CASE WHEN queue_line = 'Free' THEN total_score ELSE 0 END DESC,
-                submission_time ASC
-            LIMIT 10 OFFSET $1
-        ''', offset)
-        
-        total = await db.fetchval('''
-            SELECT COUNT(*) FROM submissions
-            WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played')
-        ''')
+        submissions = await db.fetch(QUEUE_PAGE, 10, offset)
+        total = await db.fetchval(QUEUE_COUNT)
         
         embed = discord.Embed(
             title=f"🎵 Live Queue (Page {page + 1}/{max((total + 9) // 10, 1)})",
@@ -244,6 +229,7 @@ class PersistentEmbeds(commands.Cog):
         return emojis.get(queue_line, '📝')
 
     @commands.Cog.listener()
+    @timed_handler('discord.on_queue_update')
     async def on_queue_update(self):
         pass
 
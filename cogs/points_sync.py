@@ -1,11 +1,9 @@
 import discord
 from discord.ext import commands, tasks
 import logging
-from database import db
-import json
-import aiofiles
-from datetime import datetime
-import os
+from database import db, BACKGROUND_TIMEOUT
+from backup import run_backup
+from monitoring import timed_handler
 
 logger = logging.getLogger(__name__)
 
@@ -21,20 +19,21 @@ class PointsSync(commands.Cog):
         self.hourly_backup.cancel()
 
     @tasks.loop(seconds=30)
+    @timed_handler('task.sync_scores')
     async def sync_scores(self):
         try:
             submissions = await db.fetch('''
                 SELECT s.id, s.user_id, s.tiktok_username
                 FROM submissions s
                 WHERE s.queue_line = 'Free' AND s.played_time IS NULL
-            ''')
+            ''', timeout=BACKGROUND_TIMEOUT)
             
             for sub in submissions:
                 total_score = 0.0
                 
                 user_points = await db.fetchval(
                     'SELECT points FROM user_points WHERE user_id = $1',
-                    sub['user_id']
+                    sub['user_id'], timeout=BACKGROUND_TIMEOUT
                 )
                 
                 if user_points:
@@ -43,7 +42,7 @@ class PointsSync(commands.Cog):
                 if sub['tiktok_username']:
                     tiktok_points = await db.fetchval(
                         'SELECT points FROM tiktok_accounts WHERE handle_name = $1',
-                        sub['tiktok_username']
+                        sub['tiktok_username'], timeout=BACKGROUND_TIMEOUT
                     )
                     
                     if tiktok_points:
@@ -51,7 +50,7 @@ class PointsSync(commands.Cog):
                 
                 await db.execute(
                     'UPDATE submissions SET total_score = $1 WHERE id = $2',
-                    total_score, sub['id']
+                    total_score, sub['id'], timeout=BACKGROUND_TIMEOUT
                 )
                 
         except Exception as e:
@@ -62,36 +61,10 @@ class PointsSync(commands.Cog):
         await self.bot.wait_until_ready()
 
     @tasks.loop(hours=1)
+    @timed_handler('task.hourly_backup')
     async def hourly_backup(self):
         try:
-            os.makedirs('backups', exist_ok=True)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
-            user_points = await db.fetch('SELECT * FROM user_points')
-            user_points_data = [dict(row) for row in user_points]
-            
-            async with aiofiles.open(f'backups/user_points_{timestamp}.json', 'w') as f:
-                await f.write(json.dumps(user_points_data, indent=2))
-            
-            tiktok_accounts = await db.fetch('SELECT * FROM tiktok_accounts')
-            tiktok_data = []
-            for row in tiktok_accounts:
-                data = dict(row)
-                data['first_seen'] = data['first_seen'].isoformat() if data['first_seen'] else None
-                data['last_seen'] = data['last_seen'].isoformat() if data['last_seen'] else None
-                tiktok_data.append(data)
-            
-            async with aiofiles.open(f'backups/tiktok_accounts_{timestamp}.json', 'w') as f:
-                await f.write(json.dumps(tiktok_data, indent=2))
-            
-            logger.info(f"Hourly backup completed: {timestamp}")
-            
-            backup_files = sorted([f for f in os.listdir('backups') if f.endswith('.json')])
-            if len(backup_files) > 48:
-                for old_file in backup_files[:-48]:
-                    os.remove(f'backups/{old_file}')
-                    
+            await run_backup()
         except Exception as e:
             logger.error(f"Error in hourly_backup: {e}")
 
@@ -1,8 +1,11 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+import asyncio
 import logging
-from database import db
+from database import (
+    db, INTERACTIVE_TIMEOUT, NEXT_FREE_SUBMISSION, NEXT_TIER_SUBMISSION, QUEUE_COUNT, QUEUE_PAGE
+)
 from typing import Optional
 
 logger = logging.getLogger(__name__)
@@ -28,28 +31,16 @@ class Queue(commands.Cog):
         return QUEUE_PRIORITY.get(queue_line, 999)
 
     async def get_next_submission(self):
-        async with db.pool.acquire() as conn:
+        async with db.acquire() as conn:
             async with conn.transaction():
                 for queue_line in sorted(QUEUE_PRIORITY.keys(), key=lambda x: QUEUE_PRIORITY[x]):
                     if queue_line in ['Pending Skips', 'Songs Played', 'Removed']:
                         continue
                     
                     if queue_line == 'Free':
-                        submission = await conn.fetchrow('''
-                            SELECT * FROM submissions
-                            WHERE queue_line = 'Free' AND played_time IS NULL
-                            ORDER BY total_score DESC, submission_time ASC
-                            LIMIT 1
-                            FOR UPDATE SKIP LOCKED
-                        ''')
+                        submission = await db.fetchrow(NEXT_FREE_SUBMISSION, conn=conn)
                     else:
-                        submission = await conn.fetchrow('''
-                            SELECT * FROM submissions
-                            WHERE queue_line = $1 AND played_time IS NULL
-                            ORDER BY submission_time ASC
-                            LIMIT 1
-                            FOR UPDATE SKIP LOCKED
-                        ''', queue_line)
+                        submission = await db.fetchrow(NEXT_TIER_SUBMISSION, queue_line, conn=conn)
                     
                     if submission:
                         await conn.execute('''
@@ -113,29 +104,13 @@ class Queue(commands.Cog):
         
         offset = (page - 1) * 10
         
-        submissions = await db.fetch('''
-            SELECT * FROM submissions
-            WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played')
-            ORDER BY 
-                CASE queue_line
-                    WHEN '25+ Skip' THEN 1
-                    WHEN '20 Skip' THEN 2
-                    WHEN '15 Skip' THEN 3
-                    WHEN '10 Skip' THEN 4
-                    WHEN '5 Skip' THEN 5
-                    WHEN 'Free' THEN 6
-                    WHEN 'Pending Skips' THEN 7
-                    ELSE 999
-                END,
-                CASE WHEN queue_line = 'Free' THEN total_score ELSE 0 END DESC,
-                submission_time ASC
-            LIMIT 10 OFFSET $1
-        ''', offset)
-        
-        total = await db.fetchval('''
-            SELECT COUNT(*) FROM submissions
-            WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played')
-        ''')
+        try:
+            submissions = await db.fetch(QUEUE_PAGE, 10, offset, timeout=INTERACTIVE_TIMEOUT)
+            total = await db.fetchval(QUEUE_COUNT, timeout=INTERACTIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Queue page {page} query timed out")
+            await interaction.followup.send("❌ The database is busy right now, please try again in a moment.", ephemeral=True)
+            return
         
         if not submissions:
             await interaction.followup.send("The queue is empty!", ephemeral=True)
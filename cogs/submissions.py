@@ -8,6 +8,7 @@ import uuid
 import logging
 import asyncio
 from database import db
+from monitoring import timed_handler
 import io
 from datetime import datetime
 
@@ -235,6 +236,7 @@ class Submissions(commands.Cog):
         await interaction.response.send_modal(SubmitFileModal())
 
     @commands.Cog.listener()
+    @timed_handler('discord.on_message')
     async def on_message(self, message: discord.Message):
         if message.author.bot:
             return
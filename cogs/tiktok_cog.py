@@ -12,7 +12,9 @@ from TikTokLive.events import (
     RoomUserSeqEvent, PollEvent, LinkMicBattleEvent
 )
 from TikTokLive.client.errors import UserNotFoundError, UserOfflineError
+from backup import run_backup
 from database import QueueLine
+from ingest.eventlog import LazyVars, event_log
 
 # --- Constants ---
 # Tiered gift logic: Maps coin amounts to skip line rewards
@@ -500,15 +502,11 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
             if hasattr(event, 'user') and hasattr(event.user, 'badge'):
                 user_level = getattr(event.user.badge, 'level', None)
             
-            # DEBUG: Log complete event data
-            logging.debug(f"TIKTOK EVENT DEBUG [{interaction_type.upper()}]:")
-            logging.debug(f"  User: {event.user.unique_id}")
-            logging.debug(f"  Level: {user_level}")
-            logging.debug(f"  Points: {points}")
-            logging.debug(f"  Value: {value}")
-            logging.debug(f"  Coins: {coin_value}")
-            logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
-            
+            event_log.log(
+                interaction_type, "TIKTOK %s from %s (level %s, %d points, value=%r, coins=%s): %s",
+                interaction_type, event.user.unique_id, user_level, points, value, coin_value, LazyVars(event)
+            )
+
             tiktok_account_id = await self.bot.db.upsert_tiktok_account(event.user.unique_id)
             await self.bot.db.log_tiktok_interaction(self.current_session_id, tiktok_account_id, interaction_type, value, coin_value, user_level)
 
@@ -524,14 +522,13 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
             if discord_id:
                 await self.bot.db.add_points_to_user(discord_id, points)
                 
-            logging.info(f"TIKTOK: {interaction_type.capitalize()} from {event.user.unique_id} (Level {user_level}) - {points} points")
         except TypeError as e:
             # ENHANCED MONITORING: Handle nickName vs nick_name mismatch from TikTok API
             if 'nickName' in str(e) or 'nick_name' in str(e):
                 logging.warning(f"🔄 SCHEMA MISMATCH DETECTED: TikTok API changed user data format")
                 logging.warning(f"   Error: {e}")
                 logging.warning(f"   Event type: {interaction_type}")
-                logging.warning(f"   Raw event user data: {vars(event.user) if hasattr(event, 'user') and hasattr(event.user, '__dict__') else 'N/A'}")
+                logging.warning("   Raw event user data: %s", LazyVars(getattr(event, 'user', None)))
                 logging.warning(f"   🛡️ Attempting fallback processing to preserve data...")
                 
                 # Continue processing with whatever data we can extract
@@ -551,7 +548,7 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
                         discord_id = await self.bot.db.get_discord_id_from_handle(unique_id)
                         if discord_id:
                             await self.bot.db.add_points_to_user(discord_id, points)
-                        logging.info(f"✅ FALLBACK SUCCESS: {interaction_type.capitalize()} from @{unique_id} processed - {points} points awarded")
+                        logging.info("✅ FALLBACK SUCCESS: %s from @%s processed - %d points awarded", interaction_type, unique_id, points)
                 except Exception as fallback_error:
                     logging.error(f"❌ FALLBACK FAILED for {interaction_type}: {fallback_error}", exc_info=True)
             else:
@@ -568,11 +565,7 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
             # Just capture the handle in the database, no points awarded
             await self.bot.db.upsert_tiktok_account(event.user.unique_id)
             
-            # ENHANCED MONITORING: Confirmation message for join events
-            logging.info(f"👋 JOIN EVENT: @{event.user.unique_id} entered the stream (handle captured)")
-            logging.debug(f"TIKTOK EVENT DEBUG [JOIN]:")
-            logging.debug(f"  User: {event.user.unique_id}")
-            logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
+            event_log.log('join', "👋 JOIN EVENT: @%s entered the stream (handle captured): %s", event.user.unique_id, LazyVars(event))
         except Exception as e:
             logging.error(f"Failed to capture TikTok join event: {e}", exc_info=True)
 
@@ -580,8 +573,6 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
         await self._handle_interaction(event, 'like', INTERACTION_POINTS['like'])
 
     async def on_comment(self, event: CommentEvent):
-        # ENHANCED MONITORING: Log comment reception
-        logging.info(f"💬 COMMENT EVENT: @{event.user.unique_id if hasattr(event, 'user') and hasattr(event.user, 'unique_id') else 'unknown'} - '{event.comment if hasattr(event, 'comment') else 'N/A'}'")
         await self._handle_interaction(event, 'comment', INTERACTION_POINTS['comment'], value=event.comment)
 
     async def on_share(self, event: ShareEvent):
@@ -652,15 +643,12 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
     
     async def on_subscribe(self, event: SubscribeEvent):
         """Handles user subscriptions to the streamer."""
-        logging.debug(f"TIKTOK EVENT DEBUG [SUBSCRIBE]:")
-        logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
         await self._handle_interaction(event, 'subscribe', INTERACTION_POINTS['subscribe'])
     
     async def on_live_end(self, event: LiveEndEvent):
         """Handles the LiveEndEvent when the stream officially ends."""
         logging.info("TIKTOK: LiveEndEvent received - stream officially ended")
-        logging.debug(f"TIKTOK EVENT DEBUG [LIVE_END]:")
-        logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
+        logging.debug("TIKTOK EVENT DEBUG [LIVE_END]: %s", LazyVars(event))
         # The disconnect handler will clean everything up
     
     async def on_viewer_update(self, event: RoomUserSeqEvent):
@@ -675,18 +663,12 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
             # ENHANCED MONITORING: Validate viewer count data
             if viewer_count == 0:
                 logging.warning(f"⚠️ VIEWER COUNT WARNING: Received 0 viewers - stream may be offline or data unavailable")
-                logging.warning(f"Event data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
+                logging.warning("Event data: %s", LazyVars(event))
             elif viewer_count > 0:
-                logging.info(f"📊 VIEWER COUNT UPDATE: {viewer_count} active viewers")
-            
-            # DEBUG: Log viewer count updates
-            logging.debug(f"TIKTOK EVENT DEBUG [VIEWER_UPDATE]:")
-            logging.debug(f"  Viewer Count: {viewer_count}")
-            logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
-            
+                event_log.log('viewer_count', "📊 VIEWER COUNT UPDATE: %d active viewers: %s", viewer_count, LazyVars(event))
+
             # Log viewer count snapshot to database
             await self.bot.db.log_viewer_count(self.current_session_id, viewer_count)
-            logging.debug(f"TIKTOK: Viewer count update - {viewer_count} viewers")
         except Exception as e:
             logging.error(f"Failed to handle viewer update: {e}", exc_info=True)
     
@@ -703,11 +685,8 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
                 'duration': getattr(event, 'duration', 0)
             }
             
-            logging.info(f"TIKTOK: Poll started - {poll_data['question']}")
-            logging.debug(f"TIKTOK EVENT DEBUG [POLL]:")
-            logging.debug(f"  Question: {poll_data['question']}")
-            logging.debug(f"  Options: {poll_data['options']}")
-            logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
+            logging.info("TIKTOK: Poll started - %s", poll_data['question'])
+            logging.debug("TIKTOK EVENT DEBUG [POLL]: options=%s %s", poll_data['options'], LazyVars(event))
             
             # Log as a special interaction (no specific user)
             import json
@@ -734,11 +713,10 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
                 'status': getattr(event, 'status', 'unknown')
             }
             
-            logging.info(f"TIKTOK: Mic Battle event - Status: {battle_data['status']}")
-            logging.debug(f"TIKTOK EVENT DEBUG [MIC_BATTLE]:")
-            logging.debug(f"  Battle Users: {battle_data['battle_users']}")
-            logging.debug(f"  Status: {battle_data['status']}")
-            logging.debug(f"  Full Event Data: {vars(event) if hasattr(event, '__dict__') else 'N/A'}")
+            event_log.log(
+                'mic_battle', "TIKTOK: Mic Battle event - Status: %s, users: %s %s",
+                battle_data['status'], battle_data['battle_users'], LazyVars(event)
+            )
             
             # Log as a special interaction
             import json
@@ -768,26 +746,7 @@ class TikTokCog(commands.GroupCog, name="tiktok", description="Commands for mana
     async def points_backup_task(self):
         """Periodically creates a backup log of points data for recovery purposes."""
         try:
-            import json
-            from datetime import datetime
-            
-            # Get all user points
-            async with self.bot.db.pool.acquire() as conn:
-                user_points = await conn.fetch("SELECT user_id, points FROM user_points WHERE points > 0")
-                tiktok_points = await conn.fetch("SELECT handle_name, points, linked_discord_id FROM tiktok_accounts WHERE points > 0")
-            
-            backup_data = {
-                "timestamp": datetime.utcnow().isoformat(),
-                "user_points": [{"user_id": row['user_id'], "points": row['points']} for row in user_points],
-                "tiktok_points": [{"handle": row['handle_name'], "points": row['points'], "linked_discord_id": row['linked_discord_id']} for row in tiktok_points]
-            }
-            
-            # Write to backup file (rotating, keep last 24 backups)
-            backup_file = f"points_backup_{datetime.utcnow().strftime('%Y%m%d_%H')}.json"
-            with open(backup_file, 'w') as f:
-                json.dump(backup_data, f, indent=2)
-            
-            logging.info(f"Points backup completed: {len(user_points)} users, {len(tiktok_points)} TikTok handles")
+            await run_backup()
         except Exception as e:
             logging.error(f"Error in points_backup_task: {e}", exc_info=True)
 
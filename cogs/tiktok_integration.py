@@ -2,296 +2,791 @@ import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 from TikTokLive import TikTokLiveClient
-from TikTokLive.events import ConnectEvent, DisconnectEvent, LiveEndEvent, GiftEvent, JoinEvent, LikeEvent, CommentEvent, ShareEvent, FollowEvent, RoomUserSeqEvent
+from TikTokLive.events import ConnectEvent, DisconnectEvent, LiveEndEvent
 import logging
-from database import db
-from typing import Optional
+import os
+import time
+from database import db, INSERT_INTERACTION, UPSERT_TIKTOK_ACCOUNT
+from metrics import registry
+from monitoring import timed_handler
+from ingest.eventlog import event_log
+from ingest.events import TikTokEvent, normalize, to_fields
+from ingest.recorder import EVENT_RECORD_DIR, RECORDED_EVENTS, EventRecorder
+from ingest.rollup import SessionRollup
+from ingest.spool import SPOOL_DIR, SPOOL_FSYNC_SECONDS, Spool
+from ingest.streaks import STREAK_TIMEOUT_SECONDS, GiftStreak, StreakTracker
+from ingest.supervisor import ConnectionSupervisor
+from ingest.viewers import ViewerSeries, compact_viewer_buckets, sparkline
+from ingest.worker import INGEST_MODE, read_events, spawn_worker
+from ingest.writer import InteractionWriter
+from partitions import drop_expired_interaction_partitions, ensure_interaction_partitions
+from typing import Dict, List, Optional
 import asyncio
 
 logger = logging.getLogger(__name__)
 
-
-class TikTokIntegration(commands.Cog):
-    def __init__(self, bot):
+# Likes arrive in floods on popular streams; they are summed per handle in memory
+# and written as one row per handle every this many seconds
+LIKE_FLUSH_SECONDS = float(os.getenv('TIKTOK_LIKE_FLUSH_SECONDS', '5'))
+# How often the live session counters are written to session_stats / session_handle_stats
+ROLLUP_CHECKPOINT_SECONDS = float(os.getenv('TIKTOK_ROLLUP_CHECKPOINT_SECONDS', '5'))
+# Concurrent streams one bot will follow
+MAX_STREAMS = int(os.getenv('TIKTOK_MAX_STREAMS', '5'))
+# Handlers one ingest worker may have running at once; beyond it the worker's socket backs up
+WORKER_MAX_IN_FLIGHT = int(os.getenv('TIKTOK_WORKER_MAX_IN_FLIGHT', '64'))
+# Worker events that end the connection; everything sent before them is handled first
+WORKER_FINAL_EVENTS = ('disconnect', 'live_end')
+
+# Event kind -> LiveStream handler
+EVENT_HANDLERS = {
+    'connect': 'handle_connect',
+    'disconnect': 'handle_disconnect',
+    'live_end': 'handle_live_end',
+    'gift': 'handle_gift',
+    'join': 'handle_join',
+    'like': 'handle_like',
+    'comment': 'handle_comment',
+    'share': 'handle_share',
+    'follow': 'handle_follow',
+    'viewer_count': 'handle_viewer_count',
+}
+
+
+class LiveStream:
+    """One followed TikTok account: its connection, live session and in-memory state."""
+
+    def __init__(self, bot, username: str, writer: InteractionWriter, persistent: bool = True,
+                 spool: Optional[Spool] = None):
         self.bot = bot
+        self.username = username
+        self.writer = writer
+        self.spool = spool
+        self.persistent_connection = persistent
         self.client: Optional[TikTokLiveClient] = None
         self.session_id: Optional[int] = None
-        self.persistent_connection = False
-        self.username = None
-        self.gift_streaks = {}
+        self.session_started_at = None
+        self.streaks = StreakTracker()
         self.active_session_id = None
-
-    async def get_or_create_tiktok_account(self, handle_name: str, user_level: int = 0):
-        row = await db.fetchrow(
-            'SELECT * FROM tiktok_accounts WHERE handle_name = $1',
-            handle_name
+        self.recorder: Optional[EventRecorder] = None
+        # handle name -> [likes since the last flush, latest user level, spool seqs]
+        self.pending_likes: Dict[str, list] = {}
+        # Gift ids already upserted into tiktok_gifts by this stream, and every gift's name seen
+        self.known_gifts = set()
+        self.gift_names: Dict[int, str] = {}
+        self.rollup: Optional[SessionRollup] = None
+        self.viewers: Optional[ViewerSeries] = None
+        self.supervisor: Optional[ConnectionSupervisor] = None
+        # Ingest subprocess and its in-flight handler tasks (TIKTOK_INGEST_MODE=worker)
+        self.worker: Optional[asyncio.subprocess.Process] = None
+        self.worker_tasks = set()
+        self.events_total = registry.counter(
+            'tiktok_stream_events_total', 'TikTok events received per stream', labels={'stream': username}
         )
+        self.connected_since: Optional[float] = None
+        self.events_at_connect = 0
 
-        if row:
-            await db.execute(
-                'UPDATE tiktok_accounts SET last_seen = NOW(), last_known_level = $1 WHERE handle_name = $2',
-                user_level, handle_name
-            )
-            return row['handle_id']
-        else:
-            handle_id = await db.fetchval(
-                'INSERT INTO tiktok_accounts (handle_name, last_known_level) VALUES ($1, $2) RETURNING handle_id',
-                handle_name, user_level
-            )
-            return handle_id
+    async def get_or_create_tiktok_account(self, handle_name: str, user_level: int = 0, conn=None):
+        return await db.fetchval(UPSERT_TIKTOK_ACCOUNT, handle_name, user_level, conn=conn)
 
     async def log_interaction(self, tiktok_account_id: int, interaction_type: str,
-                             value: str = None, coin_value: int = None, user_level: int = 0):
+                             value: str = None, coin_value: int = None, user_level: int = 0,
+                             gift_id: int = None, repeat_count: int = None, conn=None):
         if self.session_id:
-            await db.execute('''
-                INSERT INTO tiktok_interactions 
-                (session_id, tiktok_account_id, interaction_type, value, coin_value, user_level)
-                VALUES ($1, $2, $3, $4, $5, $6)
-            ''', self.session_id, tiktok_account_id, interaction_type, value, coin_value, user_level)
+            await db.execute(
+                INSERT_INTERACTION,
+                self.session_id, tiktok_account_id, interaction_type, value, coin_value, user_level,
+                gift_id, repeat_count, conn=conn
+            )
 
-    async def process_gift(self, gift_event):
-        user = gift_event.user
-        gift = gift_event.gift
+    def spool_event(self, event: TikTokEvent) -> Optional[int]:
+        """Append an event to the spool before any database work; returns its seq to ack."""
+        if self.spool is None or not self.session_id:
+            return None
+        return self.spool.append({'stream': self.username, 'session': self.session_id, 'event': event})
 
-        handle_id = await self.get_or_create_tiktok_account(user.unique_id, getattr(user, 'level', 0))
+    def queue_interaction(self, event: TikTokEvent):
+        """Hand a high-volume interaction to the shared batch writer."""
+        if self.session_id:
+            seq = self.spool_event(event)
+            self.writer.add(
+                self.session_id, event.kind, event.handle, event.level, comment=event.text,
+                seqs=() if seq is None else (seq,)
+            )
 
-        is_streaking = getattr(gift_event, 'streaking', False)
+    async def apply_spooled(self, event: TikTokEvent, seq: int):
+        """Re-apply an event the previous run spooled but never acked."""
+        if event.kind == 'gift':
+            # Acked by record_gift once the gift is committed
+            await self.process_gift(event, seq)
+        elif event.kind == 'like':
+            self.writer.add(self.session_id, 'like', event.handle, event.level, like_count=event.count, seqs=(seq,))
+        else:
+            self.writer.add(self.session_id, event.kind, event.handle, event.level, comment=event.text, seqs=(seq,))
 
-        if is_streaking:
-            streak_key = f"{user.unique_id}_{gift.id}"
-            self.gift_streaks[streak_key] = gift_event
+    async def remember_gift(self, gift_id: int, diamond_count: int, conn=None):
+        """Record a gift's name once so interaction rows only need its id."""
+        if gift_id in self.known_gifts:
             return
-
-        streak_key = f"{user.unique_id}_{gift.id}"
-        if streak_key in self.gift_streaks:
-            del self.gift_streaks[streak_key]
-
-        diamond_count = gift.diamond_count * gift_event.repeat_count
-
+        await db.execute('''
+            INSERT INTO tiktok_gifts (gift_id, name, diamond_count) VALUES ($1, $2, $3)
+            ON CONFLICT (gift_id) DO UPDATE
+            SET name = EXCLUDED.name, diamond_count = EXCLUDED.diamond_count, updated_at = NOW()
+        ''', gift_id, self.gift_names[gift_id], diamond_count, conn=conn)
+
+    def flush_likes(self):
+        """Queue the likes accumulated since the last flush, one row per handle."""
+        pending, self.pending_likes = self.pending_likes, {}
+        if not self.session_id:
+            return
+        for handle, (count, level, seqs) in pending.items():
+            self.writer.add(self.session_id, 'like', handle, level, like_count=count, seqs=seqs)
+
+    def count_interaction(self, interaction_type: str, handle: str, count: int = 1, coins: int = 0):
+        self.events_total.inc()
+        if self.supervisor:
+            self.supervisor.touch()
+        if self.rollup:
+            self.rollup.record(interaction_type, handle, count, coins)
+
+    def events_per_minute(self) -> float:
+        if self.connected_since is None:
+            return 0.0
+        elapsed = time.monotonic() - self.connected_since
+        return (self.events_total.value - self.events_at_connect) / elapsed * 60 if elapsed > 0 else 0.0
+
+    async def process_gift(self, event: TikTokEvent, seq: Optional[int] = None):
+        # In-progress streak frames stop here without any I/O
+        self.gift_names[event.gift_id] = event.text
+        finished = self.streaks.update(
+            event.handle, event.gift_id, event.count, event.coin_value, event.level, event.streaking, seq=seq
+        )
+        if finished:
+            await self.record_gift(event.handle, finished)
+
+    async def expire_streaks(self):
+        """Record the streaks whose final frame never arrived."""
+        for handle, streak in self.streaks.expire():
+            logger.info(f"Gift streak {handle}/{streak.gift_id} timed out at x{streak.repeat_count}")
+            await self.record_gift(handle, streak)
+
+    async def record_gift(self, handle: str, streak: GiftStreak):
+        """Credit one finished gift: points, the interaction row and the submission's skip tier.
+
+        Everything is written in one transaction and the streak's spool seqs are only acked once
+        it commits. A spooled gift's first seq is claimed in the same transaction, so a gift
+        redelivered after a crash is acked without being credited twice.
+        """
+        seqs = streak.seqs
+        if not streak.count:
+            # A late final frame repeating what its expired streak already recorded
+            self.ack(seqs)
+            return
+        diamond_count = streak.coins
         if diamond_count < 1000:
             points = diamond_count * 2
         else:
             points = diamond_count
 
-        await db.execute(
-            'UPDATE tiktok_accounts SET points = points + $1 WHERE handle_id = $2',
-            points, handle_id
-        )
-
-        await self.log_interaction(handle_id, 'gift', gift.name, diamond_count, getattr(user, 'level', 0))
-
-        linked_discord_id = await db.fetchval(
-            'SELECT linked_discord_id FROM tiktok_accounts WHERE handle_id = $1',
-            handle_id
-        )
-
-        if linked_discord_id:
-            await db.execute(
-                'INSERT INTO user_points (user_id, points) VALUES ($1, $2) ON CONFLICT (user_id) DO UPDATE SET points = user_points.points + $2',
-                linked_discord_id, points
-            )
-
-        submission = await db.fetchrow('''
-            SELECT * FROM submissions
-            WHERE user_id = $1 AND queue_line IN ('Free', 'Pending Skips')
-            ORDER BY submission_time DESC
-            LIMIT 1
-        ''', linked_discord_id or 0)
-
-        if submission and linked_discord_id:
-            total_gifts = await db.fetchval('''
-                SELECT COALESCE(SUM(coin_value), 0) FROM tiktok_interactions
-                WHERE tiktok_account_id = $1 AND interaction_type = 'gift'
-                AND session_id = $2
-            ''', handle_id, self.session_id)
-
-            new_queue = None
-            if total_gifts >= 6000:
-                new_queue = '25+ Skip'
-            elif total_gifts >= 5000:
-                new_queue = '20 Skip'
-            elif total_gifts >= 4000:
-                new_queue = '15 Skip'
-            elif total_gifts >= 2000:
-                new_queue = '10 Skip'
-            elif total_gifts >= 1000:
-                new_queue = '5 Skip'
-
-            if new_queue and new_queue != submission['queue_line']:
-                await db.execute(
-                    'UPDATE submissions SET queue_line = $1 WHERE id = $2',
-                    new_queue, submission['id']
+        submission = new_queue = None
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                if seqs and self.session_id:
+                    claimed = await db.fetchval('''
+                        INSERT INTO tiktok_spool_applied (session_id, seq) VALUES ($1, $2)
+                        ON CONFLICT DO NOTHING RETURNING seq
+                    ''', self.session_id, seqs[0], conn=conn)
+                    if claimed is None:
+                        logger.info(f"Skipping gift from {handle} already credited (spool seq {seqs[0]})")
+                        self.ack(seqs)
+                        return
+
+                handle_id = await self.get_or_create_tiktok_account(handle, streak.user_level, conn=conn)
+                linked_discord_id = await db.fetchval('''
+                    UPDATE tiktok_accounts SET points = points + $1 WHERE handle_id = $2
+                    RETURNING linked_discord_id
+                ''', points, handle_id, conn=conn)
+                await self.remember_gift(streak.gift_id, streak.diamond_count, conn=conn)
+                await self.log_interaction(
+                    handle_id, 'gift', coin_value=diamond_count, user_level=streak.user_level,
+                    gift_id=streak.gift_id, repeat_count=streak.count, conn=conn
                 )
-                self.bot.dispatch('queue_update')
-                logger.info(f"Moved submission {submission['public_id']} to {new_queue}")
+
+                if linked_discord_id:
+                    await db.execute(
+                        'INSERT INTO user_points (user_id, points) VALUES ($1, $2) ON CONFLICT (user_id) DO UPDATE SET points = user_points.points + $2',
+                        linked_discord_id, points, conn=conn
+                    )
+                    submission = await db.fetchrow('''
+                        SELECT * FROM submissions
+                        WHERE user_id = $1 AND queue_line IN ('Free', 'Pending Skips')
+                        ORDER BY submission_time DESC
+                        LIMIT 1
+                    ''', linked_discord_id, conn=conn)
+
+                if submission:
+                    # The timestamp bound lets Postgres prune to the session's month partition(s)
+                    total_gifts = await db.fetchval('''
+                        SELECT COALESCE(SUM(coin_value), 0) FROM tiktok_interactions
+                        WHERE tiktok_account_id = $1 AND interaction_type = 'gift'
+                        AND session_id = $2 AND timestamp >= $3
+                    ''', handle_id, self.session_id, self.session_started_at, conn=conn)
+
+                    if total_gifts >= 6000:
+                        new_queue = '25+ Skip'
+                    elif total_gifts >= 5000:
+                        new_queue = '20 Skip'
+                    elif total_gifts >= 4000:
+                        new_queue = '15 Skip'
+                    elif total_gifts >= 2000:
+                        new_queue = '10 Skip'
+                    elif total_gifts >= 1000:
+                        new_queue = '5 Skip'
+
+                    if new_queue == submission['queue_line']:
+                        new_queue = None
+                    if new_queue:
+                        await db.execute(
+                            'UPDATE submissions SET queue_line = $1 WHERE id = $2',
+                            new_queue, submission['id'], conn=conn
+                        )
+
+        # In-memory state, acks and notifications only once the gift is committed
+        self.known_gifts.add(streak.gift_id)
+        self.count_interaction('gift', handle, coins=diamond_count)
+        self.ack(seqs)
+        if new_queue:
+            self.bot.dispatch('queue_update')
+            logger.info(f"Moved submission {submission['public_id']} to {new_queue}")
+
+    def ack(self, seqs):
+        for seq in seqs:
+            self.spool.ack(seq)
 
     async def end_active_session(self):
         """End active session and return session data for immediate use"""
         if self.active_session_id:
+            # Streaks cut off by the end of the stream still count
+            for handle, streak in self.streaks.drain():
+                try:
+                    await self.record_gift(handle, streak)
+                except Exception as e:
+                    logger.error(f"Error recording open gift streak for {handle}: {e}")
+            # Everything this session queued must be written before it is summarised
+            self.flush_likes()
+            await self.writer.flush()
+            rollup, self.rollup = self.rollup, None
+            if rollup:
+                await rollup.checkpoint()
+            viewers, self.viewers = self.viewers, None
+            if viewers:
+                await viewers.close()
+
             # Update and return the session in a single query
             session = await db.fetchrow('''
                 UPDATE live_sessions
                 SET status = 'completed', ended_at = NOW()
                 WHERE session_id = $1
-                RETURNING session_id, started_at, ended_at
+                RETURNING id, session_id, tiktok_username, started_at, ended_at
             ''', self.active_session_id)
 
-            logger.info(f"Ended session {self.active_session_id}")
+            logger.info(f"Ended session {self.active_session_id} for @{self.username}")
             self.active_session_id = None
-            self.gift_streaks.clear()
 
             return session
 
         return None
 
-    @app_commands.command(name="tiktok-connect", description="Connect to a TikTok live stream")
-    @app_commands.checks.has_permissions(manage_guild=True)
-    async def tiktok_connect(self, interaction: discord.Interaction, 
-                            username: str, persistent: bool = True):
-        if not interaction.response.is_done():
-            await interaction.response.defer()
+    def register_handlers(self, client: TikTokLiveClient):
+        client.add_listener(ConnectEvent, self.handle_connect)
+        client.add_listener(DisconnectEvent, self.handle_disconnect)
+        client.add_listener(LiveEndEvent, self.handle_live_end)
+        for kind, (event_type, _) in RECORDED_EVENTS.items():
+            client.add_listener(event_type, self._normalizing(kind))
+
+    def _normalizing(self, kind: str):
+        """A listener that hands the kind's handler a TikTokEvent instead of the TikTokLive event."""
+        handler = getattr(self, EVENT_HANDLERS[kind])
+
+        async def listener(event):
+            record = normalize(kind, event)
+            event_log.event(self.username, record)
+            await handler(record)
+        return listener
+
+    async def connect_once(self):
+        """One connection attempt; returns when the websocket closes."""
+        if INGEST_MODE == 'worker':
+            await self.consume_worker(*await spawn_worker(self.username))
+            return
+
+        # A fresh client per attempt, so no state survives from a dropped connection
+        client = TikTokLiveClient(unique_id=self.username)
+        self.register_handlers(client)
+        if self.recorder:
+            self.recorder.attach(client)
+        self.client = client
+        try:
+            await client.connect()
+        finally:
+            try:
+                await client.disconnect(close_client=True)
+            except Exception:
+                pass
 
+    def _handler_done(self, task: asyncio.Task):
+        self.worker_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error handling worker event for @{self.username}: {task.exception()!r}")
+
+    async def consume_worker(self, process: asyncio.subprocess.Process, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+        """Run the handlers for everything an ingest worker sends; returns when it exits."""
+        self.worker = process
+        in_flight = asyncio.Semaphore(WORKER_MAX_IN_FLIGHT)
+        error = None
+        try:
+            async for event in read_events(reader):
+                if event.kind == 'error':
+                    error = event.text
+                    continue
+                event_log.event(self.username, event)
+                if self.recorder and event.kind in RECORDED_EVENTS:
+                    self.recorder.record(event.kind, to_fields(event))
+                handler = getattr(self, EVENT_HANDLERS[event.kind])
+                if event.kind == 'connect':
+                    # Later events need the session this opens
+                    await handler(event)
+                    continue
+                if event.kind in WORKER_FINAL_EVENTS:
+                    # Ending the session must not overtake the events still being handled
+                    await self.wait_worker_tasks()
+                    await handler(event)
+                    continue
+                # One task per event, as TikTokLiveClient dispatches them in-process; the next
+                # line is only read once a handler slot is free
+                await in_flight.acquire()
+                task = asyncio.create_task(handler(event))
+                self.worker_tasks.add(task)
+                task.add_done_callback(self._handler_done)
+                task.add_done_callback(lambda _: in_flight.release())
+        except asyncio.CancelledError:
+            for task in self.worker_tasks:
+                task.cancel()
+            raise
+        finally:
+            await self.wait_worker_tasks()
+            writer.close()
+            if process.returncode is None:
+                process.terminate()
+            await process.wait()
+            self.worker = None
+        if error:
+            raise ConnectionError(f"TikTok ingest worker for @{self.username} failed: {error}")
+
+    async def wait_worker_tasks(self):
+        """Wait for every worker event handler still running; their errors are already logged."""
+        if self.worker_tasks:
+            await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+
+    async def drop_connection(self):
+        if self.worker and self.worker.returncode is None:
+            self.worker.terminate()
         if self.client:
-            await interaction.followup.send("❌ Already connected to a TikTok stream. Disconnect first.")
-            return
+            await self.client.disconnect()
 
-        self.username = username
-        self.persistent_connection = persistent
+    def start(self):
+        if EVENT_RECORD_DIR:
+            self.recorder = EventRecorder.for_stream(EVENT_RECORD_DIR, self.username)
+
+        self.supervisor = ConnectionSupervisor(
+            self.connect_once,
+            self.drop_connection,
+            on_outage_expired=self.end_active_session,
+            persistent=self.persistent_connection
+        )
+        self.supervisor.start()
+
+    async def stop(self):
+        if self.supervisor:
+            await self.supervisor.stop()
+            self.supervisor = None
+        self.client = None
+
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
 
+        # Ensure session is ended if it was active
+        if self.active_session_id:
+            await self.end_active_session()
+
+        self.session_id = None
+        self.session_started_at = None
+        self.active_session_id = None
+
+    @property
+    def running(self) -> bool:
+        return self.supervisor is not None and self.supervisor.state != 'stopped'
+
+    @timed_handler('tiktok.connect')
+    async def handle_connect(self, event: ConnectEvent):
+        if self.supervisor:
+            self.supervisor.mark_connected()
+        self.connected_since = time.monotonic()
+        self.events_at_connect = self.events_total.value
+
+        if self.active_session_id:
+            # Reconnected inside the grace window: carry on with the same session
+            logger.info(f"Reconnected to @{self.username}'s live stream, resuming session {self.active_session_id}")
+            self.session_id = self.active_session_id
+            return
+
+        logger.info(f"Connected to @{self.username}'s live stream")
         try:
-            self.client = TikTokLiveClient(unique_id=username)
-
-            @self.client.on(ConnectEvent)
-            async def on_connect(event: ConnectEvent):
-                logger.info(f"Connected to @{username}'s live stream")
-                self.session_id = await db.fetchval(
-                    'INSERT INTO live_sessions (tiktok_username, status) VALUES ($1, $2) RETURNING id',
-                    username, 'active'
-                )
-                self.active_session_id = self.session_id
-                
-                # Update session_id column to match id
-                await db.execute(
-                    'UPDATE live_sessions SET session_id = id WHERE id = $1',
-                    self.session_id
-                )
+            # Interactions are partitioned by month; make sure this session's rows have a home
+            await ensure_interaction_partitions()
+            await drop_expired_interaction_partitions()
+            await compact_viewer_buckets()
+        except Exception as e:
+            logger.error(f"Error maintaining interaction partitions: {e}")
 
-            @self.client.on(DisconnectEvent)
-            async def on_disconnect(event: DisconnectEvent):
-                logger.info(f"Disconnected from @{username}'s stream")
-                # Ensure session is ended on disconnect if it was active
-                if self.active_session_id:
-                    await self.end_active_session()
-
-            @self.client.on(LiveEndEvent)
-            async def on_live_end(event: LiveEndEvent):
-                logger.info(f"@{username}'s live stream ended")
-                await self.end_active_session() # Use the modified end_active_session
-                await self.disconnect_tiktok()
-
-            @self.client.on(GiftEvent)
-            async def on_gift(event: GiftEvent):
-                await self.process_gift(event)
-
-            @self.client.on(JoinEvent)
-            async def on_join(event: JoinEvent):
-                handle_id = await self.get_or_create_tiktok_account(
-                    event.user.unique_id,
-                    getattr(event.user, 'level', 0)
-                )
-                await self.log_interaction(handle_id, 'join', user_level=getattr(event.user, 'level', 0))
+        session = await db.fetchrow(
+            'INSERT INTO live_sessions (tiktok_username, status) VALUES ($1, $2) RETURNING id, started_at',
+            self.username, 'active'
+        )
+        self.session_id = session['id']
+        self.session_started_at = session['started_at']
+        self.active_session_id = self.session_id
+        self.rollup = SessionRollup(self.session_id)
+        self.viewers = ViewerSeries(self.session_id)
 
-            @self.client.on(LikeEvent)
-            async def on_like(event: LikeEvent):
-                handle_id = await self.get_or_create_tiktok_account(
-                    event.user.unique_id,
-                    getattr(event.user, 'level', 0)
-                )
-                like_count = getattr(event, 'count', getattr(event, 'total_likes', 1))
-                await self.log_interaction(handle_id, 'like', str(like_count), user_level=getattr(event.user, 'level', 0))
+        # Update session_id column to match id
+        await db.execute(
+            'UPDATE live_sessions SET session_id = id WHERE id = $1',
+            self.session_id
+        )
+        self.pending_likes.clear()
+
+    @timed_handler('tiktok.disconnect')
+    async def handle_disconnect(self, event: DisconnectEvent):
+        self.connected_since = None
+        if self.supervisor:
+            # The supervisor reconnects; the session ends only if the outage outlasts the grace window
+            logger.info(f"Disconnected from @{self.username}'s stream; reconnecting")
+            return
 
-            @self.client.on(CommentEvent)
-            async def on_comment(event: CommentEvent):
-                try:
-                    handle_id = await self.get_or_create_tiktok_account(
-                        event.user.unique_id,
-                        getattr(event.user, 'level', 0)
+        logger.info(f"Disconnected from @{self.username}'s stream")
+        if self.active_session_id:
+            await self.end_active_session()
+
+    @timed_handler('tiktok.live_end')
+    async def handle_live_end(self, event: LiveEndEvent):
+        logger.info(f"@{self.username}'s live stream ended")
+        await self.end_active_session()
+        if self.supervisor is None:
+            await self.stop()
+            return
+        if not self.supervisor.persistent:
+            # Worker mode awaits this inside the supervisor's own task, which must not stop
+            # itself; ending the connection lets its loop exit instead
+            self.supervisor.finish()
+        # A persistent supervisor keeps retrying until the next stream starts
+        await self.drop_connection()
+
+    @timed_handler('tiktok.gift')
+    async def handle_gift(self, event: TikTokEvent):
+        await self.process_gift(event, self.spool_event(event))
+
+    @timed_handler('tiktok.join')
+    async def handle_join(self, event: TikTokEvent):
+        self.count_interaction('join', event.handle)
+        self.queue_interaction(event)
+
+    @timed_handler('tiktok.like')
+    async def handle_like(self, event: TikTokEvent):
+        # No I/O here: likes are summed per handle and queued by the like flush loop
+        if not self.session_id:
+            return
+        entry = self.pending_likes.setdefault(event.handle, [0, 0, []])
+        entry[0] += event.count
+        entry[1] = event.level
+        seq = self.spool_event(event)
+        if seq is not None:
+            entry[2].append(seq)
+        self.count_interaction('like', event.handle, event.count)
+
+    @timed_handler('tiktok.comment')
+    async def handle_comment(self, event: TikTokEvent):
+        self.count_interaction('comment', event.handle)
+        self.queue_interaction(event)
+
+    @timed_handler('tiktok.share')
+    async def handle_share(self, event: TikTokEvent):
+        self.count_interaction('share', event.handle)
+        self.queue_interaction(event)
+
+    @timed_handler('tiktok.follow')
+    async def handle_follow(self, event: TikTokEvent):
+        self.count_interaction('follow', event.handle)
+        self.queue_interaction(event)
+
+    @timed_handler('tiktok.viewer_count')
+    async def handle_viewer_count(self, event: TikTokEvent):
+        if self.supervisor:
+            self.supervisor.touch()
+        if self.viewers:
+            # Samples are folded into buckets; a row is written only when a bucket closes
+            closed = self.viewers.add(event.count)
+            if closed:
+                await self.viewers.write(closed)
+
+    def status_embed(self) -> discord.Embed:
+        supervisor = self.supervisor
+        if supervisor and supervisor.state in ('connecting', 'backoff'):
+            embed = discord.Embed(
+                title="🔄 TikTok Reconnecting",
+                color=discord.Color.orange()
+            )
+            embed.add_field(name="Username", value=f"@{self.username}")
+            embed.add_field(name="Attempt", value=str(supervisor.attempts))
+            if supervisor.lost_at is not None:
+                embed.add_field(name="Down For", value=f"{supervisor.outage_seconds():.0f}s")
+            if self.active_session_id:
+                embed.add_field(name="Session ID", value=f"{self.active_session_id} (resumes on reconnect)")
+            if supervisor.last_error:
+                embed.add_field(name="Last Error", value=repr(supervisor.last_error)[:1000], inline=False)
+        elif supervisor and supervisor.state == 'connected':
+            embed = discord.Embed(
+                title="✅ TikTok Connected",
+                color=discord.Color.green()
+            )
+            embed.add_field(name="Username", value=f"@{self.username}")
+            embed.add_field(name="Session ID", value=str(self.session_id))
+            embed.add_field(name="Persistent", value="Yes" if self.persistent_connection else "No")
+            embed.add_field(name="Events / min", value=f"{self.events_per_minute():,.0f}")
+            if self.worker:
+                embed.add_field(name="Ingest Worker", value=f"pid {self.worker.pid}")
+            if supervisor.reconnects:
+                embed.add_field(name="Reconnects", value=str(supervisor.reconnects))
+            if self.rollup:
+                # Straight from the in-memory counters, no database round trip
+                totals = self.rollup.totals
+                embed.add_field(name="Viewers Seen", value=f"{len(self.rollup.handles):,}")
+                embed.add_field(name="Likes", value=f"{totals['likes']:,}")
+                embed.add_field(name="Comments", value=f"{totals['comments']:,}")
+                embed.add_field(name="Gifts", value=f"{totals['gifts']:,}")
+                embed.add_field(name="Coins", value=f"{totals['coins']:,}")
+                embed.add_field(name="Shares / Follows", value=f"{totals['shares']:,} / {totals['follows']:,}")
+                if self.viewers and self.viewers.recent:
+                    recent = [viewers for _, viewers in self.viewers.recent]
+                    embed.add_field(
+                        name="Viewers",
+                        value=f"{recent[-1]:,} now, {self.viewers.peak:,} peak\n`{sparkline(recent, 30)}`",
+                        inline=False
                     )
-                    await self.log_interaction(handle_id, 'comment', event.comment, user_level=getattr(event.user, 'level', 0))
-                except Exception as e:
-                    logger.error(f"Error processing comment: {e}")
+                gifters = self.rollup.top_gifters()
+                if gifters:
+                    embed.add_field(
+                        name="Top Gifters",
+                        value="\n".join(f"@{handle}: {coins:,}" for handle, coins in gifters),
+                        inline=False
+                    )
+        else:
+            embed = discord.Embed(
+                title=f"❌ TikTok Disconnected - @{self.username}",
+                color=discord.Color.red()
+            )
+        return embed
 
-            @self.client.on(ShareEvent)
-            async def on_share(event: ShareEvent):
-                handle_id = await self.get_or_create_tiktok_account(
-                    event.user.unique_id,
-                    getattr(event.user, 'level', 0)
-                )
-                await self.log_interaction(handle_id, 'share', user_level=getattr(event.user, 'level', 0))
 
-            @self.client.on(FollowEvent)
-            async def on_follow(event: FollowEvent):
-                handle_id = await self.get_or_create_tiktok_account(
-                    event.user.unique_id,
-                    getattr(event.user, 'level', 0)
+class TikTokIntegration(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        # username -> stream; every stream shares one batched interaction writer
+        self.streams: Dict[str, LiveStream] = {}
+        # Events are spooled to disk before any database work when TIKTOK_SPOOL_DIR is set
+        self.spool = Spool(SPOOL_DIR) if SPOOL_DIR else None
+        self.writer = InteractionWriter(spool=self.spool)
+        self.writer.start()
+        self.like_flush_loop.start()
+        self.rollup_checkpoint_loop.start()
+        self.streak_expiry_loop.start()
+        self.partition_loop.start()
+        if self.spool:
+            self.spool_sync_loop.start()
+
+    async def cog_load(self):
+        if self.spool:
+            await self.replay_spool()
+
+    async def replay_spool(self):
+        """Write the events the previous run spooled but never got into the database."""
+        # The bot may have been down across a month boundary; replayed rows need this month's partition
+        await ensure_interaction_partitions()
+        streams: Dict[int, LiveStream] = {}
+        replayed = 0
+        for record in self.spool.pending():
+            seq = record['seq']
+            event = TikTokEvent(*record['event'])
+            session_id = record['session']
+            stream = streams.get(session_id)
+            if stream is None:
+                stream = streams[session_id] = LiveStream(self.bot, record['stream'], self.writer, False, self.spool)
+                stream.session_id = session_id
+                stream.session_started_at = await db.fetchval(
+                    'SELECT started_at FROM live_sessions WHERE id = $1', session_id
                 )
-                await self.log_interaction(handle_id, 'follow', user_level=getattr(event.user, 'level', 0))
+            if stream.session_started_at is None:
+                # The session was deleted since; nothing to attach the event to
+                self.spool.ack(seq)
+                continue
+            try:
+                await stream.apply_spooled(event, seq)
+                replayed += 1
+            except Exception as e:
+                logger.error(f"Error replaying spooled {event.kind} event {seq}: {e}")
+        # Streaks whose final frame was never spooled are recorded as they would have expired
+        for stream in streams.values():
+            for handle, streak in stream.streaks.drain():
+                try:
+                    await stream.record_gift(handle, streak)
+                except Exception as e:
+                    logger.error(f"Error recording spooled gift streak for {handle}: {e}")
+
+        await self.writer.flush()
+        await self.spool.sync()
+        # Seqs at or below the persisted watermark are never redelivered, so their claims can go
+        await db.execute('DELETE FROM tiktok_spool_applied WHERE seq <= $1', self.spool.acked)
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled TikTok events from {len(streams)} sessions")
+
+    def add_stream(self, username: str, persistent: bool = True) -> LiveStream:
+        """Register a stream without connecting it (the replay driver feeds it events directly)."""
+        username = username.lstrip('@')
+        stream = LiveStream(self.bot, username, self.writer, persistent, self.spool)
+        self.streams[username] = stream
+        return stream
+
+    def resolve_stream(self, username: Optional[str]) -> Optional[LiveStream]:
+        """The named stream, or the only one when no name is given."""
+        if username:
+            return self.streams.get(username.lstrip('@'))
+        if len(self.streams) == 1:
+            return next(iter(self.streams.values()))
+        return None
 
-            @self.client.on(RoomUserSeqEvent)
-            async def on_viewer_count(event: RoomUserSeqEvent):
-                if self.session_id:
-                    viewer_count = getattr(event, 'viewerCount', 0)
-                    await db.execute(
-                        'INSERT INTO viewer_count_snapshots (session_id, viewer_count) VALUES ($1, $2)',
-                        self.session_id, viewer_count
-                    )
+    async def end_active_session(self, username: Optional[str] = None):
+        stream = self.resolve_stream(username)
+        return await stream.end_active_session() if stream else None
 
-            asyncio.create_task(self.client.connect())
-            await interaction.followup.send(f"✅ Connecting to @{username}'s stream...")
+    @tasks.loop(seconds=LIKE_FLUSH_SECONDS)
+    async def like_flush_loop(self):
+        for stream in list(self.streams.values()):
+            stream.flush_likes()
 
+    @tasks.loop(seconds=max(STREAK_TIMEOUT_SECONDS / 3, 1))
+    async def streak_expiry_loop(self):
+        for stream in list(self.streams.values()):
+            try:
+                await stream.expire_streaks()
+            except Exception as e:
+                logger.error(f"Error expiring gift streaks for @{stream.username}: {e}")
+
+    @tasks.loop(hours=1)
+    async def partition_loop(self):
+        # A session that runs (or resumes) into a new month needs that month's partition too
+        try:
+            await ensure_interaction_partitions()
+            await drop_expired_interaction_partitions()
         except Exception as e:
-            logger.error(f"Error connecting to TikTok: {e}")
-            await interaction.followup.send(f"❌ Error: {str(e)}")
+            logger.error(f"Error maintaining interaction partitions: {e}")
 
-    async def disconnect_tiktok(self):
-        if self.client:
-            try:
-                await self.client.disconnect()
-            except:
-                pass
-            self.client = None
+    @tasks.loop(seconds=SPOOL_FSYNC_SECONDS)
+    async def spool_sync_loop(self):
+        await self.spool.sync()
 
-        # Ensure session is ended if it was active
-        if self.active_session_id:
-            await self.end_active_session()
+    @tasks.loop(seconds=ROLLUP_CHECKPOINT_SECONDS)
+    async def rollup_checkpoint_loop(self):
+        for stream in list(self.streams.values()):
+            if stream.rollup:
+                await stream.rollup.checkpoint()
 
-        self.session_id = None
-        self.active_session_id = None
+    async def stream_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=f"@{username}", value=username)
+            for username in self.streams if current.lower().lstrip('@') in username.lower()
+        ][:25]
+
+    @app_commands.command(name="tiktok-connect", description="Connect to a TikTok live stream")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def tiktok_connect(self, interaction: discord.Interaction,
+                            username: str, persistent: bool = True):
+        if not interaction.response.is_done():
+            await interaction.response.defer()
+
+        username = username.lstrip('@')
+        stream = self.streams.get(username)
+        if stream and stream.running:
+            await interaction.followup.send(f"❌ Already connected to @{username}. Disconnect first.")
+            return
+        if stream:
+            # A non-persistent stream that gave up still holds its recorder
+            await stream.stop()
+        elif sum(s.running for s in self.streams.values()) >= MAX_STREAMS:
+            await interaction.followup.send(f"❌ Already following {MAX_STREAMS} streams. Disconnect one first.")
+            return
+
+        try:
+            self.add_stream(username, persistent).start()
+            await interaction.followup.send(f"✅ Connecting to @{username}'s stream...")
+
+        except Exception as e:
+            logger.error(f"Error connecting to TikTok: {e}")
+            self.streams.pop(username, None)
+            await interaction.followup.send(f"❌ Error: {str(e)}")
 
+    async def disconnect_tiktok(self, username: Optional[str] = None):
+        stream = self.resolve_stream(username)
+        if stream:
+            await stream.stop()
+            self.streams.pop(stream.username, None)
 
-    @app_commands.command(name="tiktok-disconnect", description="Disconnect from TikTok live stream")
+    @app_commands.command(name="tiktok-disconnect", description="Disconnect from a TikTok live stream")
     @app_commands.checks.has_permissions(manage_guild=True)
-    async def tiktok_disconnect(self, interaction: discord.Interaction):
+    @app_commands.autocomplete(username=stream_autocomplete)
+    async def tiktok_disconnect(self, interaction: discord.Interaction, username: Optional[str] = None):
         if not interaction.response.is_done():
             await interaction.response.defer()
 
-        if not self.client:
-            await interaction.followup.send("❌ Not connected to any stream.")
+        stream = self.resolve_stream(username)
+        if not stream:
+            if username or not self.streams:
+                await interaction.followup.send("❌ Not connected to that stream." if username else "❌ Not connected to any stream.")
+            else:
+                await interaction.followup.send("❌ Several streams are connected; pick one with `username`.")
             return
 
-        await self.disconnect_tiktok()
-        await interaction.followup.send("✅ Disconnected from TikTok stream.")
+        await self.disconnect_tiktok(stream.username)
+        await interaction.followup.send(f"✅ Disconnected from @{stream.username}'s stream.")
 
     @app_commands.command(name="tiktok-status", description="Check TikTok connection status")
-    async def tiktok_status(self, interaction: discord.Interaction):
-        if self.client and self.client.connected:
+    @app_commands.autocomplete(username=stream_autocomplete)
+    async def tiktok_status(self, interaction: discord.Interaction, username: Optional[str] = None):
+        stream = self.resolve_stream(username)
+        if stream:
+            embed = stream.status_embed()
+        elif self.streams and not username:
             embed = discord.Embed(
-                title="✅ TikTok Connected",
-                color=discord.Color.green()
+                title=f"📡 Following {len(self.streams)} TikTok Streams",
+                color=discord.Color.blue()
             )
-            embed.add_field(name="Username", value=f"@{self.username}")
-            embed.add_field(name="Session ID", value=str(self.session_id))
-            embed.add_field(name="Persistent", value="Yes" if self.persistent_connection else "No")
+            for stream in self.streams.values():
+                state = stream.supervisor.state if stream.supervisor else 'stopped'
+                lines = [f"State: {state}", f"Session: {stream.session_id or '-'}"]
+                if stream.rollup:
+                    lines.append(f"Events: {stream.rollup.totals['events']:,} ({stream.events_per_minute():,.0f}/min)")
+                    lines.append(f"Coins: {stream.rollup.totals['coins']:,}")
+                embed.add_field(name=f"@{stream.username}", value="\n".join(lines))
         else:
             embed = discord.Embed(
                 title="❌ TikTok Disconnected",
@@ -300,10 +795,23 @@ class TikTokIntegration(commands.Cog):
 
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
-    def cog_unload(self):
-        if self.client:
-            asyncio.create_task(self.disconnect_tiktok())
+    async def shutdown(self):
+        # stop() ends any active session, flushing likes, streaks and rollups into the writer
+        for stream in list(self.streams.values()):
+            await stream.stop()
+        await self.writer.stop()
+        if self.spool:
+            await self.spool.close()
+
+    async def cog_unload(self):
+        self.like_flush_loop.cancel()
+        self.rollup_checkpoint_loop.cancel()
+        self.streak_expiry_loop.cancel()
+        self.partition_loop.cancel()
+        self.spool_sync_loop.cancel()
+        # Bot.close() awaits this before the pool is closed, so everything buffered is written
+        await self.shutdown()
 
 
 async def setup(bot):
-    await bot.add_cog(TikTokIntegration(bot))
\ No newline at end of file
+    await bot.add_cog(TikTokIntegration(bot))
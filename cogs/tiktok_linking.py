@@ -2,7 +2,8 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import logging
-from database import db
+from database import db, INTERACTIVE_TIMEOUT
+import asyncio
 import os
 
 logger = logging.getLogger(__name__)
@@ -20,12 +21,16 @@ class TikTokLinking(commands.Cog):
         if len(current) < 2:
             return []
         
-        handles = await db.fetch('''
-            SELECT handle_name FROM tiktok_accounts
-            WHERE handle_name ILIKE $1
-            ORDER BY last_seen DESC
-            LIMIT 25
-        ''', f'{current}%')
+        try:
+            handles = await db.fetch('''
+                SELECT handle_name FROM tiktok_accounts
+                WHERE handle_name ILIKE $1
+                ORDER BY last_seen DESC
+                LIMIT 25
+            ''', f'{current}%', timeout=INTERACTIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Handle autocomplete timed out for '{current}'")
+            return []
         
         return [
             app_commands.Choice(name=row['handle_name'], value=row['handle_name'])
@@ -150,10 +155,15 @@ class TikTokLinking(commands.Cog):
     async def my_links(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         
-        handles = await db.fetch(
-            'SELECT handle_name, points FROM tiktok_accounts WHERE linked_discord_id = $1',
-            interaction.user.id
-        )
+        try:
+            handles = await db.fetch(
+                'SELECT handle_name, points FROM tiktok_accounts WHERE linked_discord_id = $1',
+                interaction.user.id, timeout=INTERACTIVE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Linked handle lookup timed out for {interaction.user.id}")
+            await interaction.followup.send("❌ The database is busy right now, please try again in a moment.", ephemeral=True)
+            return
         
         if not handles:
             await interaction.followup.send(
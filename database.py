@@ -1,29 +1,212 @@
+import asyncio
 import os
+import re
+import time
 import asyncpg
 from asyncpg import Pool
-from typing import Optional
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Union
 import logging
+from metrics import registry
+from migrations import run_migrations
 
 logger = logging.getLogger(__name__)
 
+# Timeout classes (seconds) covering both the pool wait and the query itself.
+# Interactive calls run inside Discord's 3-second interaction/autocomplete window;
+# background calls come from task loops and may wait longer. Calls that pass no
+# timeout fall back to the pool's command_timeout.
+INTERACTIVE_TIMEOUT = float(os.getenv('DB_INTERACTIVE_TIMEOUT', '2'))
+BACKGROUND_TIMEOUT = float(os.getenv('DB_BACKGROUND_TIMEOUT', '30'))
+
+# asyncpg's per-connection statement cache is an LRU of this many statements; it has to
+# hold the registry plus the ad-hoc queries in use, or hot statements get re-prepared
+STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '256'))
+
+SLOW_QUERY_SECONDS = float(os.getenv('DB_SLOW_QUERY_SECONDS', '0.5'))
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w$])\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class NamedQuery(NamedTuple):
+    name: str
+    sql: str
+
+
+# Hot statements, declared once. Pass the NamedQuery itself to execute/fetch/fetchrow/
+# fetchval: each pooled connection prepares it on first use and keeps it in asyncpg's
+# statement cache, and its metrics are reported under the name.
+PREPARED_QUERIES: Dict[str, NamedQuery] = {}
+
+
+def prepared_query(name: str, sql: str) -> NamedQuery:
+    query = NamedQuery(name, sql)
+    PREPARED_QUERIES[name] = query
+    return query
+
+
+INSERT_INTERACTION = prepared_query('interaction_insert', '''
+    INSERT INTO tiktok_interactions
+    (session_id, tiktok_account_id, interaction_type, value, coin_value, user_level, gift_id, repeat_count)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+''')
+
+# Update-first so the handle_id sequence is only consumed for genuinely new handles
+UPSERT_TIKTOK_ACCOUNT = prepared_query('account_upsert', '''
+    WITH updated AS (
+        UPDATE tiktok_accounts
+        SET last_seen = NOW(), last_known_level = $2
+        WHERE handle_name = $1
+        RETURNING handle_id
+    ), inserted AS (
+        INSERT INTO tiktok_accounts (handle_name, last_known_level)
+        SELECT $1, $2 WHERE NOT EXISTS (SELECT 1 FROM updated)
+        ON CONFLICT (handle_name) DO UPDATE
+        SET last_seen = NOW(), last_known_level = EXCLUDED.last_known_level
+        RETURNING handle_id
+    )
+    SELECT handle_id FROM updated
+    UNION ALL
+    SELECT handle_id FROM inserted
+''')
+
+# One statement per InteractionWriter batch: upserts each handle once (update-first, as
+# above), writes the interaction rows and puts comment text in tiktok_comments.
+# Ids are drawn up front so comment rows can reference their interaction.
+FLUSH_INTERACTIONS = prepared_query('interactions_flush', '''
+    WITH batch AS (
+        SELECT nextval('tiktok_interactions_id_seq') AS id, b.*
+        FROM unnest(
+            $1::integer[], $2::text[], $3::integer[], $4::text[], $5::integer[], $6::text[], $7::timestamptz[]
+        ) AS b(session_id, handle_name, user_level, interaction_type, like_count, comment, timestamp)
+    ), handles AS (
+        SELECT DISTINCT ON (handle_name) handle_name, user_level
+        FROM batch
+        ORDER BY handle_name, timestamp DESC
+    ), updated AS (
+        UPDATE tiktok_accounts
+        SET last_seen = NOW(), last_known_level = handles.user_level
+        FROM handles
+        WHERE tiktok_accounts.handle_name = handles.handle_name
+        RETURNING tiktok_accounts.handle_id, tiktok_accounts.handle_name
+    ), inserted AS (
+        INSERT INTO tiktok_accounts (handle_name, last_known_level)
+        SELECT handle_name, user_level FROM handles
+        WHERE handle_name NOT IN (SELECT handle_name FROM updated)
+        ON CONFLICT (handle_name) DO UPDATE
+        SET last_seen = NOW(), last_known_level = EXCLUDED.last_known_level
+        RETURNING handle_id, handle_name
+    ), accounts AS (
+        SELECT * FROM updated
+        UNION ALL
+        SELECT * FROM inserted
+    ), interactions AS (
+        INSERT INTO tiktok_interactions
+        (id, session_id, tiktok_account_id, interaction_type, like_count, user_level, timestamp)
+        SELECT batch.id, batch.session_id, accounts.handle_id, batch.interaction_type::tiktok_interaction_type,
+               batch.like_count, batch.user_level, batch.timestamp
+        FROM batch JOIN accounts USING (handle_name)
+    )
+    INSERT INTO tiktok_comments (interaction_id, session_id, timestamp, comment)
+    SELECT id, session_id, timestamp, comment FROM batch WHERE comment IS NOT NULL
+''')
+
+QUEUE_PAGE = prepared_query('queue_page', '''
+    SELECT * FROM submissions
+    WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played')
+    ORDER BY
+        CASE queue_line
+            WHEN '25+ Skip' THEN 1
+            WHEN '20 Skip' THEN 2
+            WHEN '15 Skip' THEN 3
+            WHEN '10 Skip' THEN 4
+            WHEN '5 Skip' THEN 5
+            WHEN 'Free' THEN 6
+            WHEN 'Pending Skips' THEN 7
+            ELSE 999
+        END,
+        CASE WHEN queue_line = 'Free' THEN total_score ELSE 0 END DESC,
+        submission_time ASC
+    LIMIT $1 OFFSET $2
+''')
+
+QUEUE_COUNT = prepared_query('queue_count', '''
+    SELECT COUNT(*) FROM submissions
+    WHERE played_time IS NULL AND queue_line NOT IN ('Removed', 'Songs Played')
+''')
+
+NEXT_FREE_SUBMISSION = prepared_query('next_free_pick', '''
+    SELECT * FROM submissions
+    WHERE queue_line = 'Free' AND played_time IS NULL
+    ORDER BY total_score DESC, submission_time ASC
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+''')
+
+NEXT_TIER_SUBMISSION = prepared_query('next_tier_pick', '''
+    SELECT * FROM submissions
+    WHERE queue_line = $1 AND played_time IS NULL
+    ORDER BY submission_time ASC
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+''')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    """Normalize a query so calls differing only in literals or layout group together."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()[:200]
+
+
+def _row_count(method: str, result) -> int:
+    if method == 'fetch':
+        return len(result)
+    if method == 'execute':
+        # Status tags such as "UPDATE 3" / "INSERT 0 1" end with the affected row count
+        last = result.rsplit(' ', 1)[-1] if result else ''
+        return int(last) if last.isdigit() else 0
+    return 0 if result is None else 1
+
+
+def _redact(args) -> str:
+    return '[' + ', '.join(type(arg).__name__ for arg in args) + ']'
+
 
 class Database:
     def __init__(self):
         self.pool: Optional[Pool] = None
+        self.acquire_wait = registry.histogram(
+            'db_pool_acquire_wait_seconds', 'Time spent waiting for a pooled connection'
+        )
+        self.acquire_waiting = registry.gauge(
+            'db_pool_acquire_waiting', 'Callers currently waiting for a pooled connection'
+        )
 
-    async def connect(self):
+    async def connect(self, initialize: bool = True):
         database_url = os.getenv('DATABASE_URL')
         if not database_url:
             raise ValueError("DATABASE_URL environment variable not set")
         
+        min_size = int(os.getenv('DB_POOL_MIN_SIZE', '5'))
+        max_size = int(os.getenv('DB_POOL_MAX_SIZE', '20'))
         self.pool = await asyncpg.create_pool(
             database_url,
-            min_size=5,
-            max_size=20,
-            command_timeout=60
+            min_size=min_size,
+            max_size=max_size,
+            command_timeout=float(os.getenv('DB_COMMAND_TIMEOUT', '60')),
+            statement_cache_size=STATEMENT_CACHE_SIZE,
+            # Only size evicts: a statement idle between streams is still prepared next time
+            max_cached_statement_lifetime=0
         )
-        logger.info("Database pool created successfully")
-        await self.initialize_schema()
+        logger.info(f"Database pool created successfully (min={min_size}, max={max_size})")
+        if initialize:
+            await self.initialize_schema()
 
     async def disconnect(self):
         if self.pool:
@@ -31,171 +214,102 @@ class Database:
             logger.info("Database pool closed")
 
     async def initialize_schema(self):
-        async with self.pool.acquire() as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS live_sessions (
-                    id SERIAL PRIMARY KEY,
-                    session_id INTEGER,
-                    tiktok_username TEXT NOT NULL,
-                    started_at TIMESTAMPTZ DEFAULT NOW(),
-                    ended_at TIMESTAMPTZ,
-                    status TEXT DEFAULT 'active'
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS tiktok_accounts (
-                    handle_id SERIAL PRIMARY KEY,
-                    handle_name TEXT UNIQUE NOT NULL,
-                    first_seen TIMESTAMPTZ DEFAULT NOW(),
-                    last_seen TIMESTAMPTZ DEFAULT NOW(),
-                    linked_discord_id BIGINT,
-                    points INTEGER DEFAULT 0 NOT NULL,
-                    last_known_level INTEGER DEFAULT 0
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS tiktok_interactions (
-                    id SERIAL PRIMARY KEY,
-                    session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
-                    tiktok_account_id INTEGER REFERENCES tiktok_accounts(handle_id) ON DELETE SET NULL,
-                    interaction_type TEXT NOT NULL,
-                    value TEXT,
-                    coin_value INTEGER,
-                    user_level INTEGER,
-                    timestamp TIMESTAMPTZ DEFAULT NOW()
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS viewer_count_snapshots (
-                    id SERIAL PRIMARY KEY,
-                    session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
-                    viewer_count INTEGER NOT NULL,
-                    timestamp TIMESTAMPTZ DEFAULT NOW()
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS submissions (
-                    id SERIAL PRIMARY KEY,
-                    public_id TEXT UNIQUE NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    username TEXT NOT NULL,
-                    artist_name TEXT NOT NULL,
-                    song_name TEXT NOT NULL,
-                    link_or_file TEXT,
-                    queue_line TEXT,
-                    submission_time TIMESTAMPTZ DEFAULT NOW(),
-                    played_time TIMESTAMPTZ,
-                    note TEXT,
-                    tiktok_username TEXT,
-                    total_score REAL DEFAULT 0
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_points (
-                    user_id BIGINT PRIMARY KEY,
-                    points INTEGER DEFAULT 0 NOT NULL
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS bot_config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    channel_id BIGINT,
-                    message_id BIGINT
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS persistent_embeds (
-                    id SERIAL PRIMARY KEY,
-                    embed_type TEXT NOT NULL,
-                    channel_id BIGINT NOT NULL,
-                    message_id BIGINT NOT NULL,
-                    current_page INTEGER DEFAULT 0,
-                    last_content_hash TEXT,
-                    last_updated TIMESTAMPTZ DEFAULT NOW(),
-                    is_active BOOLEAN DEFAULT TRUE,
-                    UNIQUE (embed_type, channel_id)
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS queue_config (
-                    queue_line TEXT PRIMARY KEY,
-                    channel_id BIGINT,
-                    pinned_message_id BIGINT
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS luxury_coins (
-                    user_id BIGINT PRIMARY KEY,
-                    balance INTEGER DEFAULT 0 NOT NULL
-                );
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS tiktok_watch_time (
-                    id SERIAL PRIMARY KEY,
-                    session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
-                    tiktok_account_id INTEGER REFERENCES tiktok_accounts(handle_id) ON DELETE SET NULL,
-                    linked_discord_id BIGINT,
-                    watch_seconds INTEGER DEFAULT 0 NOT NULL,
-                    last_updated TIMESTAMPTZ DEFAULT NOW()
-                );
-            ''')
-
-            await self._create_indexes(conn)
-            logger.info("Database schema initialized successfully")
-
-    async def _create_indexes(self, conn):
-        indexes = [
-            'CREATE INDEX IF NOT EXISTS idx_submissions_user_id ON submissions(user_id);',
-            'CREATE INDEX IF NOT EXISTS idx_submissions_queue_line ON submissions(queue_line);',
-            'CREATE INDEX IF NOT EXISTS idx_submissions_played_time ON submissions(played_time);',
-            'CREATE INDEX IF NOT EXISTS idx_submissions_submission_time ON submissions(submission_time);',
-            'CREATE INDEX IF NOT EXISTS idx_tiktok_interactions_session_id ON tiktok_interactions(session_id);',
-            'CREATE INDEX IF NOT EXISTS idx_tiktok_interactions_tiktok_account_id ON tiktok_interactions(tiktok_account_id);',
-            'CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_linked_discord_id ON tiktok_accounts(linked_discord_id);',
-            'CREATE INDEX IF NOT EXISTS idx_tiktok_handles_search ON tiktok_accounts(handle_name text_pattern_ops);',
-        ]
+        applied = await run_migrations(self.pool)
+        if applied:
+            # Connections opened before the migration prepared against the old schema
+            await self.pool.expire_connections()
+
+    async def _call(self, conn, method: str, query: Union[str, NamedQuery], args, timeout):
+        if isinstance(query, NamedQuery):
+            sql, label = query.sql, query.name
+        else:
+            sql, label = query, fingerprint(query)
 
-        for index_sql in indexes:
-            await conn.execute(index_sql)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await getattr(conn, method)(sql, *args, timeout=timeout)
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.histogram(
+                'db_query_seconds', 'Query latency by fingerprint', labels={'query': label}
+            ).observe(elapsed)
+            registry.histogram(
+                'db_query_rows', 'Rows returned or affected by fingerprint',
+                labels={'query': label}, buckets=ROW_BUCKETS
+            ).observe(_row_count(method, result))
+
+            if elapsed >= SLOW_QUERY_SECONDS:
+                logger.warning(
+                    f"Slow query ({elapsed * 1000:.0f}ms) {label} params={_redact(args)}"
+                )
+
+    async def _run(self, method: str, query: Union[str, NamedQuery], args, timeout, conn):
+        if conn is not None:
+            return await self._call(conn, method, query, args, timeout)
+        # One budget for the pool wait and the query: the query gets whatever the wait left
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self.acquire(timeout) as conn:
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+            return await self._call(conn, method, query, args, timeout)
+
+    def query_stats(self):
+        """Per-fingerprint call counts, latency percentiles (seconds) and mean rows,
+        most expensive (by total time) first."""
+        rows = {labels['query']: h for labels, h in registry.collect('db_query_rows')}
+        stats = [
+            {
+                'query': labels['query'],
+                'calls': histogram.count,
+                'total': histogram.sum,
+                'p50': histogram.percentile(50),
+                'p95': histogram.percentile(95),
+                'p99': histogram.percentile(99),
+                'rows': rows[labels['query']].mean if labels['query'] in rows else 0.0,
+            }
+            for labels, histogram in registry.collect('db_query_seconds')
+        ]
+        return sorted(stats, key=lambda s: s['total'], reverse=True)
 
-        await conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_submissions_free_queue 
-            ON submissions(queue_line, total_score DESC, submission_time ASC) 
-            WHERE queue_line = 'Free';
-        ''')
+    def statement_stats(self):
+        """query_stats() restricted to the prepared statement registry."""
+        return [s for s in self.query_stats() if s['query'] in PREPARED_QUERIES]
 
-        await conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_tiktok_handles_unlinked 
-            ON tiktok_accounts(linked_discord_id) 
-            WHERE linked_discord_id IS NULL;
-        ''')
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        """Acquire a pooled connection, recording how long the caller queued for it."""
+        self.acquire_waiting.inc()
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=timeout)
+        finally:
+            self.acquire_waiting.dec()
+            self.acquire_wait.observe(time.perf_counter() - start)
 
-    async def execute(self, query: str, *args):
-        async with self.pool.acquire() as conn:
-            return await conn.execute(query, *args)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
 
-    async def fetch(self, query: str, *args):
-        async with self.pool.acquire() as conn:
-            return await conn.fetch(query, *args)
+    # Pass conn to run on an already-acquired connection (e.g. inside a transaction)
+    async def execute(self, query: Union[str, NamedQuery], *args,
+                      timeout: Optional[float] = None, conn=None):
+        return await self._run('execute', query, args, timeout, conn)
 
-    async def fetchrow(self, query: str, *args):
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow(query, *args)
+    async def fetch(self, query: Union[str, NamedQuery], *args,
+                    timeout: Optional[float] = None, conn=None):
+        return await self._run('fetch', query, args, timeout, conn)
 
-    async def fetchval(self, query: str, *args):
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(query, *args)
+    async def fetchrow(self, query: Union[str, NamedQuery], *args,
+                       timeout: Optional[float] = None, conn=None):
+        return await self._run('fetchrow', query, args, timeout, conn)
 
+    async def fetchval(self, query: Union[str, NamedQuery], *args,
+                       timeout: Optional[float] = None, conn=None):
+        return await self._run('fetchval', query, args, timeout, conn)
 
 db = Database()
@@ -0,0 +1,93 @@
+"""Sampled, rate-limited logging of individual TikTok events.
+
+A busy stream delivers hundreds of events a second, so per-event log lines are
+only worth having as a sample. EventLog checks the level first (nothing is
+formatted when it is disabled, which is the default at INFO), then samples,
+then rate-limits per event kind; a line that does get through says how many
+were skipped before it. Messages use logging's lazy %-formatting, so the event
+is only rendered once a line is written, on the log listener's thread (see
+monitoring.configure_logging).
+"""
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def parse_level(name: str, default: int = logging.DEBUG) -> int:
+    """A logging level from a name or number, or `default` if it is neither."""
+    name = name.strip().upper()
+    if name.isdigit():
+        return int(name)
+    # getLevelName maps unknown names to the string 'Level <name>' rather than failing
+    level = logging.getLevelName(name)
+    if isinstance(level, int):
+        return level
+    logger.warning(f"Unknown log level {name!r}; using {logging.getLevelName(default)}")
+    return default
+
+
+EVENT_LOG_LEVEL = parse_level(os.getenv('TIKTOK_EVENT_LOG_LEVEL', 'DEBUG'))
+# Fraction of events considered for logging, and at most this many lines per kind per second
+EVENT_LOG_SAMPLE = float(os.getenv('TIKTOK_EVENT_LOG_SAMPLE', '1'))
+EVENT_LOG_RATE = float(os.getenv('TIKTOK_EVENT_LOG_RATE', '1'))
+
+
+class LazyVars:
+    """Renders an object's attributes only if the log record is actually emitted."""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self) -> str:
+        return repr(vars(self.obj)) if hasattr(self.obj, '__dict__') else repr(self.obj)
+
+
+class EventLog:
+    def __init__(self, name: str = 'tiktok.events', level: int = EVENT_LOG_LEVEL, sample: float = EVENT_LOG_SAMPLE,
+                 rate: float = EVENT_LOG_RATE, rng: Callable[[], float] = random.random):
+        self.logger = logging.getLogger(name)
+        self.level = level
+        self.sample = sample
+        self.rate = rate
+        self.rng = rng
+        # kind -> [tokens, last refill]; a token bucket holding at most `rate` lines
+        self._buckets: Dict[str, List[float]] = {}
+        self.skipped: Dict[str, int] = {}
+
+    def _allowed(self, kind: str) -> bool:
+        if self.sample < 1 and self.rng() >= self.sample:
+            return False
+        now = time.monotonic()
+        bucket = self._buckets.get(kind)
+        if bucket is None:
+            bucket = self._buckets[kind] = [self.rate, now]
+        bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def log(self, kind: str, msg: str, *args):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if not self._allowed(kind):
+            self.skipped[kind] = self.skipped.get(kind, 0) + 1
+            return
+        skipped = self.skipped.pop(kind, 0)
+        if skipped:
+            msg += ' (%d more %s events not logged)'
+            args += (skipped, kind)
+        self.logger.log(self.level, msg, *args, extra={'event_kind': kind})
+
+    def event(self, stream: str, event):
+        """Log a TikTokEvent record for `stream`."""
+        self.log(event.kind, '@%s %r', stream, event)
+
+
+event_log = EventLog()
@@ -0,0 +1,74 @@
+"""Compact records for TikTok events.
+
+TikTokLive events are converted to a TikTokEvent at the edge (the client
+listener, the ingest worker, recordings) and nothing downstream holds on to the
+original event objects. A TikTokEvent is a plain tuple: no per-instance dict,
+cheap to keep in buffers, and it serializes to a short JSON array for the
+worker socket and the spool.
+"""
+import time
+from typing import NamedTuple, Optional
+
+from ingest.recorder import as_event
+
+
+class TikTokEvent(NamedTuple):
+    kind: str
+    handle: str = ''
+    level: int = 0
+    # Likes in a like event, repeat count of a gift, viewers in a viewer_count event
+    count: int = 1
+    # Diamonds per gift
+    coin_value: int = 0
+    ts: float = 0.0
+    gift_id: Optional[int] = None
+    # Comment text, gift name, or the error a worker reports
+    text: Optional[str] = None
+    streaking: bool = False
+
+
+def normalize(kind: str, event) -> TikTokEvent:
+    """Build a TikTokEvent from a TikTokLive event (or anything exposing the same attributes)."""
+    now = time.time()
+    if kind == 'viewer_count':
+        return TikTokEvent(kind, count=getattr(event, 'viewerCount', 0) or 0, ts=now)
+
+    user = getattr(event, 'user', None)
+    if user is None:
+        return TikTokEvent(kind, ts=now)
+    handle = user.unique_id
+    level = getattr(user, 'level', 0) or 0
+
+    if kind == 'gift':
+        gift = event.gift
+        return TikTokEvent(
+            kind, handle, level, event.repeat_count, gift.diamond_count, now,
+            gift.id, gift.name, bool(getattr(event, 'streaking', False))
+        )
+    if kind == 'like':
+        count = getattr(event, 'count', getattr(event, 'total_likes', 1)) or 1
+        return TikTokEvent(kind, handle, level, int(count), ts=now)
+    if kind == 'comment':
+        return TikTokEvent(kind, handle, level, ts=now, text=event.comment)
+    return TikTokEvent(kind, handle, level, ts=now)
+
+
+def from_fields(kind: str, fields: dict) -> TikTokEvent:
+    """Build a TikTokEvent from a recording line's fields."""
+    return normalize(kind, as_event(fields))
+
+
+def to_fields(record: TikTokEvent) -> dict:
+    """The recording-format fields for a record (the inverse of from_fields)."""
+    if record.kind == 'viewer_count':
+        return {'viewerCount': record.count}
+    fields = {'user': {'unique_id': record.handle, 'level': record.level}}
+    if record.kind == 'gift':
+        fields['gift'] = {'id': record.gift_id, 'name': record.text, 'diamond_count': record.coin_value}
+        fields['repeat_count'] = record.count
+        fields['streaking'] = record.streaking
+    elif record.kind == 'like':
+        fields['count'] = record.count
+    elif record.kind == 'comment':
+        fields['comment'] = record.text
+    return fields
@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Iterator, Optional, TextIO
+from TikTokLive.events import GiftEvent, JoinEvent, LikeEvent, CommentEvent, ShareEvent, FollowEvent, RoomUserSeqEvent
+
+logger = logging.getLogger(__name__)
+
+# When set, every /tiktok-connect session is recorded to <dir>/<username>_<timestamp>.jsonl
+EVENT_RECORD_DIR = os.getenv('TIKTOK_RECORD_DIR')
+
+RECORDING_FORMAT = 1
+
+
+def _user(event) -> dict:
+    user = event.user
+    return {'unique_id': user.unique_id, 'level': getattr(user, 'level', 0)}
+
+
+def _gift(event) -> dict:
+    gift = event.gift
+    return {
+        'user': _user(event),
+        'gift': {'id': gift.id, 'name': gift.name, 'diamond_count': gift.diamond_count},
+        'repeat_count': event.repeat_count,
+        'streaking': getattr(event, 'streaking', False),
+    }
+
+
+def _like(event) -> dict:
+    return {'user': _user(event), 'count': getattr(event, 'count', getattr(event, 'total_likes', 1))}
+
+
+def _comment(event) -> dict:
+    return {'user': _user(event), 'comment': event.comment}
+
+
+def _viewer_count(event) -> dict:
+    return {'viewerCount': getattr(event, 'viewerCount', 0)}
+
+
+# Event kind -> (TikTokLive event class, extractor). Only the attributes the
+# TikTokIntegration handlers read are kept, which keeps recordings small and
+# independent of the TikTokLive protobuf schema.
+RECORDED_EVENTS = {
+    'gift': (GiftEvent, _gift),
+    'join': (JoinEvent, lambda event: {'user': _user(event)}),
+    'like': (LikeEvent, _like),
+    'comment': (CommentEvent, _comment),
+    'share': (ShareEvent, lambda event: {'user': _user(event)}),
+    'follow': (FollowEvent, lambda event: {'user': _user(event)}),
+    'viewer_count': (RoomUserSeqEvent, _viewer_count),
+}
+
+
+class EventRecorder:
+    """Appends TikTokLive events to a JSONL file, one event per line.
+
+    The first line is a header ({"format", "username", "started_at"}); each event
+    line is {"t": seconds since start, "kind": ..., **fields}.
+    """
+
+    def __init__(self, path: str, username: str):
+        self.path = path
+        self.count = 0
+        self._start = time.monotonic()
+        self._file: Optional[TextIO] = open(path, 'w', encoding='utf-8')
+        self._write({
+            'format': RECORDING_FORMAT,
+            'username': username,
+            'started_at': datetime.now().isoformat(),
+        })
+
+    @classmethod
+    def for_stream(cls, directory: str, username: str) -> 'EventRecorder':
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        return cls(os.path.join(directory, filename), username)
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def attach(self, client):
+        for kind, (event_type, extract) in RECORDED_EVENTS.items():
+            client.add_listener(event_type, self._listener(kind, extract))
+        logger.info(f"Recording TikTok events to {self.path}")
+
+    def _listener(self, kind, extract):
+        async def record(event):
+            self.record(kind, extract(event))
+        return record
+
+    def record(self, kind: str, fields: dict):
+        if self._file is None:
+            return
+        try:
+            self._write({'t': round(time.monotonic() - self._start, 4), 'kind': kind, **fields})
+            self.count += 1
+        except Exception as e:
+            logger.error(f"Error recording {kind} event: {e}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Recorded {self.count} TikTok events to {self.path}")
+
+
+def as_event(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: as_event(item) for key, item in value.items()})
+    return value
+
+
+def read_recording(path: str):
+    """Return (header, iterator of (t, kind, event)) for a recording file.
+
+    Events are rebuilt as attribute objects exposing the same fields the
+    handlers read from real TikTokLive events.
+    """
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+
+    def events() -> Iterator:
+        with open(path, encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                t = record.pop('t')
+                kind = record.pop('kind')
+                yield t, kind, as_event(record)
+
+    return header, events()
+
+
+GIFTS = [
+    # (id, name, diamond_count, streakable)
+    (5655, 'Rose', 1, True),
+    (5269, 'TikTok', 1, True),
+    (6064, 'GG', 1, True),
+    (5827, 'Ice Cream Cone', 1, True),
+    (6427, 'Hat and Mustache', 99, False),
+    (5760, 'Weights', 1, True),
+    (6267, 'Corgi', 299, False),
+    (7934, 'Galaxy', 1000, False),
+    (6369, 'Lion', 29999, False),
+]
+
+
+def synthesize(path: str, events: int = 5000, viewers: int = 300, rate: float = 50.0,
+               username: str = 'replay_test', seed: int = 1):
+    """Write a synthetic recording with a typical live-stream event mix.
+
+    Useful as a fixed benchmark input when no real recording is at hand.
+    """
+    rng = random.Random(seed)
+    handles = [f'viewer_{i:05d}' for i in range(viewers)]
+    kinds = ['like'] * 55 + ['comment'] * 20 + ['join'] * 12 + ['gift'] * 8 + ['viewer_count'] * 3 + ['share', 'follow']
+
+    with open(path, 'w', encoding='utf-8') as f:
+        header = {'format': RECORDING_FORMAT, 'username': username, 'started_at': datetime.now().isoformat()}
+        f.write(json.dumps(header, separators=(',', ':')) + '\n')
+        t = 0.0
+        for _ in range(events):
+            t += rng.expovariate(rate)
+            kind = rng.choice(kinds)
+            user = {'unique_id': rng.choice(handles), 'level': rng.randint(0, 40)}
+            if kind == 'gift':
+                gift_id, name, diamonds, streakable = rng.choice(GIFTS)
+                repeat = rng.randint(1, 20) if streakable else 1
+                # A streakable gift arrives as in-progress frames followed by the final one
+                for count in range(1, repeat) if streakable else ():
+                    record = {'user': user, 'gift': {'id': gift_id, 'name': name, 'diamond_count': diamonds},
+                              'repeat_count': count, 'streaking': True}
+                    f.write(json.dumps({'t': round(t, 4), 'kind': kind, **record}, separators=(',', ':')) + '\n')
+                    t += rng.uniform(0.05, 0.3)
+                fields = {'user': user, 'gift': {'id': gift_id, 'name': name, 'diamond_count': diamonds},
+                          'repeat_count': repeat, 'streaking': False}
+            elif kind == 'like':
+                fields = {'user': user, 'count': rng.randint(1, 15)}
+            elif kind == 'comment':
+                fields = {'user': user, 'comment': rng.choice(['hi', 'love this', 'next song?', '🔥🔥', 'lets go'])}
+            elif kind == 'viewer_count':
+                fields = {'viewerCount': rng.randint(viewers // 2, viewers)}
+            else:
+                fields = {'user': user}
+            f.write(json.dumps({'t': round(t, 4), 'kind': kind, **fields}, separators=(',', ':')) + '\n')
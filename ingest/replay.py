@@ -0,0 +1,172 @@
+"""Replay a recorded TikTok event stream through TikTokIntegration's handlers.
+
+    python -m ingest.replay recordings/streamer_20250101_200000.jsonl --speed 10
+    python -m ingest.replay --synthesize 5000 recordings/synthetic.jsonl
+
+Runs against the database in DATABASE_URL and reports events/s, handler
+latency percentiles and DB round-trips per event.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import discord
+from discord.ext import commands
+from dotenv import load_dotenv
+
+from database import db
+from metrics import registry
+from ingest.events import normalize
+from ingest.recorder import read_recording, synthesize
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {
+    'gift': 'handle_gift',
+    'join': 'handle_join',
+    'like': 'handle_like',
+    'comment': 'handle_comment',
+    'share': 'handle_share',
+    'follow': 'handle_follow',
+    'viewer_count': 'handle_viewer_count',
+}
+
+
+def _db_round_trips() -> int:
+    return sum(histogram.count for _, histogram in registry.collect('db_query_seconds'))
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    if len(latencies) < 2:
+        value = latencies[0] if latencies else 0.0
+        return {'p50': value, 'p99': value}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'p50': cuts[49], 'p99': cuts[98]}
+
+
+async def replay(path: str, speed: Optional[float] = 1.0, cleanup: bool = False) -> dict:
+    """Feed a recording through the handlers; speed=None replays as fast as possible.
+
+    Each event is dispatched as its own task, the way TikTokLiveClient emits them,
+    so handlers overlap exactly as they would on a live stream. At max speed the
+    latencies therefore include waiting for a pooled connection.
+    """
+    from cogs.tiktok_integration import TikTokIntegration
+
+    header, events = read_recording(path)
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.default())
+    cog = TikTokIntegration(bot)
+    stream = cog.add_stream(header['username'])
+    await stream.handle_connect(None)
+    session_id = stream.session_id
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures = 0
+
+    async def dispatch(kind, event):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            await getattr(stream, HANDLERS[kind])(normalize(kind, event))
+        except Exception as e:
+            failures += 1
+            logger.error(f"{kind} handler failed: {e}")
+        latencies[kind].append(time.perf_counter() - start)
+
+    round_trips_before = _db_round_trips()
+    tasks = []
+    began = time.perf_counter()
+    for t, kind, event in events:
+        if kind not in HANDLERS:
+            continue
+        if speed:
+            delay = t / speed - (time.perf_counter() - began)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(dispatch(kind, event)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - began
+    round_trips = _db_round_trips() - round_trips_before
+
+    await stream.end_active_session()
+    await cog.cog_unload()
+    if cleanup:
+        await db.execute('DELETE FROM live_sessions WHERE id = $1', session_id)
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    count = len(all_latencies)
+    return {
+        'recording': path,
+        'speed': speed or 'max',
+        'session_id': session_id,
+        'events': count,
+        'failures': failures,
+        'elapsed': elapsed,
+        'events_per_second': count / elapsed if elapsed else 0.0,
+        'db_round_trips': round_trips,
+        'db_round_trips_per_event': round_trips / count if count else 0.0,
+        **_percentiles(all_latencies),
+        'by_kind': {
+            kind: {'events': len(values), **_percentiles(values)}
+            for kind, values in sorted(latencies.items())
+        },
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Replayed {report['events']} events from {report['recording']} at speed {report['speed']}",
+        f"  {report['elapsed']:.2f}s elapsed, {report['events_per_second']:.1f} events/s, "
+        f"{report['failures']} failures",
+        f"  handler latency p50 {report['p50'] * 1000:.2f} ms, p99 {report['p99'] * 1000:.2f} ms",
+        f"  {report['db_round_trips']} DB round-trips ({report['db_round_trips_per_event']:.2f} per event)",
+    ]
+    for kind, stats in report['by_kind'].items():
+        lines.append(
+            f"    {kind:<13} {stats['events']:>7} events  p50 {stats['p50'] * 1000:8.2f} ms  "
+            f"p99 {stats['p99'] * 1000:8.2f} ms"
+        )
+    return '\n'.join(lines)
+
+
+async def _main(args):
+    if args.synthesize:
+        synthesize(args.recording, events=args.synthesize)
+        print(f"Wrote {args.synthesize} synthetic events to {args.recording}")
+        return
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    await db.connect()
+    try:
+        report = await replay(args.recording, speed=speed, cleanup=args.cleanup)
+    finally:
+        await db.disconnect()
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded TikTok events through the ingest handlers")
+    parser.add_argument('recording', help="JSONL recording (written by TIKTOK_RECORD_DIR or --synthesize)")
+    parser.add_argument('--speed', default='1', help="playback speed multiplier (1, 10, ...) or 'max'")
+    parser.add_argument('--synthesize', type=int, metavar='EVENTS',
+                        help="write a synthetic recording with this many events instead of replaying")
+    parser.add_argument('--cleanup', action='store_true', help="delete the replay session and its rows afterwards")
+    parser.add_argument('--output', help="also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(args))
+
+
+if __name__ == '__main__':
+    main()
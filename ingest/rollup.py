@@ -0,0 +1,121 @@
+"""Streaming per-session and per-handle counters for a live TikTok session.
+
+The ingest handlers bump counters in memory; checkpoint() upserts the current
+totals into session_stats / session_handle_stats. Rows hold absolute totals, so
+a checkpoint is idempotent and a failed one is simply retried by the next.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Interaction type -> counter it increments
+COUNTERS = {
+    'join': 'joins',
+    'like': 'likes',
+    'comment': 'comments',
+    'share': 'shares',
+    'follow': 'follows',
+    'gift': 'gifts',
+}
+HANDLE_COUNTERS = ('likes', 'comments', 'shares', 'follows', 'gifts', 'coins')
+SESSION_COUNTERS = ('events', 'joins') + HANDLE_COUNTERS
+
+
+class HandleStats:
+    __slots__ = HANDLE_COUNTERS + ('first_seen', 'last_seen')
+
+    def __init__(self, now: datetime):
+        for counter in HANDLE_COUNTERS:
+            setattr(self, counter, 0)
+        self.first_seen = now
+        self.last_seen = now
+
+
+class SessionRollup:
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.totals: Dict[str, int] = dict.fromkeys(SESSION_COUNTERS, 0)
+        self.first_event_at: Optional[datetime] = None
+        self.last_event_at: Optional[datetime] = None
+        self.handles: Dict[str, HandleStats] = {}
+        self._dirty = True
+        self._dirty_handles = set()
+
+    def record(self, interaction_type: str, handle: str, count: int = 1, coins: int = 0):
+        """Count one event; `count` is the number of likes for a like event."""
+        now = datetime.now(timezone.utc)
+        counter = COUNTERS[interaction_type]
+        self.totals['events'] += 1
+        self.totals[counter] += count
+        self.totals['coins'] += coins
+        if self.first_event_at is None:
+            self.first_event_at = now
+        self.last_event_at = now
+        self._dirty = True
+
+        stats = self.handles.get(handle)
+        if stats is None:
+            stats = self.handles[handle] = HandleStats(now)
+        stats.last_seen = now
+        if counter in HANDLE_COUNTERS:
+            setattr(stats, counter, getattr(stats, counter) + count)
+        stats.coins += coins
+        self._dirty_handles.add(handle)
+
+    def top_gifters(self, limit: int = 3) -> List[Tuple[str, int]]:
+        ranked = sorted(
+            ((handle, stats.coins) for handle, stats in self.handles.items() if stats.coins),
+            key=lambda item: item[1], reverse=True
+        )
+        return ranked[:limit]
+
+    async def checkpoint(self):
+        """Upsert the session totals and every handle that changed since the last checkpoint."""
+        if not self._dirty and not self._dirty_handles:
+            return
+
+        # Snapshot synchronously so events recorded while we write mark rows dirty again
+        session_row = [self.totals[counter] for counter in SESSION_COUNTERS]
+        dirty_handles, self._dirty_handles = self._dirty_handles, set()
+        self._dirty = False
+        columns = {counter: [] for counter in HANDLE_COUNTERS + ('first_seen', 'last_seen')}
+        for handle in dirty_handles:
+            stats = self.handles[handle]
+            for counter, values in columns.items():
+                values.append(getattr(stats, counter))
+
+        try:
+            await db.execute('''
+                INSERT INTO session_stats
+                (session_id, events, joins, likes, comments, shares, follows, gifts, coins,
+                 unique_handles, first_event_at, last_event_at, updated_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, NOW())
+                ON CONFLICT (session_id) DO UPDATE SET
+                    events = EXCLUDED.events, joins = EXCLUDED.joins, likes = EXCLUDED.likes,
+                    comments = EXCLUDED.comments, shares = EXCLUDED.shares, follows = EXCLUDED.follows,
+                    gifts = EXCLUDED.gifts, coins = EXCLUDED.coins, unique_handles = EXCLUDED.unique_handles,
+                    first_event_at = EXCLUDED.first_event_at, last_event_at = EXCLUDED.last_event_at,
+                    updated_at = NOW()
+            ''', self.session_id, *session_row, len(self.handles), self.first_event_at, self.last_event_at)
+
+            if dirty_handles:
+                await db.execute('''
+                    INSERT INTO session_handle_stats
+                    (session_id, handle_name, likes, comments, shares, follows, gifts, coins, first_seen, last_seen)
+                    SELECT $1, * FROM unnest(
+                        $2::text[], $3::integer[], $4::integer[], $5::integer[], $6::integer[],
+                        $7::integer[], $8::bigint[], $9::timestamptz[], $10::timestamptz[]
+                    )
+                    ON CONFLICT (session_id, handle_name) DO UPDATE SET
+                        likes = EXCLUDED.likes, comments = EXCLUDED.comments, shares = EXCLUDED.shares,
+                        follows = EXCLUDED.follows, gifts = EXCLUDED.gifts, coins = EXCLUDED.coins,
+                        first_seen = EXCLUDED.first_seen, last_seen = EXCLUDED.last_seen
+                ''', self.session_id, list(dirty_handles), *columns.values())
+        except Exception as e:
+            logger.error(f"Error checkpointing stats for session {self.session_id}: {e}")
+            self._dirty = True
+            self._dirty_handles |= dirty_handles
@@ -0,0 +1,177 @@
+"""Append-only local spool of TikTok events, written before any database work.
+
+Every spooled event gets a sequence number and is appended to the current
+segment file as a frame: 4-byte length, 4-byte CRC32, JSON payload. Appends are
+unbuffered writes, so a crash of the bot loses nothing already appended; the
+segment is fsynced every TIKTOK_SPOOL_FSYNC_SECONDS, which bounds what an OS
+crash can lose. Once an event has reached the database it is acked; the ack
+file holds the highest sequence number below which everything is acked, and
+segments wholly below it are deleted. On startup the events above the ack are
+handed back for replay, so delivery is at-least-once.
+"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Unset disables the spool
+SPOOL_DIR = os.getenv('TIKTOK_SPOOL_DIR')
+SPOOL_SEGMENT_BYTES = int(os.getenv('TIKTOK_SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+SPOOL_FSYNC_SECONDS = float(os.getenv('TIKTOK_SPOOL_FSYNC_SECONDS', '0.2'))
+
+FRAME_HEADER = struct.Struct('>II')
+SEGMENT_SUFFIX = '.seg'
+ACK_FILE = 'ack'
+
+
+def _segment_name(first_seq: int) -> str:
+    return f'{first_seq:020d}{SEGMENT_SUFFIX}'
+
+
+def read_frames(path: str) -> Iterator[Tuple[dict, int]]:
+    """Yield each record of one segment with the offset its frame ends at, stopping at a torn or corrupt tail."""
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if not header:
+                return
+            if len(header) < FRAME_HEADER.size:
+                logger.warning(f"Truncated frame header at the end of {path}")
+                return
+            length, crc = FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                logger.warning(f"Corrupt or truncated frame in {path}; ignoring the rest of the segment")
+                return
+            yield json.loads(payload), f.tell()
+
+
+def read_segment(path: str) -> Iterator[dict]:
+    """Yield the records of one segment, stopping at a torn or corrupt tail."""
+    for record, _ in read_frames(path):
+        yield record
+
+
+class Spool:
+    def __init__(self, directory: str, segment_bytes: int = SPOOL_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.acked = self._read_ack()
+        # (first seq, path), oldest first; the last one is being appended to
+        self.segments: List[Tuple[int, str]] = sorted(
+            (int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(directory, name))
+            for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+        )
+        # Unacked seqs in append order, so the oldest is always first
+        self.outstanding: Dict[int, None] = {}
+        self.last_seq = self.acked
+        for index, (_, path) in enumerate(self.segments):
+            valid = 0
+            for record, valid in read_frames(path):
+                seq = record['seq']
+                self.last_seq = max(self.last_seq, seq)
+                if seq > self.acked:
+                    self.outstanding[seq] = None
+            if index == len(self.segments) - 1 and os.path.getsize(path) > valid:
+                # Cut a torn tail off before appending resumes, or every frame written
+                # after it would sit behind the garbage where replay never reads
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+        self._committed = self.acked
+        self._unsynced = []
+        self._file = None
+        self._size = 0
+        self._open_segment(self.last_seq + 1)
+
+    def _read_ack(self) -> int:
+        try:
+            with open(os.path.join(self.directory, ACK_FILE), encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _records(self) -> Iterator[dict]:
+        for _, path in self.segments:
+            yield from read_segment(path)
+
+    def _open_segment(self, first_seq: int):
+        path = os.path.join(self.directory, _segment_name(first_seq))
+        # Unbuffered: each append is one write() straight to the OS
+        self._file = open(path, 'ab', buffering=0)
+        self._size = self._file.tell()
+        if not self.segments or self.segments[-1][1] != path:
+            self.segments.append((first_seq, path))
+
+    def pending(self) -> Iterator[dict]:
+        """Yield the records left unacked by the previous run, oldest first."""
+        for record in self._records():
+            if record['seq'] in self.outstanding:
+                yield record
+
+    def append(self, record: dict) -> int:
+        """Append a record and return its sequence number; durable on disk after the next sync()."""
+        if self._size >= self.segment_bytes:
+            self._unsynced.append(self._file)
+            self._open_segment(self.last_seq + 1)
+        self.last_seq += 1
+        seq = self.last_seq
+        payload = json.dumps({'seq': seq, **record}, separators=(',', ':')).encode()
+        self._file.write(FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._size += FRAME_HEADER.size + len(payload)
+        self.outstanding[seq] = None
+        return seq
+
+    def ack(self, seq: Optional[int]):
+        if seq is not None:
+            self.outstanding.pop(seq, None)
+
+    @property
+    def watermark(self) -> int:
+        """Every seq up to and including this one has been acked."""
+        if self.outstanding:
+            return next(iter(self.outstanding)) - 1
+        return self.last_seq
+
+    def _sync(self, files, watermark: int):
+        for f in files:
+            os.fsync(f.fileno())
+        if watermark != self._committed:
+            tmp = os.path.join(self.directory, ACK_FILE + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(str(watermark))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.directory, ACK_FILE))
+
+    async def sync(self):
+        """fsync what has been appended, persist the ack watermark and drop fully acked segments."""
+        if self._file is None:
+            return
+        closed, self._unsynced = self._unsynced, []
+        watermark = self.watermark
+        # fsync can take milliseconds; keep it off the event loop
+        await asyncio.to_thread(self._sync, closed + [self._file], watermark)
+        for f in closed:
+            f.close()
+        self._committed = self.acked = watermark
+
+        while len(self.segments) > 1 and self.segments[1][0] - 1 <= watermark:
+            _, path = self.segments.pop(0)
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Error removing spool segment {path}: {e}")
+
+    async def close(self):
+        await self.sync()
+        self._file.close()
+        self._file = None
+        if self.outstanding:
+            logger.warning(f"Closing spool with {len(self.outstanding)} unacked events; they replay on next start")
@@ -0,0 +1,103 @@
+"""Gift streak (combo) tracking for a live session.
+
+A streakable gift arrives as a run of in-progress frames (streaking=True) with a
+growing repeat_count, then one final frame. In-progress frames only update a
+small slotted record here; the gift is handed on once, when the final frame
+arrives or, if it never does, once the streak has been idle for
+TIKTOK_STREAK_TIMEOUT_SECONDS.
+
+A streak handed on by the timeout is remembered for TIKTOK_STREAK_MEMORY_SECONDS,
+so a final frame (or more frames) arriving late only credits the repeats beyond
+what was already recorded.
+"""
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+STREAK_TIMEOUT_SECONDS = float(os.getenv('TIKTOK_STREAK_TIMEOUT_SECONDS', '15'))
+STREAK_MEMORY_SECONDS = float(os.getenv('TIKTOK_STREAK_MEMORY_SECONDS', '60'))
+
+
+class GiftStreak:
+    __slots__ = ('gift_id', 'repeat_count', 'diamond_count', 'user_level', 'updated_at', 'credited', 'seqs')
+
+    def __init__(self, gift_id: int, repeat_count: int, diamond_count: int, user_level: int, updated_at: float,
+                 credited: int = 0, seqs: Optional[List[int]] = None):
+        self.gift_id = gift_id
+        self.repeat_count = repeat_count
+        self.diamond_count = diamond_count
+        self.user_level = user_level
+        self.updated_at = updated_at
+        # Repeats of this combo already recorded by an earlier, expired streak
+        self.credited = credited
+        # Spool seqs of the frames seen so far; acked once the streak is recorded
+        self.seqs = [] if seqs is None else seqs
+
+    @property
+    def count(self) -> int:
+        """Repeats still to be credited."""
+        return max(self.repeat_count - self.credited, 0)
+
+    @property
+    def coins(self) -> int:
+        return self.diamond_count * self.count
+
+
+class StreakTracker:
+    def __init__(self, timeout: float = STREAK_TIMEOUT_SECONDS, memory: float = STREAK_MEMORY_SECONDS):
+        self.timeout = timeout
+        self.memory = memory
+        # (handle, gift id) -> streak in progress
+        self.streaks: Dict[Tuple[str, int], GiftStreak] = {}
+        # (handle, gift id) -> (repeat count recorded, expired at) for streaks that timed out
+        self.expired: Dict[Tuple[str, int], Tuple[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.streaks)
+
+    def _credited(self, key: Tuple[str, int], repeat_count: int, now: float) -> int:
+        """Repeats of this combo already recorded when its streak expired, if the frame continues it."""
+        expired = self.expired.pop(key, None)
+        if expired is None or now - expired[1] > self.memory:
+            return 0
+        # A lower count than was recorded can only be a new combo of the same gift
+        return expired[0] if repeat_count >= expired[0] else 0
+
+    def update(self, handle: str, gift_id: int, repeat_count: int, diamond_count: int, user_level: int = 0,
+               streaking: bool = False, now: Optional[float] = None, seq: Optional[int] = None) -> Optional[GiftStreak]:
+        """Record a gift frame; returns the finished gift when this frame completes one.
+
+        The finished gift may have nothing left to credit (count == 0) when a late final
+        frame repeats what its expired streak already recorded; its seqs still need acking.
+        """
+        now = time.monotonic() if now is None else now
+        key = (handle, gift_id)
+        streak = self.streaks.get(key) if streaking else self.streaks.pop(key, None)
+        if streak is None:
+            streak = GiftStreak(gift_id, repeat_count, diamond_count, user_level, now,
+                                self._credited(key, repeat_count, now))
+            if streaking:
+                self.streaks[key] = streak
+        else:
+            # The final frame carries the streak's total; never report less than was seen
+            streak.repeat_count = max(streak.repeat_count, repeat_count)
+            streak.user_level = user_level
+            streak.updated_at = now
+        if seq is not None:
+            streak.seqs.append(seq)
+        return None if streaking else streak
+
+    def expire(self, now: Optional[float] = None) -> List[Tuple[str, GiftStreak]]:
+        """Remove and return the streaks idle for longer than the timeout."""
+        now = time.monotonic() if now is None else now
+        self.expired = {key: seen for key, seen in self.expired.items() if now - seen[1] <= self.memory}
+        expired = [key for key, streak in self.streaks.items() if now - streak.updated_at > self.timeout]
+        for key in expired:
+            self.expired[key] = (self.streaks[key].repeat_count, now)
+        return [(key[0], self.streaks.pop(key)) for key in expired]
+
+    def drain(self) -> List[Tuple[str, GiftStreak]]:
+        """Remove and return every streak still open; used when the session ends."""
+        streaks, self.streaks = self.streaks, {}
+        self.expired = {}
+        return [(handle, streak) for (handle, _), streak in streaks.items()]
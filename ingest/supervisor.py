@@ -0,0 +1,176 @@
+"""Keeps a TikTok LIVE connection up for as long as it is wanted.
+
+The supervisor owns the connect/reconnect loop: failed or dropped connections
+are retried with jittered exponential backoff, a connection that goes silent is
+dropped and retried, and the owner is told once an outage has outlasted the
+resume grace window (until then a reconnect continues the same session).
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_BASE_SECONDS = float(os.getenv('TIKTOK_RECONNECT_BASE_SECONDS', '2'))
+RECONNECT_MAX_SECONDS = float(os.getenv('TIKTOK_RECONNECT_MAX_SECONDS', '120'))
+# A reconnect within this long after a drop resumes the same live session
+RESUME_GRACE_SECONDS = float(os.getenv('TIKTOK_RESUME_GRACE_SECONDS', '120'))
+# A connection with no events for this long is treated as dead and re-established
+HEALTH_TIMEOUT_SECONDS = float(os.getenv('TIKTOK_HEALTH_TIMEOUT_SECONDS', '90'))
+# Connections that stayed up this long reset the backoff
+STABLE_CONNECTION_SECONDS = 60
+
+
+def backoff_delay(failures: int, base: float = RECONNECT_BASE_SECONDS, cap: float = RECONNECT_MAX_SECONDS,
+                  rng: Callable[[], float] = random.random) -> float:
+    """Exponential backoff with equal jitter: somewhere in the upper half of the current ceiling."""
+    ceiling = min(cap, base * 2 ** failures)
+    return ceiling / 2 + rng() * ceiling / 2
+
+
+class ConnectionSupervisor:
+    def __init__(self, connect: Callable[[], Awaitable[None]], disconnect: Callable[[], Awaitable[None]],
+                 on_outage_expired: Callable[[], Awaitable[None]], persistent: bool = True,
+                 grace_seconds: float = RESUME_GRACE_SECONDS, health_timeout: float = HEALTH_TIMEOUT_SECONDS,
+                 base_delay: float = RECONNECT_BASE_SECONDS, max_delay: float = RECONNECT_MAX_SECONDS):
+        # connect() blocks for the lifetime of one connection; disconnect() forces it to return
+        self._connect = connect
+        self._disconnect = disconnect
+        self._on_outage_expired = on_outage_expired
+        self.persistent = persistent
+        self.grace_seconds = grace_seconds
+        self.health_timeout = health_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.state = 'idle'
+        self.attempts = 0
+        self.reconnects = 0
+        self.last_error: Optional[BaseException] = None
+        self.connected_at: Optional[float] = None
+        self.last_activity = time.monotonic()
+        self.lost_at: Optional[float] = None
+        self._outage_expired = False
+        self._stopped = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    def finish(self):
+        """Stop reconnecting: run() exits once the current connection returns.
+
+        Unlike stop() this is safe from inside the supervisor's own task, e.g. in a handler
+        the connection awaits; the caller still has to end that connection.
+        """
+        self._stopped = True
+
+    async def stop(self):
+        if self._task is asyncio.current_task():
+            raise RuntimeError("ConnectionSupervisor.stop() cannot run inside its own task; use finish()")
+        self._stopped = True
+        if self._task and not self._task.done():
+            try:
+                await self._disconnect()
+            except Exception:
+                pass
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.state = 'stopped'
+
+    def mark_connected(self):
+        """Called when the connection is actually live (ConnectEvent)."""
+        if self.lost_at is not None:
+            self.reconnects += 1
+        self.state = 'connected'
+        self.connected_at = time.monotonic()
+        self.last_activity = self.connected_at
+        self.lost_at = None
+        self._outage_expired = False
+
+    def touch(self):
+        """Record that an event arrived; keeps the health probe from recycling the connection."""
+        self.last_activity = time.monotonic()
+
+    def outage_seconds(self) -> float:
+        return time.monotonic() - self.lost_at if self.lost_at is not None else 0.0
+
+    async def _probe(self):
+        interval = max(self.health_timeout / 3, 0.01)
+        while True:
+            await asyncio.sleep(interval)
+            if self.state == 'connected' and time.monotonic() - self.last_activity > self.health_timeout:
+                logger.warning(f"No TikTok events for {self.health_timeout:.0f}s; recycling the connection")
+                await self._disconnect()
+                return
+
+    async def _expire_outage(self):
+        if not self._outage_expired:
+            self._outage_expired = True
+            logger.info(f"TikTok connection down for {self.outage_seconds():.0f}s; ending the session")
+            try:
+                await self._on_outage_expired()
+            except Exception as e:
+                logger.error(f"Error ending session after outage: {e}")
+
+    async def _wait(self, delay: float):
+        """Sleep out a backoff delay, ending the session as soon as the grace window passes."""
+        deadline = time.monotonic() + delay
+        while not self._stopped:
+            remaining = deadline - time.monotonic()
+            grace_left = self.grace_seconds - self.outage_seconds()
+            if not self._outage_expired and grace_left <= 0:
+                await self._expire_outage()
+                continue
+            if remaining <= 0:
+                return
+            sleep_for = remaining if self._outage_expired else min(remaining, grace_left)
+            await asyncio.sleep(sleep_for)
+
+    async def run(self):
+        failures = 0
+        while not self._stopped:
+            self.state = 'connecting'
+            self.attempts += 1
+            started = time.monotonic()
+            probe = asyncio.create_task(self._probe())
+            try:
+                await self._connect()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = e
+                logger.warning(f"TikTok connection attempt {self.attempts} failed: {e!r}")
+            finally:
+                probe.cancel()
+
+            if self._stopped:
+                break
+            if self.lost_at is None:
+                self.lost_at = time.monotonic()
+            if time.monotonic() - started >= STABLE_CONNECTION_SECONDS:
+                failures = 0
+
+            if not self.persistent and self.outage_seconds() >= self.grace_seconds:
+                await self._expire_outage()
+                logger.info("TikTok connection not persistent; giving up after the grace window")
+                break
+
+            delay = backoff_delay(failures, self.base_delay, self.max_delay)
+            failures += 1
+            self.state = 'backoff'
+            logger.info(f"Reconnecting to TikTok in {delay:.1f}s (attempt {self.attempts + 1})")
+            await self._wait(delay)
+
+            if not self.persistent and self._outage_expired:
+                logger.info("TikTok connection not persistent; giving up after the grace window")
+                break
+
+        self.state = 'stopped'
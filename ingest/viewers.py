@@ -0,0 +1,152 @@
+"""Downsampled viewer-count time series for a live session.
+
+RoomUserSeqEvents arrive many times a minute. Raw samples go into a small ring
+buffer (for the live view) and are folded into fixed-interval buckets holding
+min/max/avg/last; only a closed bucket is written, one row per interval.
+"""
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Optional, Sequence, Tuple
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+VIEWER_BUCKET_SECONDS = int(os.getenv('TIKTOK_VIEWER_BUCKET_SECONDS', '30'))
+# Sessions that ended more than this many days ago are re-bucketed to
+# VIEWER_COMPACT_BUCKET_SECONDS; 0 keeps full resolution forever
+VIEWER_COMPACT_AFTER_DAYS = int(os.getenv('TIKTOK_VIEWER_COMPACT_AFTER_DAYS', '0'))
+VIEWER_COMPACT_BUCKET_SECONDS = 300
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+
+def sparkline(values: Sequence[float], width: int = 40) -> str:
+    """Render values as a unicode sparkline, averaging down to at most `width` characters."""
+    values = [value for value in values if value is not None]
+    if not values:
+        return ''
+    if len(values) > width:
+        step = len(values) / width
+        values = [
+            sum(chunk) / len(chunk)
+            for chunk in (values[int(i * step):int((i + 1) * step)] for i in range(width))
+            if chunk
+        ]
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return ''.join(SPARK_CHARS[int((value - low) / span * (len(SPARK_CHARS) - 1))] for value in values)
+
+
+class ViewerBucket:
+    __slots__ = ('start', 'min', 'max', 'total', 'samples', 'last')
+
+    def __init__(self, start: datetime, viewers: int):
+        self.start = start
+        self.min = self.max = self.total = self.last = viewers
+        self.samples = 1
+
+    def add(self, viewers: int):
+        self.min = min(self.min, viewers)
+        self.max = max(self.max, viewers)
+        self.total += viewers
+        self.samples += 1
+        self.last = viewers
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.samples
+
+
+class ViewerSeries:
+    def __init__(self, session_id: int, bucket_seconds: int = VIEWER_BUCKET_SECONDS, buffer_size: int = 240):
+        self.session_id = session_id
+        self.bucket_seconds = bucket_seconds
+        # (sampled at, viewers) for the most recent samples only
+        self.recent: Deque[Tuple[datetime, int]] = deque(maxlen=buffer_size)
+        self.current: Optional[ViewerBucket] = None
+        self.peak = 0
+
+    def _bucket_start(self, at: datetime) -> datetime:
+        epoch = int(at.timestamp())
+        return datetime.fromtimestamp(epoch - epoch % self.bucket_seconds, timezone.utc)
+
+    def add(self, viewers: int, at: Optional[datetime] = None) -> Optional[ViewerBucket]:
+        """Record a sample; returns the previous bucket if this sample closed it."""
+        at = at or datetime.now(timezone.utc)
+        self.recent.append((at, viewers))
+        self.peak = max(self.peak, viewers)
+
+        start = self._bucket_start(at)
+        if self.current and self.current.start == start:
+            self.current.add(viewers)
+            return None
+
+        closed, self.current = self.current, ViewerBucket(start, viewers)
+        return closed
+
+    async def write(self, bucket: ViewerBucket):
+        await db.execute('''
+            INSERT INTO viewer_count_buckets
+            (session_id, bucket_start, bucket_seconds, min_viewers, max_viewers, avg_viewers, last_viewers, samples)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            ON CONFLICT (session_id, bucket_start) DO UPDATE SET
+                min_viewers = LEAST(viewer_count_buckets.min_viewers, EXCLUDED.min_viewers),
+                max_viewers = GREATEST(viewer_count_buckets.max_viewers, EXCLUDED.max_viewers),
+                avg_viewers = (viewer_count_buckets.avg_viewers * viewer_count_buckets.samples
+                               + EXCLUDED.avg_viewers * EXCLUDED.samples)
+                              / (viewer_count_buckets.samples + EXCLUDED.samples),
+                last_viewers = EXCLUDED.last_viewers,
+                samples = viewer_count_buckets.samples + EXCLUDED.samples
+        ''', self.session_id, bucket.start, self.bucket_seconds, bucket.min, bucket.max,
+            bucket.avg, bucket.last, bucket.samples)
+
+    async def close(self):
+        """Write the bucket still being filled; called when the session ends."""
+        current, self.current = self.current, None
+        if current:
+            await self.write(current)
+
+
+async def compact_viewer_buckets(older_than_days: int = VIEWER_COMPACT_AFTER_DAYS,
+                                 bucket_seconds: int = VIEWER_COMPACT_BUCKET_SECONDS) -> int:
+    """Merge the fine-grained buckets of long-ended sessions into coarser ones.
+
+    Returns the number of fine buckets folded away.
+    """
+    if older_than_days <= 0:
+        return 0
+
+    # One statement, so the fine buckets are never gone without their merged replacement
+    compacted = await db.fetchval('''
+        WITH old AS (
+            DELETE FROM viewer_count_buckets b
+            USING live_sessions s
+            WHERE b.session_id = s.id
+            AND s.ended_at < NOW() - $1 * INTERVAL '1 day'
+            AND b.bucket_seconds < $2
+            RETURNING b.*
+        ), merged AS (
+            INSERT INTO viewer_count_buckets
+            (session_id, bucket_start, bucket_seconds, min_viewers, max_viewers,
+             avg_viewers, last_viewers, samples)
+            SELECT
+                session_id,
+                to_timestamp(floor(extract(epoch FROM bucket_start) / $2) * $2),
+                $2,
+                MIN(min_viewers),
+                MAX(max_viewers),
+                SUM(avg_viewers * samples) / SUM(samples),
+                (array_agg(last_viewers ORDER BY bucket_start DESC))[1],
+                SUM(samples)
+            FROM old
+            GROUP BY 1, 2
+        )
+        SELECT COUNT(*) FROM old
+    ''', older_than_days, bucket_seconds)
+
+    if compacted:
+        logger.info(f"Compacted {compacted} viewer buckets into {bucket_seconds}s buckets")
+    return compacted
@@ -0,0 +1,156 @@
+"""Out-of-process TikTok ingest worker.
+
+With TIKTOK_INGEST_MODE=worker each followed stream gets its own worker process,
+which owns the TikTokLive websocket (decode and protobuf parsing included) and
+sends normalized events back to the bot over a Unix socket, one JSON object per
+line holding a TikTokEvent as a JSON array. The bot's loop only parses those
+lines and runs the handlers, so stream load stays off the gateway loop.
+
+    python -m ingest.worker <username> --fd <inherited socket fd> [--recording x.jsonl --speed max]
+
+The bot starts workers itself (spawn_worker); --recording replays a file
+instead of connecting, which is how the worker path is tested and benchmarked.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from typing import AsyncIterator, Optional, Tuple
+
+from TikTokLive import TikTokLiveClient
+from TikTokLive.events import ConnectEvent, DisconnectEvent, LiveEndEvent
+
+from ingest.events import TikTokEvent, from_fields, normalize
+from ingest.recorder import RECORDED_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# 'inprocess' (default) runs TikTokLive inside the bot; 'worker' moves it to a subprocess per stream
+INGEST_MODE = os.getenv('TIKTOK_INGEST_MODE', 'inprocess')
+
+def _encode(event: TikTokEvent) -> bytes:
+    return (json.dumps(event, separators=(',', ':')) + '\n').encode()
+
+
+async def _connect_tiktok(username: str, send):
+    client = TikTokLiveClient(unique_id=username)
+
+    def forward(kind):
+        async def listener(event):
+            await send(normalize(kind, event))
+        return listener
+
+    for kind, (event_type, _) in RECORDED_EVENTS.items():
+        client.add_listener(event_type, forward(kind))
+    client.add_listener(ConnectEvent, forward('connect'))
+    client.add_listener(DisconnectEvent, forward('disconnect'))
+    client.add_listener(LiveEndEvent, forward('live_end'))
+
+    try:
+        await client.connect()
+    finally:
+        try:
+            await client.disconnect(close_client=True)
+        except Exception:
+            pass
+
+
+async def _replay_recording(path: str, speed: Optional[float], send):
+    await send(TikTokEvent('connect'))
+    began = time.perf_counter()
+    with open(path, encoding='utf-8') as f:
+        f.readline()
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            t = record.pop('t')
+            if speed:
+                delay = t / speed - (time.perf_counter() - began)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await send(from_fields(record.pop('kind'), record))
+    await send(TikTokEvent('live_end'))
+
+
+async def run_worker(username: str, sock: socket.socket, recording: Optional[str] = None,
+                     speed: Optional[float] = None) -> int:
+    reader, writer = await asyncio.open_unix_connection(sock=sock)
+
+    async def send(event: TikTokEvent):
+        writer.write(_encode(event))
+        # Let the bot apply backpressure instead of buffering without bound
+        await writer.drain()
+
+    if recording:
+        source = asyncio.create_task(_replay_recording(recording, speed, send))
+    else:
+        source = asyncio.create_task(_connect_tiktok(username, send))
+    # The bot closing its end of the socket is the signal to stop
+    closed = asyncio.create_task(reader.read())
+
+    status = 0
+    try:
+        await asyncio.wait({source, closed}, return_when=asyncio.FIRST_COMPLETED)
+        if source.done() and source.exception():
+            status = 1
+            await send(TikTokEvent('error', text=repr(source.exception())))
+    except (ConnectionError, BrokenPipeError):
+        pass
+    finally:
+        for task in (source, closed):
+            task.cancel()
+        await asyncio.gather(source, closed, return_exceptions=True)
+        writer.close()
+    return status
+
+
+async def spawn_worker(username: str, *extra_args: str) -> Tuple[asyncio.subprocess.Process, asyncio.StreamReader,
+                                                                  asyncio.StreamWriter]:
+    """Start a worker for `username` on one end of a socket pair; returns the process and our end."""
+    ours, theirs = socket.socketpair()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'ingest.worker', username, '--fd', str(theirs.fileno()), *extra_args,
+            pass_fds=(theirs.fileno(),)
+        )
+    finally:
+        theirs.close()
+    # Event lines are small, but a long comment should never trip the default 64 KiB line limit
+    reader, writer = await asyncio.open_unix_connection(sock=ours, limit=1 << 20)
+    return process, reader, writer
+
+
+async def read_events(reader: asyncio.StreamReader) -> AsyncIterator[TikTokEvent]:
+    """Yield each event a worker sends, until it closes the socket.
+
+    Besides the RECORDED_EVENTS kinds a worker sends 'connect', 'disconnect' and
+    'live_end', and 'error' (with the exception in `text`) just before exiting on a failure.
+    """
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        yield TikTokEvent(*json.loads(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run TikTok LIVE ingestion for one account in its own process")
+    parser.add_argument('username', help="TikTok account to follow")
+    parser.add_argument('--fd', type=int, required=True, help="inherited Unix socket file descriptor to write events to")
+    parser.add_argument('--recording', help="replay this recording instead of connecting to TikTok")
+    parser.add_argument('--speed', default='max', help="replay speed multiplier or 'max' (with --recording)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sock = socket.socket(fileno=args.fd)
+    speed = None if args.speed == 'max' else float(args.speed)
+    sys.exit(asyncio.run(run_worker(args.username.lstrip('@'), sock, args.recording, speed)))
+
+
+if __name__ == '__main__':
+    main()
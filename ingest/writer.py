@@ -0,0 +1,113 @@
+"""Shared batched writer for high-volume TikTok interaction rows.
+
+Every live stream hands its join/share/follow/comment events (and its per-handle
+like aggregates) to one InteractionWriter, which writes whatever has queued up
+as a single statement every TIKTOK_WRITER_FLUSH_SECONDS, or sooner once
+TIKTOK_WRITER_MAX_BATCH rows are waiting. Gifts are not batched: they move songs
+between queue tiers and are written as they arrive. With a spool, each row carries
+the spool sequence numbers it covers and they are acked once the row is written.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from database import db, FLUSH_INTERACTIONS
+from ingest.spool import Spool
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WRITER_FLUSH_SECONDS = float(os.getenv('TIKTOK_WRITER_FLUSH_SECONDS', '1'))
+WRITER_MAX_BATCH = int(os.getenv('TIKTOK_WRITER_MAX_BATCH', '1000'))
+# Rows kept for retry while the database is unreachable; older rows beyond this are dropped
+WRITER_MAX_BACKLOG = int(os.getenv('TIKTOK_WRITER_MAX_BACKLOG', '50000'))
+
+# (session_id, handle_name, user_level, interaction_type, like_count, comment, timestamp, spool seqs)
+Row = Tuple[int, str, int, str, Optional[int], Optional[str], datetime, Sequence[int]]
+COLUMNS = 7
+
+
+class InteractionWriter:
+    def __init__(self, flush_seconds: float = WRITER_FLUSH_SECONDS, max_batch: int = WRITER_MAX_BATCH,
+                 max_backlog: int = WRITER_MAX_BACKLOG, spool: Optional[Spool] = None):
+        self.spool = spool
+        self.flush_seconds = flush_seconds
+        self.max_batch = max_batch
+        self.max_backlog = max_backlog
+        self.rows: List[Row] = []
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.batch_rows = registry.histogram(
+            'tiktok_writer_batch_rows', 'Interaction rows per batched write',
+            buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+        )
+        self.rows_written = registry.counter('tiktok_writer_rows_total', 'Interaction rows written by the batch writer')
+        self.rows_dropped = registry.counter('tiktok_writer_dropped_total', 'Interaction rows dropped over the backlog cap')
+
+    def add(self, session_id: int, interaction_type: str, handle_name: str, user_level: int = 0,
+            like_count: Optional[int] = None, comment: Optional[str] = None, seqs: Sequence[int] = ()):
+        self.rows.append((
+            session_id, handle_name, user_level or 0, interaction_type, like_count, comment,
+            datetime.now(timezone.utc), seqs
+        ))
+        if len(self.rows) >= self.max_batch:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of rows written."""
+        async with self._lock:
+            rows, self.rows = self.rows, []
+            if not rows:
+                return 0
+
+            written = 0
+            try:
+                while rows:
+                    batch = rows[:self.max_batch]
+                    columns = list(zip(*batch))
+                    await db.execute(FLUSH_INTERACTIONS, *(list(column) for column in columns[:COLUMNS]))
+                    if self.spool:
+                        for seqs in columns[COLUMNS]:
+                            for seq in seqs:
+                                self.spool.ack(seq)
+                    rows = rows[len(batch):]
+                    written += len(batch)
+                    self.batch_rows.observe(len(batch))
+                    self.rows_written.inc(len(batch))
+            except Exception as e:
+                logger.error(f"Error writing {len(rows)} interaction rows: {e}")
+                # Keep the unwritten rows ahead of anything queued meanwhile, up to the backlog cap
+                self.rows = rows + self.rows
+                overflow = len(self.rows) - self.max_backlog
+                if overflow > 0:
+                    # Spooled rows stay unacked, so they are replayed on the next start
+                    del self.rows[:overflow]
+                    self.rows_dropped.inc(overflow)
+                    logger.warning(f"Dropped {overflow} interaction rows over the writer backlog cap")
+            return written
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop after its current write and flush whatever is left."""
+        self._stopping = True
+        self._wake.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
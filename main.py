@@ -4,16 +4,31 @@ from discord.ext import commands
 from dotenv import load_dotenv
 import logging
 import asyncio
+import hashlib
+import importlib
+import json
+import time
+from contextlib import contextmanager
 from database import db
+from metrics import registry
+from monitoring import LoopMonitor, configure_logging
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+log_listener = configure_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+COGS = [
+    'cogs.submissions',
+    'cogs.queue',
+    'cogs.tiktok_integration',
+    'cogs.tiktok_linking',
+    'cogs.luxury_coins',
+    'cogs.persistent_embeds',
+    'cogs.admin',
+    'cogs.points_sync'
+]
+
 
 class MusicBot(commands.Bot):
     def __init__(self):
@@ -27,38 +42,122 @@ class MusicBot(commands.Bot):
             intents=intents,
             help_command=None
         )
+        self.startup_timings: dict[str, float] = {}
+        self._startup_began = time.perf_counter()
+        self.loop_monitor = LoopMonitor()
+        self.interaction_delay = registry.histogram(
+            'interaction_dispatch_delay_seconds',
+            'Time from interaction creation (per Discord) until the bot starts handling it'
+        )
+
+    @contextmanager
+    def _timed(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - start
 
     async def setup_hook(self):
+        # Importing the cog modules is CPU-bound (TikTokLive alone takes seconds), so it
+        # runs in a worker thread while the database connects; load_extension below then
+        # finds their dependencies already in sys.modules.
+        preload = asyncio.create_task(self._preload_cog_modules())
+        self.loop_monitor.start()
+
         logger.info("Connecting to database...")
-        await db.connect()
+        with self._timed('db_connect'):
+            await db.connect(initialize=False)
+        with self._timed('schema'):
+            await db.initialize_schema()
+
+        await preload
 
+        # Cogs don't depend on each other at load time (they look each other up
+        # lazily with get_cog), so they can be loaded concurrently.
         logger.info("Loading cogs...")
-        cogs = [
-            'cogs.submissions',
-            'cogs.queue',
-            'cogs.tiktok_integration',
-            'cogs.tiktok_linking',
-            'cogs.luxury_coins',
-            'cogs.persistent_embeds',
-            'cogs.admin',
-            'cogs.points_sync'
-        ]
-
-        for cog in cogs:
+        with self._timed('cogs'):
+            await asyncio.gather(*(self._load_cog(cog) for cog in COGS))
+
+        with self._timed('tree_sync'):
+            await self.sync_command_tree()
+
+    async def _preload_cog_modules(self):
+        def import_all():
+            for cog in COGS:
+                try:
+                    importlib.import_module(cog)
+                except Exception:
+                    # load_extension reports the real error
+                    pass
+
+        with self._timed('cog_imports'):
+            await asyncio.to_thread(import_all)
+
+    async def _load_cog(self, cog: str):
+        with self._timed(f'cog:{cog}'):
             try:
                 await self.load_extension(cog)
                 logger.info(f"Loaded {cog}")
             except Exception as e:
                 logger.error(f"Failed to load {cog}: {e}")
 
+    def command_tree_hash(self) -> str:
+        payload = sorted(
+            (cmd.to_dict(self.tree) for cmd in self.tree.get_commands()),
+            key=lambda c: (c.get('type', 1), c['name'])
+        )
+        raw = json.dumps([self.application_id, payload], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def sync_command_tree(self):
+        """Sync application commands only when their definitions changed since the last sync."""
+        tree_hash = self.command_tree_hash()
+        force = os.getenv('FORCE_COMMAND_SYNC', 'false').lower() == 'true'
+
+        stored_hash = await db.fetchval(
+            "SELECT value FROM bot_config WHERE key = 'command_tree_hash'"
+        )
+
+        if stored_hash == tree_hash and not force:
+            logger.info('Command tree unchanged, skipping sync')
+            return
+
+        try:
+            await self.tree.sync()
+        except discord.HTTPException as e:
+            logger.error(f"Command tree sync failed: {e}")
+            return
+
+        await db.execute('''
+            INSERT INTO bot_config (key, value)
+            VALUES ('command_tree_hash', $1)
+            ON CONFLICT (key) DO UPDATE
+            SET value = $1
+        ''', tree_hash)
+        logger.info('Command tree synced')
+
     async def on_ready(self):
         logger.info(f'Bot logged in as {self.user} (ID: {self.user.id})')
-        await self.tree.sync()
-        logger.info('Command tree synced')
+
+        # on_ready fires again after every reconnect; only the first one is part of startup
+        if 'gateway_ready' not in self.startup_timings:
+            self.startup_timings['gateway_ready'] = time.perf_counter() - self._startup_began
+            summary = ', '.join(
+                f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in self.startup_timings.items()
+            )
+            logger.info(f"Startup timings: {summary}")
+
+    async def on_interaction(self, interaction: discord.Interaction):
+        # Everything here eats into Discord's 3-second acknowledgement window
+        delay = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        self.interaction_delay.observe(max(delay, 0.0))
 
     async def close(self):
-        await db.disconnect()
+        self.loop_monitor.stop()
+        # Cogs flush their buffers while unloading, so the pool has to outlive them
         await super().close()
+        await db.disconnect()
 
 
 async def main():
@@ -77,6 +176,8 @@ async def main():
     except Exception as e:
         logger.error(f"Error running bot: {e}")
         await bot.close()
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":
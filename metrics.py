@@ -0,0 +1,133 @@
+import bisect
+from typing import Dict, Optional, Tuple
+
+# Seconds; tuned for DB calls and handler latencies (1 ms .. 30 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+        self.max = 0
+
+    def set(self, value):
+        self.value = value
+        self.max = max(self.max, value)
+
+    def inc(self, amount=1):
+        self.set(self.value + amount)
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """Approximate percentile (0-100): the upper bound of the bucket holding it."""
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+def _escape_label(value) -> str:
+    # The exposition format requires these three escaped inside a quoted label value
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    parts = [f'{k}="{_escape_label(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class MetricsRegistry:
+    """In-process metric store, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], object] = {}
+        self._help: Dict[str, str] = {}
+
+    def _get(self, cls, name: str, help_text: Optional[str], labels: Optional[dict], **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = cls(**kwargs)
+            if help_text:
+                self._help[name] = help_text
+        return metric
+
+    def counter(self, name: str, help_text: str = None, labels: dict = None) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str = None, labels: dict = None) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str = None, labels: dict = None,
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def collect(self, name: str):
+        """Yield (labels dict, metric) for every series of a metric."""
+        for (metric_name, labels), metric in self._metrics.items():
+            if metric_name == name:
+                yield dict(labels), metric
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted({name for name, _ in self._metrics}):
+            series = [(labels, m) for (n, labels), m in self._metrics.items() if n == name]
+            kind = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}[type(series[0][1])]
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+            for labels, metric in series:
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, bucket_count in zip(metric.buckets, metric.counts):
+                        cumulative += bucket_count
+                        le = _label_text(labels, 'le="%s"' % bound)
+                        lines.append(f'{name}_bucket{le} {cumulative}')
+                    le = _label_text(labels, 'le="+Inf"')
+                    lines.append(f'{name}_bucket{le} {metric.count}')
+                    lines.append(f'{name}_sum{_label_text(labels)} {metric.sum}')
+                    lines.append(f'{name}_count{_label_text(labels)} {metric.count}')
+                else:
+                    lines.append(f'{name}{_label_text(labels)} {metric.value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
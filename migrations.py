@@ -0,0 +1,515 @@
+import logging
+import re
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant shared by every bot process so only one of them migrates at a time
+MIGRATION_LOCK_ID = 7310452
+
+_CONCURRENT_INDEX = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE
+)
+
+SCHEMA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ DEFAULT NOW()
+    );
+'''
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: tuple
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so online
+    # index builds are applied statement by statement and recorded afterwards.
+    # Keep their statements idempotent (IF NOT EXISTS) so a retry is safe; an
+    # invalid index left by a failed build is dropped and rebuilt on the retry.
+    transactional: bool = True
+
+
+MIGRATIONS = [
+    Migration(1, 'baseline schema', (
+        '''
+        CREATE TABLE IF NOT EXISTS live_sessions (
+            id SERIAL PRIMARY KEY,
+            session_id INTEGER,
+            tiktok_username TEXT NOT NULL,
+            started_at TIMESTAMPTZ DEFAULT NOW(),
+            ended_at TIMESTAMPTZ,
+            status TEXT DEFAULT 'active'
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tiktok_accounts (
+            handle_id SERIAL PRIMARY KEY,
+            handle_name TEXT UNIQUE NOT NULL,
+            first_seen TIMESTAMPTZ DEFAULT NOW(),
+            last_seen TIMESTAMPTZ DEFAULT NOW(),
+            linked_discord_id BIGINT,
+            points INTEGER DEFAULT 0 NOT NULL,
+            last_known_level INTEGER DEFAULT 0
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tiktok_interactions (
+            id SERIAL PRIMARY KEY,
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            tiktok_account_id INTEGER REFERENCES tiktok_accounts(handle_id) ON DELETE SET NULL,
+            interaction_type TEXT NOT NULL,
+            value TEXT,
+            coin_value INTEGER,
+            user_level INTEGER,
+            timestamp TIMESTAMPTZ DEFAULT NOW()
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS viewer_count_snapshots (
+            id SERIAL PRIMARY KEY,
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            viewer_count INTEGER NOT NULL,
+            timestamp TIMESTAMPTZ DEFAULT NOW()
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS submissions (
+            id SERIAL PRIMARY KEY,
+            public_id TEXT UNIQUE NOT NULL,
+            user_id BIGINT NOT NULL,
+            username TEXT NOT NULL,
+            artist_name TEXT NOT NULL,
+            song_name TEXT NOT NULL,
+            link_or_file TEXT,
+            queue_line TEXT,
+            submission_time TIMESTAMPTZ DEFAULT NOW(),
+            played_time TIMESTAMPTZ,
+            note TEXT,
+            tiktok_username TEXT,
+            total_score REAL DEFAULT 0
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_points (
+            user_id BIGINT PRIMARY KEY,
+            points INTEGER DEFAULT 0 NOT NULL
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS bot_config (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            channel_id BIGINT,
+            message_id BIGINT
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS persistent_embeds (
+            id SERIAL PRIMARY KEY,
+            embed_type TEXT NOT NULL,
+            channel_id BIGINT NOT NULL,
+            message_id BIGINT NOT NULL,
+            current_page INTEGER DEFAULT 0,
+            last_content_hash TEXT,
+            last_updated TIMESTAMPTZ DEFAULT NOW(),
+            is_active BOOLEAN DEFAULT TRUE,
+            UNIQUE (embed_type, channel_id)
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS queue_config (
+            queue_line TEXT PRIMARY KEY,
+            channel_id BIGINT,
+            pinned_message_id BIGINT
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS luxury_coins (
+            user_id BIGINT PRIMARY KEY,
+            balance INTEGER DEFAULT 0 NOT NULL
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tiktok_watch_time (
+            id SERIAL PRIMARY KEY,
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            tiktok_account_id INTEGER REFERENCES tiktok_accounts(handle_id) ON DELETE SET NULL,
+            linked_discord_id BIGINT,
+            watch_seconds INTEGER DEFAULT 0 NOT NULL,
+            last_updated TIMESTAMPTZ DEFAULT NOW()
+        );
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_submissions_user_id ON submissions(user_id);',
+        'CREATE INDEX IF NOT EXISTS idx_submissions_queue_line ON submissions(queue_line);',
+        'CREATE INDEX IF NOT EXISTS idx_submissions_played_time ON submissions(played_time);',
+        'CREATE INDEX IF NOT EXISTS idx_submissions_submission_time ON submissions(submission_time);',
+        'CREATE INDEX IF NOT EXISTS idx_tiktok_interactions_session_id ON tiktok_interactions(session_id);',
+        'CREATE INDEX IF NOT EXISTS idx_tiktok_interactions_tiktok_account_id ON tiktok_interactions(tiktok_account_id);',
+        'CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_linked_discord_id ON tiktok_accounts(linked_discord_id);',
+        'CREATE INDEX IF NOT EXISTS idx_tiktok_handles_search ON tiktok_accounts(handle_name text_pattern_ops);',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_submissions_free_queue
+        ON submissions(queue_line, total_score DESC, submission_time ASC)
+        WHERE queue_line = 'Free';
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_tiktok_handles_unlinked
+        ON tiktok_accounts(linked_discord_id)
+        WHERE linked_discord_id IS NULL;
+        ''',
+    )),
+    Migration(2, 'ranking and session indexes', (
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_watch_time_session_id ON tiktok_watch_time(session_id);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_viewer_count_snapshots_session_id ON viewer_count_snapshots(session_id);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_luxury_coins_balance ON luxury_coins(balance DESC);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_points ON user_points(points DESC);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_accounts_points ON tiktok_accounts(points DESC);',
+    ), transactional=False),
+    Migration(3, 'partition tiktok_interactions by month', (
+        'ALTER TABLE tiktok_interactions RENAME TO tiktok_interactions_unpartitioned;',
+        'ALTER INDEX tiktok_interactions_pkey RENAME TO tiktok_interactions_unpartitioned_pkey;',
+        '''
+        CREATE TABLE tiktok_interactions (
+            id BIGINT NOT NULL DEFAULT nextval('tiktok_interactions_id_seq'),
+            session_id INTEGER CONSTRAINT tiktok_interactions_session_id_fkey
+                REFERENCES live_sessions(id) ON DELETE CASCADE,
+            tiktok_account_id INTEGER CONSTRAINT tiktok_interactions_tiktok_account_id_fkey
+                REFERENCES tiktok_accounts(handle_id) ON DELETE SET NULL,
+            interaction_type TEXT NOT NULL,
+            value TEXT,
+            coin_value INTEGER,
+            user_level INTEGER,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        ''',
+        # Re-own the id sequence so it survives dropping the old table
+        'ALTER SEQUENCE tiktok_interactions_id_seq AS BIGINT OWNED BY tiktok_interactions.id;',
+        '''
+        CREATE OR REPLACE FUNCTION create_tiktok_interactions_partition(month DATE) RETURNS TEXT AS $$
+        DECLARE
+            month_start DATE := date_trunc('month', month)::date;
+            partition_name TEXT := 'tiktok_interactions_' || to_char(month_start, 'YYYY_MM');
+        BEGIN
+            -- Partitions cover calendar months in UTC
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF tiktok_interactions FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start::timestamp AT TIME ZONE 'UTC',
+                (month_start + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            RETURN partition_name;
+        EXCEPTION WHEN duplicate_table THEN
+            -- Another process created it between the existence check and CREATE
+            RETURN partition_name;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        SELECT create_tiktok_interactions_partition(month::date)
+        FROM generate_series(
+            date_trunc('month', COALESCE(
+                (SELECT MIN(timestamp) FROM tiktok_interactions_unpartitioned), NOW()
+            ) AT TIME ZONE 'UTC'),
+            date_trunc('month', NOW() AT TIME ZONE 'UTC') + INTERVAL '1 month',
+            INTERVAL '1 month'
+        ) AS month;
+        ''',
+        '''
+        INSERT INTO tiktok_interactions
+            (id, session_id, tiktok_account_id, interaction_type, value, coin_value, user_level, timestamp)
+        SELECT id, session_id, tiktok_account_id, interaction_type, value, coin_value, user_level,
+               COALESCE(timestamp, NOW())
+        FROM tiktok_interactions_unpartitioned;
+        ''',
+        'DROP TABLE tiktok_interactions_unpartitioned;',
+        # session_id leads so per-session lookups (with or without a type) use it
+        'CREATE INDEX idx_tiktok_interactions_session_id ON tiktok_interactions(session_id, interaction_type);',
+        'CREATE INDEX idx_tiktok_interactions_tiktok_account_id ON tiktok_interactions(tiktok_account_id);',
+    )),
+    Migration(4, 'aggregated like counts', (
+        # One 'like' row now covers every like a handle sent during a flush window
+        'ALTER TABLE tiktok_interactions ADD COLUMN like_count INTEGER;',
+        '''
+        UPDATE tiktok_interactions
+        SET like_count = value::integer, value = NULL
+        WHERE interaction_type = 'like' AND value ~ '^[0-9]{1,9}$';
+        ''',
+    )),
+    Migration(5, 'typed interaction payloads', (
+        # A 4-byte enum instead of TEXT; string literals and text parameters still compare
+        # against it. Types already present in old rows are kept so the conversion can't fail.
+        '''
+        DO $$
+        BEGIN
+            EXECUTE format(
+                'CREATE TYPE tiktok_interaction_type AS ENUM (%s)',
+                (
+                    SELECT string_agg(quote_literal(kind), ', ' ORDER BY position, kind)
+                    FROM (
+                        SELECT kind, MIN(position) AS position FROM (
+                            SELECT kind, position FROM unnest(
+                                ARRAY['join', 'like', 'comment', 'share', 'follow', 'gift']
+                            ) WITH ORDINALITY AS known(kind, position)
+                            UNION ALL
+                            SELECT DISTINCT interaction_type, 1000 FROM tiktok_interactions
+                        ) AS kinds
+                        GROUP BY kind
+                    ) AS ordered
+                )
+            );
+        END
+        $$;
+        ''',
+        '''
+        ALTER TABLE tiktok_interactions
+            ALTER COLUMN interaction_type TYPE tiktok_interaction_type
+                USING interaction_type::tiktok_interaction_type,
+            ADD COLUMN gift_id INTEGER,
+            ADD COLUMN repeat_count INTEGER;
+        ''',
+        '''
+        CREATE TABLE tiktok_gifts (
+            gift_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            diamond_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        ''',
+        # Comment text is the bulk of the old value column and is only ever read by id.
+        # No foreign key to the partitioned table, so dropping a month stays a catalog operation.
+        '''
+        CREATE TABLE tiktok_comments (
+            interaction_id BIGINT PRIMARY KEY,
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            timestamp TIMESTAMPTZ NOT NULL,
+            comment TEXT NOT NULL
+        );
+        ''',
+        'CREATE INDEX idx_tiktok_comments_session_id ON tiktok_comments(session_id);',
+        'CREATE INDEX idx_tiktok_comments_timestamp ON tiktok_comments(timestamp);',
+        '''
+        INSERT INTO tiktok_comments (interaction_id, session_id, timestamp, comment)
+        SELECT id, session_id, timestamp, value FROM tiktok_interactions
+        WHERE interaction_type = 'comment' AND value IS NOT NULL;
+        ''',
+        "UPDATE tiktok_interactions SET value = NULL WHERE interaction_type = 'comment' AND value IS NOT NULL;",
+    )),
+    Migration(6, 'session rollups', (
+        '''
+        CREATE TABLE session_stats (
+            session_id INTEGER PRIMARY KEY REFERENCES live_sessions(id) ON DELETE CASCADE,
+            events INTEGER NOT NULL DEFAULT 0,
+            joins INTEGER NOT NULL DEFAULT 0,
+            likes INTEGER NOT NULL DEFAULT 0,
+            comments INTEGER NOT NULL DEFAULT 0,
+            shares INTEGER NOT NULL DEFAULT 0,
+            follows INTEGER NOT NULL DEFAULT 0,
+            gifts INTEGER NOT NULL DEFAULT 0,
+            coins BIGINT NOT NULL DEFAULT 0,
+            unique_handles INTEGER NOT NULL DEFAULT 0,
+            first_event_at TIMESTAMPTZ,
+            last_event_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        ''',
+        '''
+        CREATE TABLE session_handle_stats (
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            handle_name TEXT NOT NULL,
+            likes INTEGER NOT NULL DEFAULT 0,
+            comments INTEGER NOT NULL DEFAULT 0,
+            shares INTEGER NOT NULL DEFAULT 0,
+            follows INTEGER NOT NULL DEFAULT 0,
+            gifts INTEGER NOT NULL DEFAULT 0,
+            coins BIGINT NOT NULL DEFAULT 0,
+            first_seen TIMESTAMPTZ,
+            last_seen TIMESTAMPTZ,
+            PRIMARY KEY (session_id, handle_name)
+        );
+        ''',
+    )),
+    Migration(7, 'viewer count buckets', (
+        '''
+        CREATE TABLE viewer_count_buckets (
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            bucket_start TIMESTAMPTZ NOT NULL,
+            bucket_seconds INTEGER NOT NULL,
+            min_viewers INTEGER NOT NULL,
+            max_viewers INTEGER NOT NULL,
+            avg_viewers REAL NOT NULL,
+            last_viewers INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (session_id, bucket_start)
+        );
+        ''',
+        # Existing raw snapshots become 30 second buckets so old sessions chart the same way
+        '''
+        INSERT INTO viewer_count_buckets
+        (session_id, bucket_start, bucket_seconds, min_viewers, max_viewers, avg_viewers, last_viewers, samples)
+        SELECT
+            session_id,
+            to_timestamp(floor(extract(epoch FROM timestamp) / 30) * 30) AS bucket_start,
+            30,
+            MIN(viewer_count),
+            MAX(viewer_count),
+            AVG(viewer_count),
+            (array_agg(viewer_count ORDER BY timestamp DESC))[1],
+            COUNT(*)
+        FROM viewer_count_snapshots
+        WHERE session_id IS NOT NULL AND timestamp IS NOT NULL
+        GROUP BY session_id, bucket_start;
+        ''',
+    )),
+    # Incremental backups export rows changed since the previous backup and replay deletions
+    Migration(8, 'backup change tracking', (
+        'ALTER TABLE user_points ADD COLUMN updated_at TIMESTAMPTZ DEFAULT NOW();',
+        'ALTER TABLE tiktok_accounts ADD COLUMN updated_at TIMESTAMPTZ DEFAULT NOW();',
+        '''
+        CREATE TABLE backup_deletions (
+            table_name TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            deleted_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+        );
+        ''',
+        # clock_timestamp() rather than NOW() so a delete and re-insert in one transaction stay ordered
+        '''
+        CREATE FUNCTION backup_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        ''',
+        # TG_ARGV[0] names the primary key column recorded for a deleted row
+        '''
+        CREATE FUNCTION backup_record_deletion() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO backup_deletions (table_name, row_key) VALUES (TG_TABLE_NAME, to_jsonb(OLD) ->> TG_ARGV[0]);
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER user_points_touch BEFORE INSERT OR UPDATE ON user_points
+            FOR EACH ROW EXECUTE FUNCTION backup_touch_updated_at();
+        ''',
+        '''
+        CREATE TRIGGER user_points_deletion AFTER DELETE ON user_points
+            FOR EACH ROW EXECUTE FUNCTION backup_record_deletion('user_id');
+        ''',
+        '''
+        CREATE TRIGGER tiktok_accounts_touch BEFORE INSERT OR UPDATE ON tiktok_accounts
+            FOR EACH ROW EXECUTE FUNCTION backup_touch_updated_at();
+        ''',
+        '''
+        CREATE TRIGGER tiktok_accounts_deletion AFTER DELETE ON tiktok_accounts
+            FOR EACH ROW EXECUTE FUNCTION backup_record_deletion('handle_id');
+        ''',
+    )),
+    Migration(9, 'backup change tracking indexes', (
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_points_updated_at ON user_points(updated_at);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_accounts_updated_at ON tiktok_accounts(updated_at);',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_backup_deletions_deleted_at ON backup_deletions(deleted_at);',
+    ), transactional=False),
+    # Spooled gifts are redelivered after a crash; a gift's first spool seq is claimed in the
+    # transaction that credits it, so a replay never credits it twice
+    Migration(10, 'spool replay dedupe', (
+        '''
+        CREATE TABLE tiktok_spool_applied (
+            session_id INTEGER REFERENCES live_sessions(id) ON DELETE CASCADE,
+            seq BIGINT NOT NULL,
+            applied_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (session_id, seq)
+        );
+        ''',
+    )),
+    # The hot account upserts bump last_seen/last_known_level on every join, like and comment
+    # batch; only a change to what a backup restores may mark the row for the next delta
+    Migration(11, 'backup tracks account points changes only', (
+        'DROP TRIGGER tiktok_accounts_touch ON tiktok_accounts;',
+        '''
+        CREATE TRIGGER tiktok_accounts_touch_insert BEFORE INSERT ON tiktok_accounts
+            FOR EACH ROW EXECUTE FUNCTION backup_touch_updated_at();
+        ''',
+        '''
+        CREATE TRIGGER tiktok_accounts_touch_update BEFORE UPDATE ON tiktok_accounts
+            FOR EACH ROW
+            WHEN (OLD.points IS DISTINCT FROM NEW.points OR OLD.linked_discord_id IS DISTINCT FROM NEW.linked_discord_id)
+            EXECUTE FUNCTION backup_touch_updated_at();
+        ''',
+    )),
+]
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+
+async def _applied_versions(conn):
+    rows = await conn.fetch('SELECT version FROM schema_version')
+    return {row['version'] for row in rows}
+
+
+async def _index_valid(conn, index: str):
+    """True/False for an existing index's validity, None if there is no such index."""
+    return await conn.fetchval('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)', index)
+
+
+async def _apply(conn, migration: Migration):
+    if migration.transactional:
+        async with conn.transaction():
+            for statement in migration.statements:
+                await conn.execute(statement)
+            await conn.execute(
+                'INSERT INTO schema_version (version, name) VALUES ($1, $2)',
+                migration.version, migration.name
+            )
+        return
+
+    for statement in migration.statements:
+        match = _CONCURRENT_INDEX.search(statement)
+        if match is None:
+            await conn.execute(statement)
+            continue
+        index = match.group(1)
+        # A cancelled or failed concurrent build leaves an INVALID index under this name,
+        # which IF NOT EXISTS would otherwise skip for good
+        if await _index_valid(conn, index) is False:
+            logger.warning(f"Dropping invalid index {index} left by an interrupted build")
+            await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index}')
+        await conn.execute(statement)
+        if not await _index_valid(conn, index):
+            raise RuntimeError(f"Index {index} from migration {migration.version} is not valid after building")
+    await conn.execute(
+        'INSERT INTO schema_version (version, name) VALUES ($1, $2) ON CONFLICT (version) DO NOTHING',
+        migration.version, migration.name
+    )
+
+
+async def run_migrations(pool) -> int:
+    """Apply pending migrations in version order and return how many ran."""
+    async with pool.acquire() as conn:
+        await conn.execute(SCHEMA_VERSION_TABLE)
+
+        if max(await _applied_versions(conn), default=0) >= LATEST_VERSION:
+            logger.info(f"Database schema up to date (version {LATEST_VERSION})")
+            return 0
+
+        await conn.execute('SELECT pg_advisory_lock($1)', MIGRATION_LOCK_ID)
+        try:
+            # Re-read under the lock in case another process migrated meanwhile
+            applied = await _applied_versions(conn)
+            pending = sorted(
+                (m for m in MIGRATIONS if m.version not in applied),
+                key=lambda m: m.version
+            )
+
+            for migration in pending:
+                logger.info(f"Applying migration {migration.version}: {migration.name}")
+                await _apply(conn, migration)
+
+            logger.info(f"Database schema migrated to version {LATEST_VERSION} ({len(pending)} applied)")
+            return len(pending)
+        finally:
+            await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_ID)
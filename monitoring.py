@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_SAMPLE_INTERVAL = float(os.getenv('LOOP_SAMPLE_INTERVAL', '0.25'))
+LOOP_BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', '0.5'))
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = os.getenv('LOG_FILE')
+LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_BYTES', str(5 * 1024 * 1024)))
+
+loop_lag = registry.histogram('event_loop_lag_seconds', 'How late the event loop ran a scheduled wakeup')
+loop_blocked = registry.counter('event_loop_blocked_total', 'Loop stalls longer than the block threshold')
+
+
+def handler_histogram(name: str):
+    return registry.histogram(
+        'event_handler_seconds', 'Wall time spent in an event handler', labels={'handler': name}
+    )
+
+
+def timed_handler(name: str):
+    """Record the wall time of an async event handler under event_handler_seconds."""
+    def decorator(func):
+        histogram = handler_histogram(name)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class LoopMonitor:
+    """Samples event-loop lag and logs the stack of whatever blocks the loop.
+
+    A coroutine on the loop wakes every interval and stamps a heartbeat; how late
+    it wakes is the loop lag. A watchdog thread checks the heartbeat, and when the
+    loop has not ticked for longer than the block threshold it logs the loop
+    thread's current stack, which is the code holding the loop at that moment.
+    """
+
+    def __init__(self, interval: float = LOOP_SAMPLE_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(loop.time() - scheduled, 0.0))
+            self._heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopping.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # Report each stall once, with the stack as it is while still blocked
+            reported_heartbeat = heartbeat
+            loop_blocked.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else 'unavailable'
+            logger.warning(f"Event loop blocked for {stalled:.2f}s; loop thread stack:\n{stack}")
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they were logged, leaving %-formatting to the listener's handlers.
+
+    QueueHandler.prepare() renders the message and traceback on the logging thread, so
+    records can be pickled to another process. These records stay in-process, so that
+    work moves to the listener thread too. Arguments must not be mutated once logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(level: int = logging.INFO, fmt: str = LOG_FORMAT) -> logging.handlers.QueueListener:
+    """Send log records through a queue so formatting and handler I/O happen on the listener's thread.
+
+    The caller owns the returned listener and must stop() it on shutdown to flush what is queued.
+    """
+    formatter = logging.Formatter(fmt)
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=3, encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
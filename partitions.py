@@ -0,0 +1,75 @@
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Months of tiktok_interactions to keep, counting the current month; 0 keeps everything
+INTERACTION_RETENTION_MONTHS = int(os.getenv('TIKTOK_INTERACTION_RETENTION_MONTHS', '0'))
+
+PARTITION_NAME = re.compile(r'^tiktok_interactions_(\d{4})_(\d{2})$')
+
+
+def _month_start(value: date, months_back: int = 0) -> date:
+    month_index = value.year * 12 + value.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+async def ensure_interaction_partitions(months_ahead: int = 1):
+    """Create the current month's partition and the next `months_ahead` ones if missing."""
+    await db.execute('''
+        SELECT create_tiktok_interactions_partition(month::date)
+        FROM generate_series(
+            date_trunc('month', NOW() AT TIME ZONE 'UTC'),
+            date_trunc('month', NOW() AT TIME ZONE 'UTC') + $1 * INTERVAL '1 month',
+            INTERVAL '1 month'
+        ) AS month
+    ''', months_ahead)
+
+
+async def interaction_partitions() -> List[Tuple[str, date]]:
+    """Return (partition name, first day of its month) for each monthly partition, oldest first."""
+    rows = await db.fetch('''
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'tiktok_interactions'::regclass
+    ''')
+
+    partitions = []
+    for row in rows:
+        match = PARTITION_NAME.match(row['relname'])
+        if match:
+            partitions.append((row['relname'], date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def drop_expired_interaction_partitions(keep_months: int = INTERACTION_RETENTION_MONTHS,
+                                              today: Optional[date] = None) -> List[str]:
+    """Drop whole monthly partitions older than the retention window.
+
+    Dropping a partition is a catalog operation, unlike a DELETE over millions
+    of rows, so it neither bloats the table nor holds long locks.
+    """
+    if keep_months <= 0:
+        return []
+
+    cutoff = _month_start(today or datetime.now(timezone.utc).date(), keep_months - 1)
+    dropped = []
+    for name, month in await interaction_partitions():
+        if month >= cutoff:
+            break
+        await db.execute(f'DROP TABLE IF EXISTS "{name}"')
+        dropped.append(name)
+        logger.info(f"Dropped interaction partition {name} (retention {keep_months} months)")
+
+    if dropped:
+        # Comment text sits outside the partitions; expire it with the rows it belonged to
+        await db.execute(
+            'DELETE FROM tiktok_comments WHERE timestamp < $1',
+            datetime(cutoff.year, cutoff.month, 1, tzinfo=timezone.utc)
+        )
+    return dropped
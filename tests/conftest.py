@@ -0,0 +1,35 @@
+import pytest
+import discord
+from discord.ext import commands
+from database import db
+from cogs.tiktok_integration import TikTokIntegration
+
+
+@pytest.fixture
+def cleanup_sql():
+    """Statements run once the cog is unloaded; test modules override this to remove their rows."""
+    return []
+
+
+@pytest.fixture
+async def tiktok_cog(cleanup_sql):
+    await db.connect()
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.default())
+    cog = TikTokIntegration(bot)
+    yield cog
+    # Unloading ends every stream's session and writes everything still buffered
+    await cog.cog_unload()
+    for sql in cleanup_sql:
+        await db.execute(sql)
+    await db.disconnect()
+
+
+@pytest.fixture
+async def tiktok_stream(tiktok_cog, request):
+    """A connected stream on tiktok_cog, named after the test module unless parametrized indirectly."""
+    username = getattr(request, 'param', request.module.__name__.rsplit('.', 1)[-1].removeprefix('test_'))
+    stream = tiktok_cog.add_stream(username)
+    await stream.handle_connect(None)
+    yield stream
+    await stream.end_active_session()
+    await db.execute('DELETE FROM live_sessions WHERE tiktok_username = $1', stream.username)
@@ -0,0 +1,154 @@
+import asyncio
+import csv
+import gzip
+import os
+import pytest
+from datetime import timedelta
+from backup import RestorePlan, backup_sets, export_query, plan_restore, restore_points, rotate, run_backup
+from database import UPSERT_TIKTOK_ACCOUNT, db
+
+
+@pytest.fixture
+async def database():
+    await db.connect()
+    yield db
+    await db.execute("DELETE FROM tiktok_accounts WHERE handle_name LIKE 'backup_fan%'")
+    await db.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_export_streams_rows_into_gzip_csv(database, tmp_path):
+    await db.execute('''
+        INSERT INTO tiktok_accounts (handle_name, points)
+        SELECT 'backup_fan' || n, n FROM generate_series(1, 2000) AS n
+    ''')
+    path = str(tmp_path / 'accounts.csv.gz')
+    # A tiny chunk size forces many compressed writes
+    rows = await export_query('''
+        SELECT handle_name, points FROM tiktok_accounts
+        WHERE handle_name LIKE $1 ORDER BY points
+    ''', path, 'backup_fan%', chunk_bytes=4096)
+    assert rows == 2000
+    assert not os.path.exists(path + '.partial')
+
+    exported = read_csv(path)
+    assert len(exported) == 2000
+    assert exported[-1] == {'handle_name': 'backup_fan2000', 'points': '2000'}
+
+
+def read_csv(path):
+    with gzip.open(path, 'rt', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+TEST_USERS = {str(user_id) for user_id in range(990001, 990010)}
+
+
+def touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b'')
+
+
+def test_rotation_keeps_the_newest_full_sets_and_their_deltas(tmp_path):
+    touch(
+        tmp_path,
+        # Files left by the JSON backups are rotated out too
+        'user_points_20200101_000000.json',
+        'user_points_20300101_000000.csv.gz', 'tiktok_accounts_20300101_000000.csv.gz',
+        'user_points_20300101_010000.delta.csv.gz', 'backup_deletions_20300101_010000.delta.csv.gz',
+        'user_points_20300102_000000.csv.gz',
+        'user_points_20300102_010000.delta.csv.gz',
+        'user_points_20300103_000000.csv.gz',
+        'notes.txt',
+    )
+    removed = rotate(str(tmp_path), keep_full=2)
+    assert len(removed) == 5
+    assert sorted(os.listdir(tmp_path)) == [
+        'notes.txt',
+        'user_points_20300102_000000.csv.gz',
+        'user_points_20300102_010000.delta.csv.gz',
+        'user_points_20300103_000000.csv.gz',
+    ]
+
+
+@pytest.fixture
+async def points(database):
+    yield database
+    await db.execute('DELETE FROM user_points WHERE user_id BETWEEN 990001 AND 990009')
+
+
+async def points_state():
+    users = await db.fetch('SELECT user_id, points FROM user_points WHERE user_id BETWEEN 990001 AND 990009')
+    handles = await db.fetch("SELECT handle_name, points FROM tiktok_accounts WHERE handle_name LIKE 'backup_fan%'")
+    return dict(sorted(map(tuple, users))), dict(sorted(map(tuple, handles)))
+
+
+@pytest.mark.asyncio
+async def test_deltas_hold_changed_rows_and_restore_any_point(points, tmp_path, monkeypatch):
+    # Without the overlap window a delta starts exactly at the previous set's (whole second) stamp
+    monkeypatch.setattr('backup.BACKUP_OVERLAP_SECONDS', 0)
+    directory = str(tmp_path)
+    await db.execute('INSERT INTO user_points (user_id, points) VALUES (990001, 10), (990002, 20), (990004, 40)')
+    await db.execute("INSERT INTO tiktok_accounts (handle_name, points) VALUES ('backup_fan_a', 5), ('backup_fan_b', 7)")
+    await asyncio.sleep(1.1)
+    [first, _] = await run_backup(directory)
+    assert first.path.endswith('.csv.gz') and not first.path.endswith('.delta.csv.gz')
+    after_full = await points_state()
+    await asyncio.sleep(1.1)
+
+    await db.execute('UPDATE user_points SET points = 15 WHERE user_id = 990001')
+    await db.execute('DELETE FROM user_points WHERE user_id = 990002')
+    await db.execute("UPDATE tiktok_accounts SET points = 9 WHERE handle_name = 'backup_fan_a'")
+    midpoint = await db.fetchval('SELECT clock_timestamp()')
+    after_changes = await points_state()
+    await db.execute('INSERT INTO user_points (user_id, points) VALUES (990003, 30)')
+    await db.execute("INSERT INTO tiktok_accounts (handle_name, points) VALUES ('backup_fan_c', 3)")
+    await db.execute("DELETE FROM tiktok_accounts WHERE handle_name = 'backup_fan_b'")
+
+    delta = {backup.table: backup for backup in await run_backup(directory)}
+    assert delta['user_points'].path.endswith('.delta.csv.gz')
+    # Only the churn is exported: 990004 never changed after the full backup
+    assert {row['user_id'] for row in read_csv(delta['user_points'].path)} & TEST_USERS == {'990001', '990003'}
+    assert ('user_points', '990002') in {
+        (row['table_name'], row['row_key']) for row in read_csv(delta['backup_deletions'].path)
+    }
+    after_delta = await points_state()
+
+    await db.execute('UPDATE user_points SET points = 0 WHERE user_id BETWEEN 990001 AND 990009')
+    await db.execute("UPDATE tiktok_accounts SET points = 0 WHERE handle_name LIKE 'backup_fan%'")
+
+    [full, latest] = backup_sets(directory)
+    result = await restore_points(latest.taken_at + timedelta(seconds=1), directory)
+    assert result.plan == RestorePlan(full, [latest])
+    assert await points_state() == after_delta
+
+    # Between the two backups: the delta's rows changed by then apply, later ones do not
+    await restore_points(midpoint, directory)
+    users, handles = await points_state()
+    assert users == after_changes[0]
+    # backup_fan_b was deleted after the midpoint, so it is recreated with its points
+    assert handles == {**after_changes[1], 'backup_fan_c': 0}
+
+    await restore_points(full.taken_at, directory)
+    assert (await points_state())[0] == after_full[0]
+
+    with pytest.raises(ValueError):
+        plan_restore(full.taken_at - timedelta(days=1), directory)
+
+
+@pytest.mark.asyncio
+async def test_seen_only_upserts_stay_out_of_deltas(database, tmp_path, monkeypatch):
+    monkeypatch.setattr('backup.BACKUP_OVERLAP_SECONDS', 0)
+    directory = str(tmp_path)
+    await db.execute("INSERT INTO tiktok_accounts (handle_name, points) VALUES ('backup_fan_seen', 5), ('backup_fan_paid', 5)")
+    await asyncio.sleep(1.1)
+    await run_backup(directory)
+    await asyncio.sleep(1.1)
+
+    # What every join, like and comment batch does to a returning viewer
+    await db.fetchval(UPSERT_TIKTOK_ACCOUNT, 'backup_fan_seen', 12)
+    await db.execute("UPDATE tiktok_accounts SET points = points + 10 WHERE handle_name = 'backup_fan_paid'")
+
+    delta = {backup.table: backup for backup in await run_backup(directory)}
+    handles = {row['handle_name'] for row in read_csv(delta['tiktok_accounts'].path)}
+    assert {'backup_fan_seen', 'backup_fan_paid'} & handles == {'backup_fan_paid'}
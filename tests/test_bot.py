@@ -74,3 +74,39 @@ async def test_luxury_coins_balance(setup_database):
     assert balance == 500
     
     await db.execute('DELETE FROM luxury_coins WHERE user_id = $1', user_id)
+
+
+@pytest.mark.asyncio
+async def test_account_upsert_prepared_query(setup_database):
+    from database import UPSERT_TIKTOK_ACCOUNT
+
+    first_id = await db.fetchval(UPSERT_TIKTOK_ACCOUNT, 'test_upsert_handle', 3)
+    second_id = await db.fetchval(UPSERT_TIKTOK_ACCOUNT, 'test_upsert_handle', 7)
+
+    assert first_id == second_id
+
+    level = await db.fetchval(
+        'SELECT last_known_level FROM tiktok_accounts WHERE handle_id = $1',
+        first_id
+    )
+
+    assert level == 7
+
+    await db.execute('DELETE FROM tiktok_accounts WHERE handle_id = $1', first_id)
+
+
+@pytest.mark.asyncio
+async def test_timeout_covers_pool_wait_and_query(setup_database):
+    held = [await db.pool.acquire() for _ in range(db.pool.get_max_size())]
+
+    async def release_later():
+        await asyncio.sleep(0.3)
+        for conn in held:
+            await db.pool.release(conn)
+
+    releaser = asyncio.create_task(release_later())
+    # Each part fits in the budget on its own; together they do not
+    with pytest.raises(asyncio.TimeoutError):
+        await db.fetchval('SELECT pg_sleep(0.3)', timeout=0.5)
+    await releaser
+    assert await db.fetchval('SELECT 1', timeout=0.5) == 1
@@ -0,0 +1,74 @@
+import logging
+import logging.handlers
+import threading
+from ingest.eventlog import EventLog, LazyVars, parse_level
+from ingest.events import TikTokEvent
+from monitoring import configure_logging
+
+
+class Exploding:
+    @property
+    def __dict__(self):
+        raise AssertionError('event was formatted')
+
+
+def test_disabled_level_formats_nothing(caplog):
+    log = EventLog('tiktok.events.test_disabled', level=logging.DEBUG)
+    with caplog.at_level(logging.INFO, logger='tiktok.events.test_disabled'):
+        log.log('like', 'like %s', LazyVars(Exploding()))
+    assert not caplog.records
+    assert not log.skipped
+
+
+def test_rate_limit_and_sampling_per_kind(caplog):
+    log = EventLog('tiktok.events.test_rate', level=logging.INFO, rate=2)
+    with caplog.at_level(logging.INFO, logger='tiktok.events.test_rate'):
+        for n in range(50):
+            log.event('streamer', TikTokEvent('like', f'fan{n}', count=n))
+        log.event('streamer', TikTokEvent('comment', 'fan', text='hi'))
+    # Two lines of burst for likes; other kinds have their own budget
+    assert [record.event_kind for record in caplog.records] == ['like', 'like', 'comment']
+    assert log.skipped == {'like': 48}
+
+    log._buckets['like'][0] = 1
+    with caplog.at_level(logging.INFO, logger='tiktok.events.test_rate'):
+        log.event('streamer', TikTokEvent('like', 'late'))
+    assert caplog.records[-1].getMessage().endswith('(48 more like events not logged)')
+    assert not log.skipped
+
+    sampled = EventLog('tiktok.events.test_sample', level=logging.INFO, sample=0.5, rate=100, rng=iter([0.9, 0.1]).__next__)
+    with caplog.at_level(logging.INFO, logger='tiktok.events.test_sample'):
+        sampled.log('join', 'first')
+        sampled.log('join', 'second')
+    assert caplog.records[-1].getMessage() == 'second (1 more join events not logged)'
+
+
+def test_configure_logging_hands_records_to_a_listener_thread():
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    listener = configure_logging(logging.INFO)
+    rendered = []
+
+    class Probe:
+        def __repr__(self):
+            rendered.append(threading.get_ident())
+            return 'probe'
+
+    try:
+        [handler] = root.handlers
+        assert isinstance(handler, logging.handlers.QueueHandler)
+        assert listener._thread is not None
+        logging.getLogger('tiktok.events.test_queue').warning('%r', Probe())
+    finally:
+        listener.stop()
+        root.handlers[:] = saved[0]
+        root.setLevel(saved[1])
+    # The message was formatted by the listener thread, not the thread that logged it
+    assert rendered and threading.get_ident() not in rendered
+
+
+def test_parse_level_falls_back_for_unknown_names():
+    assert parse_level('info') == logging.INFO
+    assert parse_level(' warning ') == logging.WARNING
+    assert parse_level('15') == 15
+    assert parse_level('verbose') == logging.DEBUG
@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+import discord
+from discord.ext import commands
+from database import db
+from ingest.events import TikTokEvent
+from benchmarks.fake_discord import FakeDiscord
+
+
+@pytest.fixture
+async def fake_bot():
+    await db.connect()
+    fake = FakeDiscord()
+    await fake.start()
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.default())
+    await fake.login(bot)
+    yield fake, bot
+    await bot.close()
+    await fake.stop()
+    await db.execute("DELETE FROM bot_config WHERE key = 'submission_channel'")
+    await db.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_link_message_creates_submission(fake_bot):
+    fake, bot = fake_bot
+    await bot.load_extension('cogs.submissions')
+    channel = fake.add_text_channel(bot, 'submissions')
+    await db.execute('''
+        INSERT INTO bot_config (key, channel_id) VALUES ('submission_channel', $1)
+        ON CONFLICT (key) DO UPDATE SET channel_id = $1
+    ''', channel.id)
+
+    author = fake.user('fake_fan')
+    message = fake.message(bot, channel, author=author, content='listen https://soundcloud.com/a/b')
+    await bot.get_cog('Submissions').on_message(message)
+
+    row = await db.fetchrow('SELECT * FROM submissions WHERE user_id = $1', int(author['id']))
+    assert row['link_or_file'] == 'https://soundcloud.com/a/b'
+    assert fake.calls['POST /users/@me/channels'] == 1
+    assert fake.calls['DELETE /channels/{channel_id}/messages/{message_id}'] == 1
+    assert message.id not in fake.messages[channel.id]
+
+    await db.execute('DELETE FROM submissions WHERE id = $1', row['id'])
+
+
+@pytest.mark.asyncio
+async def test_refresh_skips_unchanged_embeds_and_recreates_deleted(fake_bot):
+    fake, bot = fake_bot
+    await bot.load_extension('cogs.persistent_embeds')
+    await bot.load_extension('cogs.admin')
+    bot.get_cog('PersistentEmbeds').cog_unload()
+    channel = fake.add_text_channel(bot, 'live-queue')
+    await fake.invoke(bot, 'setup-live-queue', {'channel': channel})
+
+    cog = bot.get_cog('PersistentEmbeds')
+    try:
+        fake.reset_stats()
+        await cog.refresh_embeds()
+        await cog.refresh_embeds()
+        assert fake.calls == {'PATCH /channels/{channel_id}/messages/{message_id}': 1}
+
+        fake.messages[channel.id].clear()
+        await db.execute("UPDATE persistent_embeds SET last_content_hash = NULL WHERE channel_id = $1", channel.id)
+        await cog.refresh_embeds()
+        assert len(fake.messages[channel.id]) == 1
+    finally:
+        await db.execute('DELETE FROM persistent_embeds WHERE channel_id = $1', channel.id)
+
+
+@pytest.mark.asyncio
+async def test_queue_reports_a_busy_database(fake_bot, monkeypatch):
+    fake, bot = fake_bot
+    await bot.load_extension('cogs.queue')
+    fake.add_text_channel(bot, 'queue')
+
+    async def timed_out(*args, **kwargs):
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(db, 'fetch', timed_out)
+    fake.reset_stats()
+    await fake.invoke(bot, 'queue')
+    # Deferred, then a follow-up instead of leaving the interaction thinking
+    assert fake.calls['POST /webhooks/{webhook_id}/{webhook_token}'] == 1
+
+
+@pytest.mark.asyncio
+async def test_post_live_metrics_summarises_session(fake_bot):
+    fake, bot = fake_bot
+    await bot.load_extension('cogs.admin')
+    await bot.load_extension('cogs.tiktok_integration')
+    channel = fake.add_text_channel(bot, 'metrics')
+    await fake.invoke(bot, 'set-metrics-channel', {'channel': channel})
+
+    tiktok = bot.get_cog('TikTokIntegration').add_stream('metrics_test')
+    await tiktok.handle_connect(None)
+    session_id = tiktok.session_id
+    other = bot.get_cog('TikTokIntegration').add_stream('metrics_other')
+    await other.handle_connect(None)
+    try:
+        for diamonds in (100, 50):
+            await tiktok.handle_gift(TikTokEvent('gift', 'metrics_fan', 1, 1, diamonds, gift_id=990002, text='Metrics Gift'))
+        await tiktok.handle_like(TikTokEvent('like', 'metrics_fan', 1, 40))
+        for viewers in (10, 30):
+            await tiktok.handle_viewer_count(TikTokEvent('viewer_count', count=viewers))
+
+        # With two streams connected the command has to be told which one to end
+        await fake.invoke(bot, 'post-live-metrics')
+        assert not fake.messages[channel.id]
+        assert tiktok.active_session_id and other.active_session_id
+
+        await fake.invoke(bot, 'post-live-metrics', {'username': 'metrics_test'})
+        assert other.active_session_id
+
+        [message] = fake.messages[channel.id].values()
+        fields = {field['name']: field['value'] for field in message['embeds'][0]['fields']}
+        assert message['embeds'][0]['title'] == '📊 Live Session Metrics - @metrics_test'
+        assert fields['Total Interactions'] == '3'
+        assert fields['Total Gifts'] == '2'
+        assert fields['Total Coins'] == '150'
+        assert fields['Total Likes'] == '40'
+        assert fields['Avg Viewers'] == '20'
+        assert fields['Peak Viewers'] == '30'
+    finally:
+        await other.end_active_session()
+        await db.execute("DELETE FROM live_sessions WHERE id = ANY($1::int[])", [session_id, other.session_id])
+        await db.execute("DELETE FROM bot_config WHERE key = 'metrics_channel'")
+        await db.execute("DELETE FROM tiktok_accounts WHERE handle_name = 'metrics_fan'")
+        await db.execute('DELETE FROM tiktok_gifts WHERE gift_id = 990002')
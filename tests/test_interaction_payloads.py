@@ -0,0 +1,34 @@
+import pytest
+from database import db
+from ingest.events import TikTokEvent
+
+
+@pytest.fixture
+def cleanup_sql():
+    return [
+        "DELETE FROM tiktok_accounts WHERE handle_name = 'payload_fan'",
+        'DELETE FROM tiktok_gifts WHERE gift_id = 990001',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_gift_and_comment_use_typed_columns(tiktok_stream):
+    await tiktok_stream.handle_gift(TikTokEvent('gift', 'payload_fan', 7, 3, 1, gift_id=990001, text='Test Rose'))
+    await tiktok_stream.handle_comment(TikTokEvent('comment', 'payload_fan', 7, text='great song'))
+    await tiktok_stream.writer.flush()
+
+    gift_row = await db.fetchrow(
+        "SELECT * FROM tiktok_interactions WHERE session_id = $1 AND interaction_type = 'gift'",
+        tiktok_stream.session_id
+    )
+    assert (gift_row['gift_id'], gift_row['repeat_count'], gift_row['coin_value']) == (990001, 3, 3)
+    assert gift_row['value'] is None
+    assert await db.fetchval('SELECT name FROM tiktok_gifts WHERE gift_id = 990001') == 'Test Rose'
+
+    comment = await db.fetchrow('''
+        SELECT i.value, c.comment FROM tiktok_interactions i
+        JOIN tiktok_comments c ON c.interaction_id = i.id
+        WHERE i.session_id = $1 AND i.interaction_type = $2
+    ''', tiktok_stream.session_id, 'comment')
+    assert comment['comment'] == 'great song'
+    assert comment['value'] is None
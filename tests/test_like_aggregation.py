@@ -0,0 +1,32 @@
+import pytest
+from database import db
+from ingest.events import TikTokEvent
+
+
+@pytest.fixture
+def cleanup_sql():
+    return ["DELETE FROM tiktok_accounts WHERE handle_name LIKE 'like_fan_%'"]
+
+
+def like(handle, count, level=3):
+    return TikTokEvent('like', handle, level, count)
+
+
+@pytest.mark.asyncio
+async def test_likes_are_written_once_per_handle(tiktok_stream):
+    for _ in range(20):
+        await tiktok_stream.handle_like(like('like_fan_a', 5))
+    await tiktok_stream.handle_like(like('like_fan_b', 1, level=9))
+    await tiktok_stream.end_active_session()
+
+    rows = await db.fetch('''
+        SELECT a.handle_name, i.like_count, i.user_level, i.value
+        FROM tiktok_interactions i JOIN tiktok_accounts a ON a.handle_id = i.tiktok_account_id
+        WHERE i.session_id = $1 AND i.interaction_type = 'like'
+        ORDER BY a.handle_name
+    ''', tiktok_stream.session_id)
+    assert [(row['handle_name'], row['like_count'], row['user_level']) for row in rows] == [
+        ('like_fan_a', 100, 3),
+        ('like_fan_b', 1, 9),
+    ]
+    assert all(row['value'] is None for row in rows)
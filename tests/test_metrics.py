@@ -0,0 +1,13 @@
+from metrics import MetricsRegistry
+
+
+def test_label_values_are_escaped_when_rendered():
+    registry = MetricsRegistry()
+    query = 'SELECT "queue_line" FROM submissions WHERE link LIKE \'%\\%\'\nLIMIT ?'
+    registry.counter('db_calls_total', 'Calls', labels={'query': query}).inc()
+
+    [sample] = [line for line in registry.render().splitlines() if line.startswith('db_calls_total{')]
+    assert sample == (
+        'db_calls_total{query="SELECT \\"queue_line\\" FROM submissions '
+        'WHERE link LIKE \'%\\\\%\'\\nLIMIT ?"} 1'
+    )
@@ -0,0 +1,47 @@
+import pytest
+from database import db
+from migrations import LATEST_VERSION, MIGRATIONS, Migration, _apply, _index_valid, run_migrations
+
+
+@pytest.fixture
+async def setup_database():
+    await db.connect()
+    yield
+    await db.disconnect()
+
+
+def test_migration_versions_are_unique():
+    versions = [m.version for m in MIGRATIONS]
+    assert len(versions) == len(set(versions))
+
+
+@pytest.mark.asyncio
+async def test_schema_is_at_latest_version(setup_database):
+    version = await db.fetchval('SELECT MAX(version) FROM schema_version')
+    assert version == LATEST_VERSION
+
+
+@pytest.mark.asyncio
+async def test_rerun_is_noop(setup_database):
+    applied = await run_migrations(db.pool)
+    assert applied == 0
+
+
+@pytest.mark.asyncio
+async def test_invalid_index_from_an_interrupted_build_is_rebuilt(setup_database):
+    await db.execute('CREATE TABLE migration_index_test (v INTEGER)')
+    try:
+        await db.execute('INSERT INTO migration_index_test VALUES (1), (1)')
+        # A failed concurrent build leaves the index behind, marked invalid
+        with pytest.raises(Exception):
+            await db.execute('CREATE UNIQUE INDEX CONCURRENTLY idx_migration_index_test ON migration_index_test(v)')
+        async with db.acquire() as conn:
+            assert await _index_valid(conn, 'idx_migration_index_test') is False
+
+            await _apply(conn, Migration(990001, 'index retry test', (
+                'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_migration_index_test ON migration_index_test(v);',
+            ), transactional=False))
+            assert await _index_valid(conn, 'idx_migration_index_test') is True
+    finally:
+        await db.execute('DROP TABLE migration_index_test')
+        await db.execute('DELETE FROM schema_version WHERE version = 990001')
@@ -0,0 +1,72 @@
+import json
+import pytest
+from datetime import date, datetime, timezone
+from database import db
+from partitions import drop_expired_interaction_partitions, ensure_interaction_partitions, interaction_partitions
+
+
+@pytest.fixture
+async def setup_database():
+    await db.connect()
+    yield
+    await db.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_current_and_next_month_partitions_exist(setup_database):
+    await ensure_interaction_partitions()
+
+    months = [month for _, month in await interaction_partitions()]
+    today = datetime.now(timezone.utc).date()
+    this_month = today.replace(day=1)
+    next_month = date(today.year + today.month // 12, today.month % 12 + 1, 1)
+    assert this_month in months
+    assert next_month in months
+
+
+@pytest.mark.asyncio
+async def test_session_query_prunes_to_one_partition(setup_database):
+    await ensure_interaction_partitions()
+    session = await db.fetchrow(
+        "INSERT INTO live_sessions (tiktok_username) VALUES ('partition_test') RETURNING id, started_at"
+    )
+    try:
+        explain = await db.fetchval('''
+            EXPLAIN (FORMAT JSON)
+            SELECT COALESCE(SUM(coin_value), 0) FROM tiktok_interactions
+            WHERE session_id = $1 AND interaction_type = 'gift' AND timestamp >= $2
+        ''', session['id'], session['started_at'])
+
+        def relations(plan):
+            found = {plan['Relation Name']} if 'Relation Name' in plan else set()
+            for child in plan.get('Plans', []):
+                found |= relations(child)
+            return found
+
+        # At most this month and next month can hold rows newer than the session start
+        scanned = relations(json.loads(explain)[0]['Plan'])
+        assert 1 <= len(scanned) <= 2
+    finally:
+        await db.execute('DELETE FROM live_sessions WHERE id = $1', session['id'])
+
+
+@pytest.mark.asyncio
+async def test_retention_drops_whole_partitions(setup_database):
+    await db.execute("SELECT create_tiktok_interactions_partition('2001-01-01')")
+    await db.execute("SELECT create_tiktok_interactions_partition('2001-02-01')")
+    await db.execute('''
+        INSERT INTO tiktok_interactions (interaction_type, timestamp)
+        VALUES ('like', '2001-01-15T12:00:00Z'), ('like', '2001-02-15T12:00:00Z')
+    ''')
+
+    try:
+        dropped = await drop_expired_interaction_partitions(keep_months=2, today=date(2001, 3, 10))
+        assert dropped == ['tiktok_interactions_2001_01']
+
+        remaining = await db.fetchval(
+            "SELECT COUNT(*) FROM tiktok_interactions WHERE timestamp < '2001-03-01T00:00:00Z'"
+        )
+        assert remaining == 1
+    finally:
+        await db.execute('DROP TABLE IF EXISTS tiktok_interactions_2001_01')
+        await db.execute('DROP TABLE IF EXISTS tiktok_interactions_2001_02')
@@ -0,0 +1,121 @@
+import json
+import pytest
+from database import db
+
+SEED_ROWS = 20000
+SEED_SESSIONS = 200
+
+# Hot queries that must stay on an index once the tables hold realistic volumes.
+# Each entry is (description, table that must not be seq-scanned, query).
+HOT_QUERIES = [
+    (
+        'coins leaderboard',
+        'luxury_coins',
+        'SELECT user_id, balance FROM luxury_coins ORDER BY balance DESC LIMIT 10',
+    ),
+    (
+        'user points backup',
+        'user_points',
+        'SELECT user_id, points FROM user_points WHERE points > 0',
+    ),
+    (
+        'tiktok points backup',
+        'tiktok_accounts',
+        'SELECT handle_name, points, linked_discord_id FROM tiktok_accounts WHERE points > 0',
+    ),
+    (
+        'tiktok points ranking',
+        'tiktok_accounts',
+        'SELECT handle_name, points FROM tiktok_accounts ORDER BY points DESC LIMIT 10',
+    ),
+    (
+        'watch time per session',
+        'tiktok_watch_time',
+        'SELECT * FROM tiktok_watch_time WHERE session_id = {session_id}',
+    ),
+    (
+        'viewer stats per session',
+        'viewer_count_snapshots',
+        'SELECT AVG(viewer_count), MAX(viewer_count) FROM viewer_count_snapshots WHERE session_id = {session_id}',
+    ),
+]
+
+
+@pytest.fixture
+async def setup_database():
+    await db.connect()
+    yield
+    await db.disconnect()
+
+
+def _seq_scanned_tables(plan):
+    tables = set()
+    if plan.get('Node Type') == 'Seq Scan':
+        tables.add(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        tables |= _seq_scanned_tables(child)
+    return tables
+
+
+async def _seed(conn):
+    await conn.execute('''
+        INSERT INTO live_sessions (tiktok_username, status)
+        SELECT 'plan_test_' || g, 'completed' FROM generate_series(1, $1) g
+    ''', SEED_SESSIONS)
+    first_session = await conn.fetchval(
+        "SELECT MIN(id) FROM live_sessions WHERE tiktok_username LIKE 'plan_test_%'"
+    )
+
+    # Most balances/points sit at zero (points reset when a song is played),
+    # with a small, skewed set of active users on top.
+    await conn.execute('''
+        INSERT INTO luxury_coins (user_id, balance)
+        SELECT 900000000 + g, CASE WHEN g % 50 = 0 THEN (g * 7) % 5000 ELSE 0 END
+        FROM generate_series(1, $1) g
+    ''', SEED_ROWS)
+    await conn.execute('''
+        INSERT INTO user_points (user_id, points)
+        SELECT 900000000 + g, CASE WHEN g % 50 = 0 THEN (g * 13) % 3000 ELSE 0 END
+        FROM generate_series(1, $1) g
+    ''', SEED_ROWS)
+    await conn.execute('''
+        INSERT INTO tiktok_accounts (handle_name, points)
+        SELECT 'plan_test_handle_' || g, CASE WHEN g % 50 = 0 THEN (g * 11) % 4000 ELSE 0 END
+        FROM generate_series(1, $1) g
+    ''', SEED_ROWS)
+    await conn.execute('''
+        INSERT INTO tiktok_watch_time (session_id, watch_seconds)
+        SELECT $1 + (g % $2), g % 1800 FROM generate_series(1, $3) g
+    ''', first_session, SEED_SESSIONS, SEED_ROWS)
+    await conn.execute('''
+        INSERT INTO viewer_count_snapshots (session_id, viewer_count)
+        SELECT $1 + (g % $2), g % 500 FROM generate_series(1, $3) g
+    ''', first_session, SEED_SESSIONS, SEED_ROWS)
+
+    for table in ('luxury_coins', 'user_points', 'tiktok_accounts',
+                  'tiktok_watch_time', 'viewer_count_snapshots'):
+        await conn.execute(f'ANALYZE {table}')
+
+    return first_session
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_use_indexes(setup_database):
+    async with db.pool.acquire() as conn:
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            session_id = await _seed(conn)
+
+            failures = []
+            for name, table, query in HOT_QUERIES:
+                explain = await conn.fetchval(
+                    'EXPLAIN (ANALYZE, FORMAT JSON) ' + query.format(session_id=session_id)
+                )
+                plan = json.loads(explain)[0]['Plan']
+                if table in _seq_scanned_tables(plan):
+                    failures.append(f"{name}: seq scan on {table}")
+
+            assert not failures, failures
+        finally:
+            await tr.rollback()
@@ -0,0 +1,41 @@
+import pytest
+from database import db
+from ingest.recorder import read_recording, synthesize
+from ingest.replay import replay
+
+
+@pytest.fixture
+async def setup_database():
+    await db.connect()
+    yield
+    await db.disconnect()
+
+
+def test_synthetic_recording_round_trips(tmp_path):
+    path = tmp_path / 'stream.jsonl'
+    synthesize(str(path), events=50)
+
+    header, events = read_recording(str(path))
+    events = list(events)
+    assert header['username'] == 'replay_test'
+    assert len(events) >= 50
+    assert all(hasattr(event, 'user') for _, kind, event in events if kind != 'viewer_count')
+
+
+@pytest.mark.asyncio
+async def test_replay_at_max_speed(setup_database, tmp_path):
+    path = tmp_path / 'stream.jsonl'
+    synthesize(str(path), events=200)
+
+    report = await replay(str(path), speed=None)
+    try:
+        assert report['failures'] == 0
+        assert report['events'] >= 200
+        assert report['db_round_trips_per_event'] > 0
+
+        stored = await db.fetchval(
+            'SELECT COUNT(*) FROM tiktok_interactions WHERE session_id = $1', report['session_id']
+        )
+        assert stored > 0
+    finally:
+        await db.execute('DELETE FROM live_sessions WHERE id = $1', report['session_id'])
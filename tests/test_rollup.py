@@ -0,0 +1,39 @@
+import pytest
+from database import db
+from ingest.rollup import SessionRollup
+
+
+@pytest.fixture
+async def session_id():
+    await db.connect()
+    session_id = await db.fetchval("INSERT INTO live_sessions (tiktok_username) VALUES ('rollup_test') RETURNING id")
+    yield session_id
+    await db.execute('DELETE FROM live_sessions WHERE id = $1', session_id)
+    await db.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_writes_totals_and_only_dirty_handles(session_id):
+    rollup = SessionRollup(session_id)
+    rollup.record('like', 'fan_a', count=25)
+    rollup.record('gift', 'fan_a', coins=300)
+    rollup.record('comment', 'fan_b')
+    await rollup.checkpoint()
+
+    # fan_b's row is left alone by the second checkpoint; fan_a's is overwritten with new totals
+    await db.execute("UPDATE session_handle_stats SET comments = 99 WHERE handle_name = 'fan_b'")
+    rollup.record('follow', 'fan_a')
+    await rollup.checkpoint()
+    await rollup.checkpoint()
+
+    stats = await db.fetchrow('SELECT * FROM session_stats WHERE session_id = $1', session_id)
+    assert (stats['events'], stats['likes'], stats['gifts'], stats['coins']) == (4, 25, 1, 300)
+    assert (stats['comments'], stats['follows'], stats['unique_handles']) == (1, 1, 2)
+
+    handles = {
+        row['handle_name']: row for row in
+        await db.fetch('SELECT * FROM session_handle_stats WHERE session_id = $1', session_id)
+    }
+    assert (handles['fan_a']['likes'], handles['fan_a']['coins'], handles['fan_a']['follows']) == (25, 300, 1)
+    assert handles['fan_b']['comments'] == 99
+    assert rollup.top_gifters() == [('fan_a', 300)]
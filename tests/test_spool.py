@@ -0,0 +1,139 @@
+import os
+import pytest
+from database import db
+from cogs.tiktok_integration import TikTokIntegration
+from ingest.events import TikTokEvent
+from ingest.spool import Spool
+
+
+@pytest.mark.asyncio
+async def test_unacked_records_survive_a_restart(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=200)
+    seqs = [spool.append({'kind': 'join', 'n': n}) for n in range(10)]
+    for seq in seqs[:4] + seqs[5:7]:
+        spool.ack(seq)
+    await spool.sync()
+    assert spool.watermark == seqs[3]
+    # Segments wholly below the watermark are gone; small segments force several
+    assert len(spool.segments) > 1
+    assert spool.segments[0][0] <= seqs[4]
+    await spool.close()
+
+    # A crash mid-append leaves a torn frame at the end of the last segment
+    with open(spool.segments[-1][1], 'ab') as f:
+        f.write(b'\x00\x00\x01\x00garbage')
+
+    reopened = Spool(str(tmp_path), segment_bytes=200)
+    # Only the watermark is persisted, so 5 and 6 come back too (at-least-once)
+    assert [record['n'] for record in reopened.pending()] == [4, 5, 6, 7, 8, 9]
+    assert reopened.append({'kind': 'join', 'n': 10}) == seqs[-1] + 1
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_appends_after_a_torn_first_frame_are_replayed(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append({'kind': 'join', 'n': 0})
+    await spool.close()
+    # A crash right after rotating: the new segment holds only part of its first frame
+    with open(os.path.join(tmp_path, f'{2:020d}.seg'), 'wb') as f:
+        f.write(b'\x00\x00\x01\x00torn')
+
+    reopened = Spool(str(tmp_path))
+    assert reopened.append({'kind': 'join', 'n': 1}) == 2
+    await reopened.close()
+
+    # The frame appended after the restart is not hidden behind the torn bytes
+    replayed = Spool(str(tmp_path))
+    assert [record['n'] for record in replayed.pending()] == [0, 1]
+    await replayed.close()
+
+
+@pytest.fixture
+def cleanup_sql():
+    return [
+        "DELETE FROM live_sessions WHERE tiktok_username LIKE 'spool_%'",
+        "DELETE FROM tiktok_accounts WHERE handle_name IN ('spool_fan', 'spool_gift_fan')",
+        'DELETE FROM tiktok_gifts WHERE gift_id = 990004',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_spooled_events_are_replayed_into_the_database(tiktok_cog, tmp_path):
+    session = await db.fetchrow(
+        "INSERT INTO live_sessions (tiktok_username, status) VALUES ('spool_test', 'active') RETURNING id"
+    )
+    # What a run that crashed before its writer flushed leaves behind
+    crashed = Spool(str(tmp_path))
+    base = {'stream': 'spool_test', 'session': session['id']}
+    crashed.append({**base, 'event': TikTokEvent('comment', 'spool_fan', 4, text='still here')})
+    crashed.append({**base, 'event': TikTokEvent('like', 'spool_fan', 4, 12)})
+    crashed.append({**base, 'event': TikTokEvent('follow', 'spool_fan', 4)})
+    await crashed.close()
+
+    cog = tiktok_cog
+    cog.spool = cog.writer.spool = Spool(str(tmp_path))
+    await cog.replay_spool()
+    rows = await db.fetch('''
+        SELECT i.interaction_type::text AS kind, i.like_count, c.comment
+        FROM tiktok_interactions i LEFT JOIN tiktok_comments c ON c.interaction_id = i.id
+        WHERE i.session_id = $1 ORDER BY i.id
+    ''', session['id'])
+    assert [tuple(row) for row in rows] == [
+        ('comment', None, 'still here'),
+        ('like', 12, None),
+        ('follow', None, None),
+    ]
+    assert not cog.spool.outstanding
+    with open(os.path.join(tmp_path, 'ack'), encoding='utf-8') as f:
+        assert int(f.read()) == 3
+
+
+@pytest.mark.asyncio
+async def test_spooled_gifts_are_credited_once(tiktok_cog, tmp_path, monkeypatch):
+    cog = tiktok_cog
+    spool = cog.spool = cog.writer.spool = Spool(str(tmp_path))
+    # Nothing reaches the ack file unless the test syncs
+    cog.spool_sync_loop.cancel()
+    stream = cog.add_stream('spool_gift_test')
+    await stream.handle_connect(None)
+    session_id = stream.session_id
+
+    async def points():
+        return await db.fetchval("SELECT points FROM tiktok_accounts WHERE handle_name = 'spool_gift_fan'")
+
+    def gift():
+        return TikTokEvent('gift', 'spool_gift_fan', 3, 1, 100, gift_id=990004, text='Spool Gift')
+
+    # A failure part-way through rolls the whole gift back and leaves it unacked
+    async def broken(*args, **kwargs):
+        raise RuntimeError('insert failed')
+    with monkeypatch.context() as patch:
+        patch.setattr(stream, 'log_interaction', broken)
+        with pytest.raises(RuntimeError):
+            await stream.handle_gift(gift())
+    assert await points() in (None, 0)
+    assert list(spool.outstanding) == [1]
+
+    await stream.handle_gift(gift())
+    assert await points() == 200
+    assert list(spool.outstanding) == [1]
+
+    # Crash before the ack reaches disk: the spool is abandoned without a sync
+    spool._file.close()
+    cog.spool = cog.writer.spool = stream.spool = None
+    stream.active_session_id = None
+    await cog.cog_unload()
+
+    restarted = TikTokIntegration(cog.bot)
+    restarted.spool = restarted.writer.spool = Spool(str(tmp_path))
+    try:
+        await restarted.replay_spool()
+        assert not restarted.spool.outstanding
+    finally:
+        await restarted.cog_unload()
+    # The failed gift is credited now; the committed one is not credited again
+    assert await points() == 400
+    assert await db.fetchval('''
+        SELECT COUNT(*) FROM tiktok_interactions WHERE session_id = $1 AND interaction_type = 'gift'
+    ''', session_id) == 2
@@ -0,0 +1,118 @@
+import pytest
+from database import db
+from ingest.events import TikTokEvent
+from ingest.spool import Spool
+from ingest.streaks import StreakTracker
+from metrics import registry
+
+
+def db_round_trips():
+    return sum(histogram.count for _, histogram in registry.collect('db_query_seconds'))
+
+
+def test_tracker_emits_one_gift_per_streak():
+    tracker = StreakTracker(timeout=10)
+    for count in range(1, 5):
+        assert tracker.update('fan', 5655, count, 1, streaking=True, now=count) is None
+    assert len(tracker) == 1
+
+    finished = tracker.update('fan', 5655, 5, 1, streaking=False, now=6)
+    assert (finished.gift_id, finished.repeat_count, finished.coins) == (5655, 5, 5)
+    assert len(tracker) == 0
+
+    tracker.update('fan', 5655, 3, 1, streaking=True, now=100)
+    tracker.update('other', 5655, 2, 1, streaking=True, now=105)
+    assert tracker.expire(now=108) == []
+    [(handle, streak)] = tracker.expire(now=111)
+    assert (handle, streak.repeat_count) == ('fan', 3)
+    assert [(handle, streak.repeat_count) for handle, streak in tracker.drain()] == [('other', 2)]
+
+
+def test_late_frames_after_expiry_credit_only_the_difference():
+    tracker = StreakTracker(timeout=10, memory=30)
+    tracker.update('fan', 5655, 4, 1, streaking=True, now=0, seq=1)
+    [(_, expired)] = tracker.expire(now=11)
+    assert (expired.count, expired.seqs) == (4, [1])
+
+    # The final frame turns up after the timeout with the streak's full total
+    late = tracker.update('fan', 5655, 6, 1, streaking=False, now=12, seq=2)
+    assert (late.repeat_count, late.count, late.coins, late.seqs) == (6, 2, 2, [2])
+
+    # A final frame repeating the expired count credits nothing
+    tracker.update('fan', 5655, 3, 1, streaking=True, now=20)
+    tracker.expire(now=31)
+    assert tracker.update('fan', 5655, 3, 1, streaking=False, now=32).count == 0
+
+    # Once forgotten, or when the count starts over, it is a new combo
+    tracker.update('fan', 5655, 5, 1, streaking=True, now=40)
+    tracker.expire(now=51)
+    assert tracker.update('fan', 5655, 2, 1, streaking=False, now=52).count == 2
+    tracker.update('fan', 5655, 5, 1, streaking=True, now=60)
+    tracker.expire(now=71)
+    assert tracker.update('fan', 5655, 7, 1, streaking=False, now=102).count == 7
+
+
+@pytest.fixture
+def cleanup_sql():
+    return [
+        "DELETE FROM tiktok_accounts WHERE handle_name LIKE 'streak_fan%'",
+        'DELETE FROM tiktok_gifts WHERE gift_id = 990003',
+    ]
+
+
+def rose(handle, repeat_count, streaking):
+    return TikTokEvent('gift', handle, 5, repeat_count, 2, gift_id=990003, text='Streak Rose', streaking=streaking)
+
+
+@pytest.mark.asyncio
+async def test_streak_frames_do_no_io_and_write_one_row(tiktok_stream):
+    before = db_round_trips()
+    for count in range(1, 10):
+        await tiktok_stream.handle_gift(rose('streak_fan', count, True))
+    assert db_round_trips() == before
+
+    await tiktok_stream.handle_gift(rose('streak_fan', 10, False))
+    # A streak abandoned without its final frame is recorded when it times out
+    await tiktok_stream.handle_gift(rose('streak_fan_b', 4, True))
+    tiktok_stream.streaks.timeout = 0
+    await tiktok_stream.expire_streaks()
+
+    rows = await db.fetch('''
+        SELECT a.handle_name, i.repeat_count, i.coin_value
+        FROM tiktok_interactions i JOIN tiktok_accounts a ON a.handle_id = i.tiktok_account_id
+        WHERE i.session_id = $1 AND i.interaction_type = 'gift'
+        ORDER BY a.handle_name
+    ''', tiktok_stream.session_id)
+    assert [tuple(row) for row in rows] == [('streak_fan', 10, 20), ('streak_fan_b', 4, 8)]
+    assert tiktok_stream.rollup.totals['coins'] == 28
+
+
+@pytest.mark.asyncio
+async def test_streak_frames_are_acked_once_the_gift_is_recorded(tiktok_stream, tmp_path):
+    spool = tiktok_stream.spool = Spool(str(tmp_path))
+    try:
+        for count in range(1, 4):
+            await tiktok_stream.handle_gift(rose('streak_fan', count, True))
+        # Until the streak is written a crash must replay its frames
+        assert list(spool.outstanding) == [1, 2, 3]
+        await tiktok_stream.handle_gift(rose('streak_fan', 4, False))
+        assert not spool.outstanding
+
+        await tiktok_stream.handle_gift(rose('streak_fan_b', 4, True))
+        tiktok_stream.streaks.timeout = 0
+        await tiktok_stream.expire_streaks()
+        assert not spool.outstanding
+        await tiktok_stream.handle_gift(rose('streak_fan_b', 6, False))
+        assert not spool.outstanding
+    finally:
+        tiktok_stream.spool = None
+        await spool.close()
+
+    rows = await db.fetch('''
+        SELECT a.handle_name, i.repeat_count
+        FROM tiktok_interactions i JOIN tiktok_accounts a ON a.handle_id = i.tiktok_account_id
+        WHERE i.session_id = $1 AND i.interaction_type = 'gift'
+        ORDER BY i.id
+    ''', tiktok_stream.session_id)
+    # The late final frame only adds the two repeats the timeout had not recorded
+    assert [tuple(row) for row in rows] == [('streak_fan', 4), ('streak_fan_b', 4), ('streak_fan_b', 2)]
@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from database import db
+from ingest.supervisor import ConnectionSupervisor, backoff_delay
+
+
+def test_backoff_is_jittered_and_capped():
+    assert backoff_delay(0, base=2, cap=120, rng=lambda: 0.0) == 1
+    assert backoff_delay(0, base=2, cap=120, rng=lambda: 1.0) == 2
+    assert backoff_delay(3, base=2, cap=120, rng=lambda: 1.0) == 16
+    assert backoff_delay(20, base=2, cap=120, rng=lambda: 0.0) == 60
+    assert backoff_delay(20, base=2, cap=120, rng=lambda: 1.0) == 120
+
+
+def supervisor_for(connect, disconnect=None, expired=None, **kwargs):
+    async def noop():
+        pass
+
+    kwargs.setdefault('base_delay', 0.01)
+    kwargs.setdefault('max_delay', 0.02)
+    return ConnectionSupervisor(connect, disconnect or noop, on_outage_expired=expired or noop, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_reconnects_within_grace_without_ending_session():
+    expired = []
+    supervisor = None
+
+    async def connect():
+        supervisor.mark_connected()
+        if supervisor.attempts == 3:
+            await asyncio.sleep(60)
+        if supervisor.attempts == 1:
+            raise ConnectionError("network blip")
+
+    async def on_expired():
+        expired.append(True)
+
+    supervisor = supervisor_for(connect, expired=on_expired, grace_seconds=5)
+    supervisor.start()
+    for _ in range(100):
+        if supervisor.attempts == 3 and supervisor.state == 'connected':
+            break
+        await asyncio.sleep(0.01)
+    try:
+        assert supervisor.reconnects == 2
+        assert expired == []
+    finally:
+        await supervisor.stop()
+    assert supervisor.state == 'stopped'
+
+
+@pytest.mark.asyncio
+async def test_non_persistent_gives_up_after_grace():
+    expired = []
+
+    async def connect():
+        raise ConnectionError("offline")
+
+    async def on_expired():
+        expired.append(True)
+
+    supervisor = supervisor_for(connect, expired=on_expired, persistent=False, grace_seconds=0.05)
+    supervisor.start()
+    await asyncio.wait_for(supervisor._task, timeout=2)
+    assert expired == [True]
+    assert supervisor.attempts >= 2
+    assert supervisor.state == 'stopped'
+
+
+@pytest.mark.asyncio
+async def test_silent_connection_is_recycled():
+    dropped = asyncio.Event()
+    supervisor = None
+
+    async def connect():
+        supervisor.mark_connected()
+        if supervisor.attempts == 1:
+            await dropped.wait()
+        else:
+            await asyncio.sleep(60)
+
+    async def disconnect():
+        dropped.set()
+
+    supervisor = supervisor_for(connect, disconnect, health_timeout=0.05)
+    supervisor.start()
+    try:
+        await asyncio.wait_for(dropped.wait(), timeout=2)
+        for _ in range(100):
+            if supervisor.attempts == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert supervisor.attempts == 2
+    finally:
+        await supervisor.stop()
+
+
+@pytest.fixture
+def cleanup_sql():
+    return ["DELETE FROM live_sessions WHERE tiktok_username = 'supervisor_test'"]
+
+
+@pytest.mark.asyncio
+async def test_reconnect_resumes_the_same_session(tiktok_cog):
+    stream = tiktok_cog.add_stream('supervisor_test')
+    stream.supervisor = supervisor_for(None)
+    try:
+        await stream.handle_connect(None)
+        session_id = stream.session_id
+        await stream.handle_disconnect(None)
+        assert stream.active_session_id == session_id
+
+        await stream.handle_connect(None)
+        assert stream.session_id == session_id
+        assert await db.fetchval(
+            "SELECT COUNT(*) FROM live_sessions WHERE tiktok_username = 'supervisor_test'"
+        ) == 1
+    finally:
+        stream.supervisor = None
@@ -0,0 +1,52 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from database import db
+from ingest.viewers import ViewerSeries, compact_viewer_buckets, sparkline
+
+
+@pytest.fixture
+async def session_id():
+    await db.connect()
+    session_id = await db.fetchval('''
+        INSERT INTO live_sessions (tiktok_username, status, started_at, ended_at)
+        VALUES ('viewers_test', 'completed', NOW() - INTERVAL '40 days', NOW() - INTERVAL '40 days')
+        RETURNING id
+    ''')
+    yield session_id
+    await db.execute('DELETE FROM live_sessions WHERE id = $1', session_id)
+    await db.disconnect()
+
+
+def test_sparkline_scales_and_downsamples():
+    assert sparkline([0, 7]) == '▁█'
+    assert sparkline([5, 5, 5]) == '▁▁▁'
+    assert len(sparkline(list(range(100)), width=20)) == 20
+    assert sparkline([]) == ''
+
+
+@pytest.mark.asyncio
+async def test_samples_are_written_as_buckets_and_compacted(session_id):
+    series = ViewerSeries(session_id, bucket_seconds=30)
+    start = datetime(2020, 1, 1, 20, 0, tzinfo=timezone.utc)
+    # Twelve samples, five seconds apart: two 30 second buckets
+    for i, viewers in enumerate([10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 110, 120]):
+        closed = series.add(viewers, at=start + timedelta(seconds=5 * i))
+        if closed:
+            await series.write(closed)
+    await series.close()
+
+    rows = await db.fetch(
+        'SELECT * FROM viewer_count_buckets WHERE session_id = $1 ORDER BY bucket_start', session_id
+    )
+    assert [(r['min_viewers'], r['max_viewers'], r['avg_viewers'], r['last_viewers'], r['samples']) for r in rows] == [
+        (10, 60, 35, 60, 6),
+        (70, 120, 95, 120, 6),
+    ]
+    assert series.peak == 120
+
+    assert await compact_viewer_buckets(older_than_days=30, bucket_seconds=300) == 2
+    [row] = await db.fetch('SELECT * FROM viewer_count_buckets WHERE session_id = $1', session_id)
+    assert (row['bucket_start'], row['bucket_seconds']) == (start, 300)
+    assert (row['min_viewers'], row['max_viewers'], row['avg_viewers'], row['last_viewers'], row['samples']) == (
+        10, 120, 65, 120, 12
+    )
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import pytest
+from database import db
+from cogs.tiktok_integration import TikTokIntegration
+from ingest.events import from_fields, to_fields
+from ingest.recorder import synthesize
+from ingest.worker import spawn_worker
+
+
+def test_recording_fields_round_trip_through_records(tmp_path):
+    recording = tmp_path / 'fields.jsonl'
+    synthesize(str(recording), events=200)
+    with open(recording, encoding='utf-8') as f:
+        f.readline()
+        for line in f:
+            fields = json.loads(line)
+            fields.pop('t')
+            kind = fields.pop('kind')
+            record = from_fields(kind, fields)
+            assert to_fields(record) == fields
+            assert from_fields(kind, to_fields(record))[:5] == record[:5]
+
+
+@pytest.fixture
+def cleanup_sql():
+    return ["DELETE FROM live_sessions WHERE tiktok_username = 'worker_test'"]
+
+
+@pytest.mark.asyncio
+async def test_worker_events_reach_the_stream_handlers(tiktok_cog, tmp_path, monkeypatch):
+    recording = tmp_path / 'worker.jsonl'
+    synthesize(str(recording), events=300, username='worker_test')
+    with open(recording, encoding='utf-8') as f:
+        f.readline()
+        records = [json.loads(line) for line in f]
+    likes = sum(record['count'] for record in records if record['kind'] == 'like')
+    comments = sum(record['kind'] == 'comment' for record in records)
+
+    stream = tiktok_cog.add_stream('worker_test', persistent=False)
+    # load_extension in other tests re-imports the cog module, so patch the one this class uses
+    monkeypatch.setitem(TikTokIntegration.__init__.__globals__, 'WORKER_MAX_IN_FLIGHT', 4)
+    handle_like, peak = stream.handle_like, []
+
+    async def counting_like(event):
+        peak.append(len(stream.worker_tasks))
+        await asyncio.sleep(0)
+        await handle_like(event)
+
+    stream.handle_like = counting_like
+    await stream.consume_worker(*await spawn_worker('worker_test', '--recording', str(recording)))
+    assert stream.worker is None
+    assert not stream.worker_tasks
+    assert 0 < max(peak) <= 4
+    # The recording ends with live_end, which ends the session
+    assert stream.active_session_id is None
+
+    stats = await db.fetchrow('''
+        SELECT stats.* FROM session_stats stats JOIN live_sessions s ON s.id = stats.session_id
+        WHERE s.tiktok_username = 'worker_test'
+    ''')
+    assert (stats['likes'], stats['comments']) == (likes, comments)
+
+
+@pytest.mark.asyncio
+async def test_live_end_lets_a_non_persistent_worker_stream_finish(tiktok_cog, tmp_path, monkeypatch):
+    recording = tmp_path / 'ending.jsonl'
+    synthesize(str(recording), events=50, username='worker_test')
+    cog_globals = TikTokIntegration.__init__.__globals__
+    monkeypatch.setitem(cog_globals, 'INGEST_MODE', 'worker')
+    monkeypatch.setitem(cog_globals, 'spawn_worker', lambda username: spawn_worker(username, '--recording', str(recording)))
+
+    stream = tiktok_cog.add_stream('worker_test', persistent=False)
+    stream.start()
+    task = stream.supervisor._task
+    # live_end arrives inside the supervisor's task; the supervisor winds down instead of cancelling itself
+    await asyncio.wait_for(asyncio.shield(task), timeout=30)
+    assert not task.cancelled() and task.cancelling() == 0
+    assert not stream.running
+    assert stream.active_session_id is None
+    assert stream.supervisor.attempts == 1
@@ -0,0 +1,78 @@
+import pytest
+from database import db
+from ingest.events import TikTokEvent
+
+
+@pytest.fixture
+def cleanup_sql():
+    return [
+        "DELETE FROM live_sessions WHERE tiktok_username LIKE 'writer_stream_%'",
+        "DELETE FROM tiktok_accounts WHERE handle_name LIKE 'writer_fan_%'",
+    ]
+
+
+def fan(kind, handle, **fields):
+    return TikTokEvent(kind, handle, 2, **fields)
+
+
+@pytest.mark.asyncio
+async def test_streams_share_one_batched_write(tiktok_cog):
+    # Flush by hand so the background loop cannot split the batch
+    await tiktok_cog.writer.stop()
+    first = tiktok_cog.add_stream('writer_stream_a')
+    second = tiktok_cog.add_stream('@writer_stream_b')
+    assert tiktok_cog.resolve_stream(None) is None
+    assert tiktok_cog.resolve_stream('@writer_stream_b') is second
+
+    await first.handle_connect(None)
+    await second.handle_connect(None)
+    await first.handle_join(fan('join', 'writer_fan_a'))
+    await first.handle_comment(fan('comment', 'writer_fan_a', text='hello'))
+    await second.handle_share(fan('share', 'writer_fan_b'))
+    await second.handle_follow(fan('follow', 'writer_fan_a'))
+    second.flush_likes()
+    await second.handle_like(fan('like', 'writer_fan_b', count=7))
+    second.flush_likes()
+
+    batches = tiktok_cog.writer.batch_rows.count
+    assert await tiktok_cog.writer.flush() == 5
+    assert tiktok_cog.writer.batch_rows.count == batches + 1
+
+    rows = await db.fetch('''
+        SELECT s.tiktok_username, a.handle_name, i.interaction_type::text AS kind, i.like_count, c.comment
+        FROM tiktok_interactions i
+        JOIN live_sessions s ON s.id = i.session_id
+        JOIN tiktok_accounts a ON a.handle_id = i.tiktok_account_id
+        LEFT JOIN tiktok_comments c ON c.interaction_id = i.id
+        WHERE s.tiktok_username LIKE 'writer_stream_%'
+        ORDER BY i.id
+    ''')
+    assert [tuple(row) for row in rows] == [
+        ('writer_stream_a', 'writer_fan_a', 'join', None, None),
+        ('writer_stream_a', 'writer_fan_a', 'comment', None, 'hello'),
+        ('writer_stream_b', 'writer_fan_b', 'share', None, None),
+        ('writer_stream_b', 'writer_fan_a', 'follow', None, None),
+        ('writer_stream_b', 'writer_fan_b', 'like', 7, None),
+    ]
+
+    await first.end_active_session()
+    await second.end_active_session()
+
+
+@pytest.mark.asyncio
+async def test_closing_the_bot_writes_everything_buffered(tiktok_cog):
+    await tiktok_cog.bot.add_cog(tiktok_cog)
+    stream = tiktok_cog.add_stream('writer_stream_close')
+    await stream.handle_connect(None)
+    await stream.handle_join(fan('join', 'writer_fan_close'))
+    await stream.handle_like(fan('like', 'writer_fan_close', count=3))
+
+    # Unloading the cog is awaited by close(), so nothing is left in memory afterwards
+    await tiktok_cog.bot.close()
+    rows = await db.fetch('''
+        SELECT s.status, i.interaction_type::text AS kind, i.like_count
+        FROM live_sessions s JOIN tiktok_interactions i ON i.session_id = s.id
+        WHERE s.tiktok_username = 'writer_stream_close'
+        ORDER BY i.id
+    ''')
+    assert [tuple(row) for row in rows] == [('completed', 'join', None), ('completed', 'like', 3)]